@@ -0,0 +1,177 @@
+"""
+בקרת קבלה (admission control) לפני ה-handlers
+
+משתמש אחד שמדביק מאות שורות בסקריפט יכול להעמיס את ה-NLP ואת מונגו
+על כולם. לכן כל עדכון עובר קודם דרך דליי אסימונים (TokenBucket):
+דלי לכל משתמש ודלי כללי, בנפרד לכל סוג פעולה (כתיבה, חיפוש, ייצוא).
+
+- חריגה קצרה (עד ADMISSION_MAX_WAIT_SECONDS) - ממתינה לתורה
+- חריגה ארוכה - העדכון נדחה, והמשתמש מקבל הודעה ידידותית
+  (אחת לחלון זמן, כדי לא להציף אותו בהודעות "לאט לאט")
+
+נרשם כ-TypeHandler בקבוצה -1, כך שהוא רץ לפני כל שאר ה-handlers
+ועוצר את העדכון עם ApplicationHandlerStop.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from telegram import MessageEntity, Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from config import (
+    ADMISSION_BUDGETS,
+    ADMISSION_MAX_WAIT_SECONDS,
+    ADMISSION_NOTICE_INTERVAL_SECONDS,
+    MESSAGES
+)
+from metrics import metrics
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# פקודות שיש להן תקציב משלהן (שאר הפקודות זולות ולא נספרות)
+COMMAND_BUDGETS = {
+    "search": "search",
+    "topic": "search",
+    "tag": "search",
+    "export": "export",
+}
+
+# כמות מקסימלית של דליים למשתמשים לפני ניקוי דליים מלאים
+_MAX_USER_BUCKETS = 10_000
+
+_decisions = metrics.counter(
+    "admission_decisions_total", "החלטות בקרת קבלה לפי סוג פעולה ותוצאה"
+)
+_delay = metrics.histogram(
+    "admission_delay_seconds", "המתנה של עדכונים שנכנסו באיחור"
+)
+
+
+def classify(update: Update) -> Optional[str]:
+    """
+    סוג הפעולה של העדכון (write / search / export), או None אם הוא לא נספר
+    """
+    message = update.message
+    if not message or not message.text:
+        return None
+
+    entities = message.entities
+    if entities and entities[0].type == MessageEntity.BOT_COMMAND and entities[0].offset == 0:
+        command = message.text[1:entities[0].length].split("@")[0].lower()
+        return COMMAND_BUDGETS.get(command)
+
+    return "write"
+
+
+class AdmissionController:
+    """
+    דליים לכל (סוג פעולה, משתמש) ודלי כללי לכל סוג פעולה
+    """
+
+    def __init__(
+        self,
+        budgets: Dict[str, Dict] = ADMISSION_BUDGETS,
+        max_wait: float = ADMISSION_MAX_WAIT_SECONDS,
+        notice_interval: float = ADMISSION_NOTICE_INTERVAL_SECONDS
+    ):
+        self.budgets = budgets
+        self.max_wait = max_wait
+        self.notice_interval = notice_interval
+
+        self._global = {
+            name: TokenBucket(budget["global_per_second"], max(1, budget["global_per_second"]))
+            for name, budget in budgets.items()
+        }
+        self._users: Dict[Tuple[str, int], TokenBucket] = {}
+        # user_id -> מתי נשלחה ההודעה האחרונה על חריגה
+        self._notified: Dict[int, float] = {}
+
+    def _user_bucket(self, budget: str, user_id: int) -> TokenBucket:
+        key = (budget, user_id)
+        bucket = self._users.get(key)
+        if bucket is None:
+            if len(self._users) >= _MAX_USER_BUCKETS:
+                now = time.monotonic()
+                self._users = {
+                    key: value for key, value in self._users.items()
+                    if not value.is_full(now)
+                }
+                self._notified = {
+                    user: at for user, at in self._notified.items()
+                    if now - at < self.notice_interval
+                }
+            settings = self.budgets[budget]
+            bucket = TokenBucket(settings["per_minute"] / 60, settings["burst"])
+            self._users[key] = bucket
+        return bucket
+
+    async def admit(self, budget: str, user_id: int) -> Tuple[bool, str, float]:
+        """
+        בקשת אישור לעדכון אחד (כולל המתנה קצרה אם צריך)
+
+        Returns:
+            (האם התקבל, מי הגביל - "user"/"global"/"", כמה שניות עד שיתפנה)
+        """
+        now = time.monotonic()
+        user_bucket = self._user_bucket(budget, user_id)
+        global_bucket = self._global[budget]
+
+        user_wait = user_bucket.wait_time(now)
+        global_wait = global_bucket.wait_time(now)
+        wait = max(user_wait, global_wait)
+
+        if wait > self.max_wait:
+            scope = "user" if user_wait >= global_wait else "global"
+            _decisions.inc(budget=budget, result="rejected", scope=scope)
+            return False, scope, wait
+
+        if wait > 0:
+            # עדכונים של אותו משתמש ממילא עוברים בתור אחד אחרי השני
+            await asyncio.sleep(wait)
+            _delay.observe(wait, budget=budget)
+            _decisions.inc(budget=budget, result="delayed")
+        else:
+            _decisions.inc(budget=budget, result="admitted")
+
+        now = time.monotonic()
+        user_bucket.consume(now)
+        global_bucket.consume(now)
+        return True, "", 0.0
+
+    def should_notify(self, user_id: int) -> bool:
+        """האם לשלוח למשתמש הודעה על החריגה (אחת לחלון זמן)"""
+        now = time.monotonic()
+        last = self._notified.get(user_id)
+        if last is not None and now - last < self.notice_interval:
+            return False
+        self._notified[user_id] = now
+        return True
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        TypeHandler בקבוצה -1: עדכון שלא התקבל לא מגיע לשאר ה-handlers
+        """
+        budget = classify(update)
+        if budget is None or not update.effective_user:
+            return
+
+        user_id = update.effective_user.id
+        admitted, scope, wait = await self.admit(budget, user_id)
+        if admitted:
+            return
+
+        logger.debug("🚧 עדכון של %s נדחה (%s, %s)", user_id, budget, scope)
+
+        if self.should_notify(user_id):
+            if scope == "user":
+                text = MESSAGES["throttled_user"].format(seconds=math.ceil(wait))
+            else:
+                text = MESSAGES["throttled_global"]
+            await update.message.reply_text(text)
+
+        raise ApplicationHandlerStop
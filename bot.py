@@ -3,36 +3,104 @@
 מכיל את כל ה-handlers והפקודות
 """
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent
+)
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 from telegram.constants import ParseMode
 from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import contextvars
+import functools
 import logging
+import time
 
 from config import (
     TELEGRAM_BOT_TOKEN,
+    TELEGRAM_API_BASE_URL,
+    ADMIN_USER_ID,
     MESSAGES,
     BOT_STATES,
     CATEGORIES,
-    TOPICS
+    TOPICS,
+    INLINE_RESULTS_LIMIT,
+    INLINE_CACHE_TIME,
+    PAGE_SIZE,
+    PAGE_MAX_RESULTS
 )
-from database import db
-from nlp_analyzer import nlp
-
-# הגדרת לוגר
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from database import get_db
+from nlp_analyzer import get_nlp
+from update_queue import update_queue
+from state_store import (
+    create_state_store,
+    run_session_sweeper,
+    SessionFull,
+    DumpSession
 )
+from rate_limiter import TelegramRateLimiter, PRIORITY_ACK, PRIORITY_BACKGROUND
+from digest import DigestScheduler, PERIOD_LABELS, PERIOD_ALIASES
+from prefix_index import prefix_index
+from dedup import thought_deduplicator, content_hash
+from admission import AdmissionController
+from reanalysis import ReanalysisJob, JOB_ID as REANALYSIS_JOB_ID, format_status
+from pagination import (
+    CALLBACK_PREFIX,
+    PAGE_INDICATOR,
+    ResultSnapshot,
+    snapshots,
+    page_keyboard,
+    parse_callback
+)
+from metrics import metrics
+import tracing
+
 logger = logging.getLogger(__name__)
 
+_text_stage_time = metrics.histogram(
+    "handle_text_stage_seconds", "זמן כל שלב בשמירת מחשבה רגילה"
+)
+_handler_time = metrics.histogram(
+    "handler_seconds", "זמן ריצה של כל handler"
+)
+_handler_errors = metrics.counter(
+    "handler_errors_total", "חריגות שנזרקו מ-handlers"
+)
+
+
+def timed_handler(callback):
+    """
+    עטיפת handler במדידת זמן (פעם אחת, בזמן הרישום)
+    """
+    name = callback.__name__
+    
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        started = time.monotonic()
+        try:
+            with tracing.span(f"handler.{name}"):
+                return await callback(update, context)
+        except Exception:
+            _handler_errors.inc(handler=name)
+            raise
+        finally:
+            _handler_time.observe(time.monotonic() - started, handler=name)
+    
+    return wrapper
+
 
 class BrainDumpBot:
     """
@@ -42,59 +110,105 @@ class BrainDumpBot:
     def __init__(self):
         """אתחול הבוט"""
         self.application = None
-        # מילון למעקב אחר מצב המשתמשים
-        self.user_states = {}
-        # אחסון זמני של מחשבות במצב dump
-        self.dump_sessions = {}
+        # מצב המשתמשים וסשנים של dump (בזיכרון או במונגו)
+        self.state_store = create_state_store()
+        # תקציבי כתיבה/חיפוש/ייצוא לכל משתמש ובסך הכל
+        self.admission = AdmissionController()
+        self._sweeper_task = None
+        self._reanalysis_task: Optional[asyncio.Task] = None
     
     async def setup(self):
         """
         הגדרת הבוט והתחברות לשירותים
         """
         # התחברות ל-DB
-        await db.connect()
+        await get_db().connect()
         
-        # יצירת application
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        # טעינת סשנים שמורים וניקוי סשנים לא פעילים ברקע
+        await self.state_store.load()
+        self._sweeper_task = asyncio.create_task(
+            run_session_sweeper(self.state_store, self._finalize_abandoned_dump)
+        )
+        
+        # יצירת application (כל שליחה לטלגרם עוברת דרך מתזמן הקצב)
+        builder = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .rate_limiter(TelegramRateLimiter())
+        )
+        if TELEGRAM_API_BASE_URL:
+            builder = builder.base_url(TELEGRAM_API_BASE_URL)
+        self.application = builder.build()
         
         # רישום handlers
         self._register_handlers()
         
+        # סיכומים תקופתיים (דורש python-telegram-bot[job-queue])
+        if self.application.job_queue:
+            DigestScheduler().schedule(self.application.job_queue)
+        else:
+            logger.warning("⚠️ JobQueue לא זמין - סיכומים תקופתיים כבויים")
+        
         logger.info("✅ הבוט הוגדר בהצלחה")
     
+    async def shutdown(self):
+        """
+        עצירת משימות הרקע ושמירת סשנים פתוחים לפני כיבוי
+        """
+        for task in (self._sweeper_task, self._reanalysis_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        
+        await self.state_store.spill_all()
+    
     def _register_handlers(self):
         """
         רישום כל ה-handlers של הבוט
         """
         app = self.application
         
+        # בקרת קבלה - רצה לפני כל שאר ה-handlers ועוצרת עדכונים מעבר לתקציב
+        app.add_handler(TypeHandler(Update, self.admission.handle), group=-1)
+        
         # פקודות בסיסיות
-        app.add_handler(CommandHandler("start", self.start_command))
-        app.add_handler(CommandHandler("help", self.help_command))
+        app.add_handler(CommandHandler("start", timed_handler(self.start_command)))
+        app.add_handler(CommandHandler("help", timed_handler(self.help_command)))
         
         # פקודות ניהול מחשבות
-        app.add_handler(CommandHandler("dump", self.dump_command))
-        app.add_handler(CommandHandler("done", self.done_command))
+        app.add_handler(CommandHandler("dump", timed_handler(self.dump_command)))
+        app.add_handler(CommandHandler("done", timed_handler(self.done_command)))
         
         # פקודות שליפה וחיפוש
-        app.add_handler(CommandHandler("list", self.list_command))
-        app.add_handler(CommandHandler("topics", self.list_command))
-        app.add_handler(CommandHandler("today", self.today_command))
-        app.add_handler(CommandHandler("week", self.week_command))
-        app.add_handler(CommandHandler("search", self.search_command))
+        app.add_handler(CommandHandler("list", timed_handler(self.list_command)))
+        app.add_handler(CommandHandler("topics", timed_handler(self.list_command)))
+        app.add_handler(CommandHandler("today", timed_handler(self.today_command)))
+        app.add_handler(CommandHandler("week", timed_handler(self.week_command)))
+        app.add_handler(CommandHandler("search", timed_handler(self.search_command)))
+        app.add_handler(CommandHandler("topic", timed_handler(self.topic_command)))
+        app.add_handler(CommandHandler("tag", timed_handler(self.tag_command)))
         
         # פקודות נוספות
-        app.add_handler(CommandHandler("stats", self.stats_command))
-        app.add_handler(CommandHandler("export", self.export_command))
-        app.add_handler(CommandHandler("clear", self.clear_command))
+        app.add_handler(CommandHandler("stats", timed_handler(self.stats_command)))
+        app.add_handler(CommandHandler("digest", timed_handler(self.digest_command)))
+        app.add_handler(CommandHandler("export", timed_handler(self.export_command)))
+        app.add_handler(CommandHandler("clear", timed_handler(self.clear_command)))
+        
+        # פקודות מנהל
+        app.add_handler(CommandHandler("dbstats", timed_handler(self.dbstats_command)))
+        app.add_handler(CommandHandler("queuestats", timed_handler(self.queuestats_command)))
+        app.add_handler(CommandHandler("reanalyze", timed_handler(self.reanalyze_command)))
         
         # Callback queries (כפתורים)
-        app.add_handler(CallbackQueryHandler(self.button_callback))
+        app.add_handler(CallbackQueryHandler(timed_handler(self.button_callback)))
+        
+        # חיפוש inline (@bot <שאילתה>) מכל צ'אט
+        app.add_handler(InlineQueryHandler(timed_handler(self.inline_query)))
         
         # הודעות טקסט רגילות
         app.add_handler(MessageHandler(
             filters.TEXT & ~filters.COMMAND,
-            self.handle_text
+            timed_handler(self.handle_text)
         ))
         
         logger.info("✅ כל ה-handlers נרשמו")
@@ -110,7 +224,7 @@ class BrainDumpBot:
             "username": user.username,
             "first_name": user.first_name
         }
-        await db.get_or_create_user(user.id, user_data)
+        await get_db().get_or_create_user(user.id, user_data)
         
         # שליחת הודעת ברוכים הבאים
         await update.message.reply_text(
@@ -136,8 +250,7 @@ class BrainDumpBot:
         user_id = update.effective_user.id
         
         # הפעלת מצב dump
-        self.user_states[user_id] = BOT_STATES["DUMP_MODE"]
-        self.dump_sessions[user_id] = []
+        await self.state_store.start_dump(user_id)
         
         await update.message.reply_text(
             MESSAGES["dump_mode_start"],
@@ -152,63 +265,103 @@ class BrainDumpBot:
         """
         user_id = update.effective_user.id
         
-        # בדיקה אם המשתמש במצב dump
-        if self.user_states.get(user_id) != BOT_STATES["DUMP_MODE"]:
+        # סגירת הסשן (None אם המשתמש לא במצב dump)
+        session = await self.state_store.end_dump(user_id)
+        
+        if session is None:
             await update.message.reply_text(
                 "לא הייתם במצב 'שפוך הכול'.\nהשתמשו ב-/dump כדי להתחיל."
             )
             return
         
-        # שליחת הודעת עיבוד
-        await update.message.reply_text(MESSAGES["dump_mode_end"])
-        
-        # שליפת המחשבות מהסשן
-        thoughts = self.dump_sessions.get(user_id, [])
-        
-        if not thoughts:
+        if not session.messages:
             await update.message.reply_text(MESSAGES["empty_dump"])
-            # איפוס מצב
-            self.user_states[user_id] = BOT_STATES["NORMAL"]
-            del self.dump_sessions[user_id]
             return
         
-        # ניתוח ושמירת כל המחשבות
-        saved_count = 0
-        category_summary = {}
-        
-        for thought_text in thoughts:
-            # ניתוח NLP
-            analysis = nlp.analyze(thought_text)
-            
-            # שמירה ב-DB
-            await db.save_thought(
-                user_id=user_id,
-                raw_text=thought_text,
-                nlp_analysis=analysis
-            )
-            
-            saved_count += 1
-            
-            # ספירה לסיכום
-            category = analysis["category"]
-            category_summary[category] = category_summary.get(category, 0) + 1
-        
-        # עדכון סטטיסטיקות משתמש
-        await db.update_user_stats(user_id)
-        
-        # בניית הודעת סיכום
-        summary_text = self._build_dump_summary(saved_count, category_summary)
+        # המחשבות כבר נותחו בזמן הסשן - נשאר רק לשמור
+        try:
+            summary_text = await self._save_dump_thoughts(user_id, session)
+        except Exception:
+            await update.message.reply_text(MESSAGES["dump_save_failed"])
+            return
         
         await update.message.reply_text(
             summary_text,
             parse_mode=ParseMode.MARKDOWN
         )
         
-        # איפוס מצב
-        self.user_states[user_id] = BOT_STATES["NORMAL"]
-        del self.dump_sessions[user_id]
+        logger.info(
+            f"✅ משתמש {user_id} סיים סשן dump - {len(session.messages)} מחשבות נשמרו"
+        )
+    
+    async def _analyze(self, text: str) -> dict:
+        """
+        ניתוח NLP מחוץ ללולאת האירועים
+        """
+        # to_thread מעביר את ההקשר (למשל ה-trace) ל-thread
+        return await asyncio.to_thread(get_nlp().analyze, text)
+    
+    async def _save_dump_thoughts(self, user_id: int, session: DumpSession) -> str:
+        """
+        שמירה מרוכזת של מחשבות מסשן dump
         
-        logger.info(f"✅ משתמש {user_id} סיים סשן dump - {saved_count} מחשבות נשמרו")
+        Returns:
+            הודעת הסיכום
+        
+        Raises:
+            אם השמירה נכשלה - אחרי שהסשן הוחזר ל-state_store
+        """
+        # הודעות מסשנים ישנים שנשמרו בלי ניתוח
+        for entry in session.messages:
+            if entry["analysis"] is None:
+                entry["analysis"] = await self._analyze(entry["text"])
+                category = entry["analysis"]["category"]
+                session.tally[category] = session.tally.get(category, 0) + 1
+            entry["content_hash"] = content_hash(entry["text"])
+        
+        try:
+            thought_ids = await get_db().save_thoughts(user_id, session.messages)
+        except Exception:
+            # הסשן כבר נסגר ב-end_dump - מחזירים אותו כדי שלא ילך לאיבוד.
+            # לכל הודעה יש כבר _id קבוע, כך שניסיון חוזר לא ישמור פעמיים
+            try:
+                await self.state_store.restore_dump(user_id, session)
+                logger.warning(f"⚠️ שמירת סשן dump של {user_id} נכשלה - הסשן הוחזר")
+            except Exception as e:
+                logger.error(f"❌ סשן dump של {user_id} לא נשמר ולא הוחזר: {e}")
+            raise
+        for thought_id, entry in zip(thought_ids, session.messages):
+            prefix_index.add(
+                user_id, thought_id, entry["text"], entry["analysis"]["category"]
+            )
+            thought_deduplicator.remember(user_id, entry["content_hash"], thought_id)
+        
+        # עדכון סטטיסטיקות משתמש וסיכום מצטבר - במקביל
+        await asyncio.gather(
+            get_db().update_user_stats(user_id),
+            get_db().bump_user_summary(
+                user_id, [entry["analysis"] for entry in session.messages]
+            )
+        )
+        
+        # בניית הודעת סיכום
+        return self._build_dump_summary(len(session.messages), session.tally)
+    
+    async def _finalize_abandoned_dump(self, user_id: int, session: DumpSession):
+        """
+        שמירה אוטומטית של סשן dump נטוש (בלי /done) ועדכון המשתמש
+        """
+        summary_text = await self._save_dump_thoughts(user_id, session)
+        
+        try:
+            await self.application.bot.send_message(
+                chat_id=user_id,
+                text=MESSAGES["dump_auto_saved"] + summary_text,
+                parse_mode=ParseMode.MARKDOWN,
+                rate_limit_args=PRIORITY_BACKGROUND
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ לא ניתן לעדכן את {user_id} על שמירה אוטומטית: {e}")
     
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -217,31 +370,59 @@ class BrainDumpBot:
         user_id = update.effective_user.id
         text = update.message.text
         
-        # בדיקה אם המשתמש במצב dump
-        if self.user_states.get(user_id) == BOT_STATES["DUMP_MODE"]:
-            # הוספת המחשבה לסשן
-            self.dump_sessions[user_id].append(text)
-            
-            # תגובה שקטה (סימן V)
-            await update.message.reply_text(MESSAGES["dump_mode_active"])
+        # אותה מחשבה נשלחה שוב (לחיצה כפולה, העברה) - בלי ניתוח ובלי שמירה
+        digest = content_hash(text)
+        if await thought_deduplicator.find(user_id, digest) is not None:
+            await update.message.reply_text(MESSAGES["already_saved"])
             return
         
+        # בדיקה אם המשתמש במצב dump - והוספת המחשבה לסשן
+        if await self.state_store.get_state(user_id) == BOT_STATES["DUMP_MODE"]:
+            # הניתוח קורה כבר עכשיו, כך ש-/done רק שומר
+            analysis = await self._analyze(text)
+            try:
+                appended = await self.state_store.append_dump(user_id, text, analysis)
+            except SessionFull:
+                await update.message.reply_text(MESSAGES["dump_session_full"])
+                return
+            
+            if appended:
+                # תגובה שקטה (סימן V) - בעדיפות נמוכה, ואישורים רצופים מאוחדים
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=MESSAGES["dump_mode_active"],
+                    rate_limit_args=PRIORITY_ACK
+                )
+                return
+        
         # מצב רגיל - ניתוח ושמירה מיידית
-        # ניתוח NLP
-        analysis = nlp.analyze(text)
+        started = time.monotonic()
+        
+        # ניתוח NLP (מחוץ ללולאת האירועים)
+        analysis = await self._analyze(text)
+        analyzed = time.monotonic()
+        _text_stage_time.observe(analyzed - started, stage="analyze")
         
         # שמירה ב-DB
-        thought_id = await db.save_thought(
+        thought_id = await get_db().save_thought(
             user_id=user_id,
             raw_text=text,
-            nlp_analysis=analysis
+            nlp_analysis=analysis,
+            content_hash=digest
+        )
+        saved = time.monotonic()
+        _text_stage_time.observe(saved - analyzed, stage="insert")
+        prefix_index.add(user_id, thought_id, text, analysis["category"])
+        thought_deduplicator.remember(user_id, digest, thought_id)
+        
+        # סטטיסטיקות וסיכום מצטבר לא משפיעים על התגובה - רצים במקביל אליה
+        followups = asyncio.gather(
+            get_db().update_user_stats(user_id),
+            get_db().bump_user_summary(user_id, [analysis])
         )
-        
-        # עדכון סטטיסטיקות
-        await db.update_user_stats(user_id)
         
         # הודעת תגובה עם הניתוח
-        summary = nlp.format_analysis_summary(analysis, text)
+        summary = get_nlp().format_analysis_summary(analysis, text)
         
         response_text = f"✅ *נשמר!*\n\n{summary}"
         
@@ -254,13 +435,19 @@ class BrainDumpBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
-            response_text,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
+        try:
+            await update.message.reply_text(
+                response_text,
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=reply_markup
+            )
+            _text_stage_time.observe(time.monotonic() - saved, stage="reply")
+        finally:
+            await followups
+            _text_stage_time.observe(time.monotonic() - saved, stage="followups")
+            _text_stage_time.observe(time.monotonic() - started, stage="total")
         
-        logger.info(f"💭 מחשבה נשמרה למשתמש {user_id}: {analysis['category']}")
+        logger.debug("💭 מחשבה נשמרה למשתמש %s: %s", user_id, analysis["category"])
     
     async def list_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -268,9 +455,12 @@ class BrainDumpBot:
         """
         user_id = update.effective_user.id
         
-        # שליפת סיכומים
-        category_summary = await db.get_category_summary(user_id)
-        topic_summary = await db.get_topic_summary(user_id)
+        # שליפת הסיכום המצטבר (או בנייה שלו בפעם הראשונה)
+        summary = await get_db().get_user_summary(user_id)
+        if summary is None:
+            summary = await get_db().rebuild_user_summary(user_id)
+        category_summary = summary["categories"]
+        topic_summary = summary["topics"]
         
         if not category_summary and not topic_summary:
             await update.message.reply_text(
@@ -289,7 +479,7 @@ class BrainDumpBot:
                 key=lambda x: x[1],
                 reverse=True
             ):
-                emoji = nlp.get_category_emoji(category)
+                emoji = get_nlp().get_category_emoji(category)
                 lines.append(f"  {emoji} {category}: {count}")
             lines.append("")
         
@@ -301,7 +491,7 @@ class BrainDumpBot:
                 key=lambda x: x[1],
                 reverse=True
             )[:5]:  # רק 5 הראשונים
-                emoji = nlp.get_topic_emoji(topic)
+                emoji = get_nlp().get_topic_emoji(topic)
                 lines.append(f"  {emoji} {topic}: {count}")
         
         await update.message.reply_text(
@@ -315,32 +505,19 @@ class BrainDumpBot:
         """
         user_id = update.effective_user.id
         
-        thoughts = await db.get_thoughts_by_date_range(user_id, days_back=1)
+        thoughts = await get_db().get_thoughts_by_date_range(user_id, days_back=1)
         
         if not thoughts:
             await update.message.reply_text("לא נרשמו מחשבות היום. 🤔")
             return
         
-        # בניית הודעה
-        lines = [f"📅 *היום רשמת {len(thoughts)} מחשבות:*\n"]
-        
-        for i, thought in enumerate(thoughts[:10], 1):  # מקסימום 10
-            text = thought["raw_text"]
-            category = thought["nlp_analysis"]["category"]
-            emoji = nlp.get_category_emoji(category)
-            
-            # קיצור טקסט ארוך
-            if len(text) > 50:
-                text = text[:47] + "..."
-            
-            lines.append(f"{i}. {emoji} {text}")
-        
-        if len(thoughts) > 10:
-            lines.append(f"\n_ועוד {len(thoughts) - 10} מחשבות..._")
-        
-        await update.message.reply_text(
-            "\n".join(lines),
-            parse_mode=ParseMode.MARKDOWN
+        await self._reply_first_page(
+            update,
+            user_id,
+            kind="today",
+            query=datetime.utcnow().strftime("%Y-%m-%d"),
+            title=f"📅 *היום רשמת {len(thoughts)} מחשבות:*\n",
+            thoughts=thoughts
         )
     
     async def week_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -349,7 +526,7 @@ class BrainDumpBot:
         """
         user_id = update.effective_user.id
         
-        thoughts = await db.get_thoughts_by_date_range(user_id, days_back=7)
+        thoughts = await get_db().get_thoughts_by_date_range(user_id, days_back=7)
         
         if not thoughts:
             await update.message.reply_text("לא נרשמו מחשבות השבוע. 🤔")
@@ -389,8 +566,8 @@ class BrainDumpBot:
         
         search_term = " ".join(context.args)
         
-        # חיפוש
-        results = await db.search_thoughts(user_id, search_term)
+        # חיפוש (כל התוצאות נשמרות לדפדוף)
+        results = await get_db().search_thoughts(user_id, search_term, limit=PAGE_MAX_RESULTS)
         
         if not results:
             await update.message.reply_text(
@@ -398,26 +575,173 @@ class BrainDumpBot:
             )
             return
         
-        # בניית הודעה
-        lines = [f"🔍 *נמצאו {len(results)} תוצאות עבור '{search_term}':*\n"]
+        await self._reply_first_page(
+            update,
+            user_id,
+            kind="search",
+            query=search_term,
+            title=f"🔍 *נמצאו {len(results)} תוצאות עבור '{search_term}':*\n",
+            thoughts=results
+        )
+    
+    async def topic_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /topic - מחשבות לפי נושא (או קטגוריה)
+        """
+        user_id = update.effective_user.id
+        name = " ".join(context.args).strip() if context.args else ""
+        
+        if name in TOPICS:
+            criteria = {"topic": name}
+            emoji = get_nlp().get_topic_emoji(name)
+        elif name in CATEGORIES:
+            criteria = {"category": name}
+            emoji = get_nlp().get_category_emoji(name)
+        else:
+            await update.message.reply_text(
+                "שימוש: /topic <שם>\n"
+                f"נושאים: {', '.join(TOPICS)}\n"
+                f"קטגוריות: {', '.join(CATEGORIES)}"
+            )
+            return
+        
+        await self._browse(
+            update, user_id,
+            kind="topic",
+            query=name,
+            emoji=emoji,
+            label=f"ב-{name}",
+            **criteria
+        )
+    
+    async def tag_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /tag - מחשבות לפי מילת מפתח
+        """
+        user_id = update.effective_user.id
+        
+        # מילות המפתח נשמרות באותיות קטנות, מילה אחת כל אחת
+        if not context.args or len(context.args) > 1:
+            await update.message.reply_text(
+                "שימוש: /tag <מילה אחת>\nלדוגמה: /tag פגישה"
+            )
+            return
+        
+        keyword = context.args[0].lower()
+        
+        await self._browse(
+            update, user_id,
+            kind="tag",
+            query=keyword,
+            emoji="🏷️",
+            label=f"עם '{keyword}'",
+            keyword=keyword
+        )
+    
+    async def _browse(
+        self,
+        update: Update,
+        user_id: int,
+        kind: str,
+        query: str,
+        emoji: str,
+        label: str,
+        **criteria
+    ):
+        """
+        רשימה מסוננת עם דפדוף: המזהים בלבד מהאינדקס, ורק העמוד הראשון במלואו
+        """
+        found = await get_db().get_user_thoughts(
+            user_id, limit=PAGE_MAX_RESULTS, projection=["_id"], **criteria
+        )
+        
+        if not found:
+            await update.message.reply_text(f"אין עדיין מחשבות {label} {emoji}")
+            return
+        
+        first_page = await get_db().get_thoughts_by_ids(
+            user_id, [str(thought["_id"]) for thought in found[:PAGE_SIZE]]
+        )
         
-        for i, thought in enumerate(results[:8], 1):
+        await self._reply_first_page(
+            update,
+            user_id,
+            kind=kind,
+            query=query,
+            title=f"{emoji} *{len(found)} מחשבות {label}:*\n",
+            thoughts=found,
+            first_page=first_page
+        )
+    
+    async def _reply_first_page(
+        self,
+        update: Update,
+        user_id: int,
+        kind: str,
+        query: str,
+        title: str,
+        thoughts: List[dict],
+        first_page: Optional[List[dict]] = None
+    ):
+        """
+        שמירת תמונת מצב של התוצאות ושליחת העמוד הראשון עם כפתורי דפדוף
+        
+        first_page - המחשבות המלאות של העמוד הראשון, כש-thoughts הם מזהים בלבד
+        """
+        snapshot = snapshots.save(
+            user_id, kind, query, title,
+            [str(thought["_id"]) for thought in thoughts]
+        )
+        
+        if first_page is None:
+            first_page = thoughts[:PAGE_SIZE]
+        
+        await update.message.reply_text(
+            self._format_page(snapshot, first_page, 0),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=page_keyboard(snapshot.fingerprint, 0, snapshot.pages)
+        )
+    
+    async def _show_page(self, query, user_id: int):
+        """
+        דפדוף - שליפת עמוד אחד לפי המזהים השמורים
+        """
+        parsed = parse_callback(query.data)
+        snapshot = snapshots.get(parsed[0], user_id) if parsed else None
+        
+        if snapshot is None:
+            await query.edit_message_text(MESSAGES["page_expired"])
+            return
+        
+        page = min(parsed[1], snapshot.pages - 1)
+        thoughts = await get_db().get_thoughts_by_ids(user_id, snapshot.page_ids(page))
+        
+        await query.edit_message_text(
+            self._format_page(snapshot, thoughts, page),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=page_keyboard(snapshot.fingerprint, page, snapshot.pages)
+        )
+    
+    def _format_page(self, snapshot: ResultSnapshot, thoughts: List[dict], page: int) -> str:
+        """
+        טקסט של עמוד תוצאות (המספור ממשיך מהעמודים הקודמים)
+        """
+        lines = [snapshot.title]
+        
+        for i, thought in enumerate(thoughts, page * PAGE_SIZE + 1):
             text = thought["raw_text"]
             category = thought["nlp_analysis"]["category"]
-            emoji = nlp.get_category_emoji(category)
+            emoji = get_nlp().get_category_emoji(category)
             
             if len(text) > 60:
                 text = text[:57] + "..."
             
             lines.append(f"{i}. {emoji} {text}")
         
-        if len(results) > 8:
-            lines.append(f"\n_ועוד {len(results) - 8} תוצאות..._")
+        if not thoughts:
+            lines.append("_המחשבות בעמוד הזה כבר לא קיימות._")
         
-        await update.message.reply_text(
-            "\n".join(lines),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        return "\n".join(lines)
     
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -425,7 +749,7 @@ class BrainDumpBot:
         """
         user_id = update.effective_user.id
         
-        stats = await db.get_user_stats(user_id)
+        stats = await get_db().get_user_stats(user_id)
         
         if not stats or stats.get("total_thoughts", 0) == 0:
             await update.message.reply_text(
@@ -446,7 +770,7 @@ class BrainDumpBot:
         # הקטגוריה הפופולרית ביותר
         if stats.get("categories"):
             top_category = max(stats["categories"].items(), key=lambda x: x[1])
-            emoji = nlp.get_category_emoji(top_category[0])
+            emoji = get_nlp().get_category_emoji(top_category[0])
             lines.append(
                 f"🏆 הכי הרבה: {emoji} {top_category[0]} ({top_category[1]})"
             )
@@ -456,6 +780,34 @@ class BrainDumpBot:
             parse_mode=ParseMode.MARKDOWN
         )
     
+    async def digest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /digest - הרשמה לסיכום יומי/שבועי או ביטול
+        """
+        user = update.effective_user
+        
+        user_doc = await get_db().get_or_create_user(user.id, {
+            "username": user.username,
+            "first_name": user.first_name
+        })
+        
+        choice = PERIOD_ALIASES.get(context.args[0].lower()) if context.args else None
+        
+        if choice is None:
+            # בלי ארגומנט (או ארגומנט לא מוכר) - הצגת המצב הנוכחי
+            current = user_doc.get("settings", {}).get("digest", "off")
+            await update.message.reply_text(
+                MESSAGES["digest_status"].format(current=PERIOD_LABELS.get(current, current)),
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        await get_db().set_digest_preference(user.id, choice)
+        await update.message.reply_text(
+            MESSAGES["digest_updated"].format(current=PERIOD_LABELS[choice]),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
     async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /export - ייצוא מחשבות (בסיסי)
@@ -485,6 +837,177 @@ class BrainDumpBot:
             reply_markup=reply_markup
         )
     
+    async def dbstats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /dbstats - ביצועי הדאטהבייס (מנהל בלבד)
+        """
+        user_id = update.effective_user.id
+        
+        if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+            return
+        
+        stats = get_db().get_operation_stats()
+        
+        # בלי Markdown - שמות המתודות מכילים קווים תחתונים
+        lines = ["🗄️ ביצועי דאטהבייס\n", "מתודות (p95 / ממוצע / קריאות):"]
+        
+        methods = sorted(
+            stats["db_method_seconds"],
+            key=lambda s: s["p95"],
+            reverse=True
+        )
+        for series in methods:
+            lines.append(
+                f"• {series['labels']['method']}: "
+                f"{series['p95'] * 1000:.0f}ms / {series['avg'] * 1000:.1f}ms / "
+                f"{series['count']}"
+            )
+        
+        commands = sorted(
+            stats["mongo_command_seconds"],
+            key=lambda s: s["sum"],
+            reverse=True
+        )[:10]
+        if commands:
+            lines.append("\nפקודות מונגו (זמן כולל):")
+            for series in commands:
+                labels = series["labels"]
+                lines.append(
+                    f"• {labels['method']}.{labels['command']} "
+                    f"[{labels['status']}]: {series['sum'] * 1000:.0f}ms "
+                    f"({series['count']})"
+                )
+        
+        reply_bytes = {
+            (s["labels"]["method"], s["labels"]["command"]): s["sum"]
+            for s in stats["mongo_command_reply_bytes"]
+        }
+        if reply_bytes:
+            total_kb = sum(reply_bytes.values()) / 1024
+            lines.append(f"\n📦 סה״כ הועברו: {total_kb:.1f}KB")
+        
+        slow = sum(s["value"] for s in stats["mongo_slow_commands_total"])
+        lines.append(f"🐢 פקודות איטיות: {slow:.0f}")
+        
+        deadlines = sum(s["value"] for s in stats["db_deadline_exceeded_total"])
+        degraded = sum(s["value"] for s in stats["db_degraded_reads_total"])
+        lines.append(f"⏱️ חריגות מתקציב זמן: {deadlines:.0f} (הוגשו חלופית: {degraded:.0f})")
+        
+        await update.message.reply_text("\n".join(lines))
+    
+    async def queuestats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /queuestats - מצב תור העדכונים (מנהל בלבד)
+        """
+        user_id = update.effective_user.id
+        
+        if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+            return
+        
+        lines = [
+            "📬 תור עדכונים\n",
+            f"ממתינים: {update_queue.depth()}",
+            f"workers: {update_queue.workers_count}",
+            f"המתנה מקסימלית: {update_queue.oldest_age() * 1000:.0f}ms"
+        ]
+        
+        lagging = update_queue.lag_report()
+        if lagging:
+            lines.append("\nמשתמשים עם עיכוב:")
+            for item in lagging:
+                lines.append(
+                    f"• {item['key']}: {item['depth']} ממתינים, "
+                    f"{item['lag'] * 1000:.0f}ms"
+                )
+        
+        await update.message.reply_text("\n".join(lines))
+
+    async def reanalyze_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /reanalyze - ניתוח מחדש של כל המחשבות (מנהל בלבד)
+        /reanalyze status - התקדמות, /reanalyze restart - מההתחלה
+        """
+        user_id = update.effective_user.id
+        
+        if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+            return
+        
+        action = context.args[0].lower() if context.args else ""
+        
+        if action == "status":
+            job = await get_db().get_job(REANALYSIS_JOB_ID)
+            await update.message.reply_text(format_status(job))
+            return
+        
+        if self._reanalysis_task and not self._reanalysis_task.done():
+            await update.message.reply_text("🔄 הניתוח מחדש כבר רץ. /reanalyze status להתקדמות")
+            return
+        
+        # הקשר נקי - העבודה ארוכה ולא שייכת ל-trace של העדכון הזה
+        # (task שנוצר בתוך context.run יורש את ההקשר הריק)
+        self._reanalysis_task = contextvars.Context().run(
+            asyncio.create_task,
+            self._run_reanalysis(update.effective_chat.id, restart=action == "restart")
+        )
+        await update.message.reply_text("🔄 הניתוח מחדש התחיל ברקע. אעדכן כשיסתיים.")
+    
+    async def _run_reanalysis(self, chat_id: int, restart: bool):
+        """
+        הרצת הניתוח מחדש ודיווח למנהל בסיום
+        """
+        try:
+            job = await ReanalysisJob().run(restart=restart)
+            if job is None:
+                text = "🔄 הניתוח מחדש כבר רץ ב-worker אחר"
+            else:
+                text = "✅ הניתוח מחדש הסתיים\n\n" + format_status(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ הניתוח מחדש נכשל: {e}", exc_info=True)
+            text = f"❌ הניתוח מחדש נעצר: {e}\n/reanalyze ימשיך מנקודת העצירה"
+        
+        await self.application.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            rate_limit_args=PRIORITY_BACKGROUND
+        )
+
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        חיפוש inline - תחיליות מילים במחשבות האחרונות (מאינדקס בזיכרון)
+        """
+        query = update.inline_query
+        user_id = query.from_user.id
+
+        thoughts = await prefix_index.search(
+            user_id, query.query, INLINE_RESULTS_LIMIT
+        )
+
+        results = []
+        for thought in thoughts:
+            emoji = get_nlp().get_category_emoji(thought["category"])
+            title = thought["raw_text"]
+            if len(title) > 60:
+                title = title[:57] + "..."
+
+            results.append(InlineQueryResultArticle(
+                id=thought["id"],
+                title=f"{emoji} {title}",
+                description=(
+                    f"{thought['category']} • "
+                    f"{thought['created_at'].strftime('%d/%m/%Y %H:%M')}"
+                ),
+                input_message_content=InputTextMessageContent(thought["raw_text"])
+            ))
+
+        # התוצאות אישיות - טלגרם שומר אותן במטמון לכל משתמש בנפרד
+        await query.answer(
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=True
+        )
+
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         טיפול בלחיצות על כפתורים
@@ -499,9 +1022,19 @@ class BrainDumpBot:
             # הצגת כל המחשבות
             await self._show_recent_thoughts(query, user_id)
         
+        elif data.startswith(CALLBACK_PREFIX):
+            # דפדוף בתוצאות /search או /today
+            await self._show_page(query, user_id)
+        
+        elif data == PAGE_INDICATOR:
+            # מספר העמוד הנוכחי - אין מה לעשות
+            pass
+        
         elif data == "confirm_clear":
             # מחיקה מאושרת
-            count = await db.delete_all_user_thoughts(user_id)
+            count = await get_db().delete_all_user_thoughts(user_id)
+            prefix_index.invalidate(user_id)
+            thought_deduplicator.forget_user(user_id)
             await query.edit_message_text(
                 f"🗑️ נמחקו {count} מחשבות.\n"
                 "תתחיל/י מחדש מתי שתרצה! 🌱"
@@ -517,7 +1050,7 @@ class BrainDumpBot:
         """
         הצגת מחשבות אחרונות
         """
-        thoughts = await db.get_user_thoughts(user_id, limit=10)
+        thoughts = await get_db().get_user_thoughts(user_id, limit=10)
         
         if not thoughts:
             await query.edit_message_text("אין מחשבות להצגה.")
@@ -531,7 +1064,7 @@ class BrainDumpBot:
                 text = text[:37] + "..."
             
             category = thought["nlp_analysis"]["category"]
-            emoji = nlp.get_category_emoji(category)
+            emoji = get_nlp().get_category_emoji(category)
             
             lines.append(f"{i}. {emoji} {text}")
         
@@ -555,11 +1088,19 @@ class BrainDumpBot:
             key=lambda x: x[1],
             reverse=True
         ):
-            emoji = nlp.get_category_emoji(category)
+            emoji = get_nlp().get_category_emoji(category)
             lines.append(f"  {emoji} {category}: {num}")
         
         return "\n".join(lines)
 
 
-# יצירת אובייקט גלובלי
-bot = BrainDumpBot()
+# האובייקט הגלובלי נוצר בשימוש הראשון ולא בזמן ה-import
+_bot: Optional[BrainDumpBot] = None
+
+
+def get_bot() -> BrainDumpBot:
+    """המופע BrainDumpBot הגלובלי (נוצר בקריאה הראשונה)"""
+    global _bot
+    if _bot is None:
+        _bot = BrainDumpBot()
+    return _bot
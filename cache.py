@@ -0,0 +1,99 @@
+"""
+מטמון בזיכרון עם תפוגה ומגבלת גודל (LRU)
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from metrics import metrics
+
+_cache_requests = metrics.counter(
+    "cache_requests_total", "פניות למטמונים בזיכרון לפי תוצאה"
+)
+
+
+class TTLCache:
+    """
+    מטמון LRU חסום בגודל, עם זמן תפוגה לכל רשומה
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_seconds: float):
+        """
+        Args:
+            name: שם המטמון (לתוויות המטריקות)
+            max_size: מקסימום רשומות
+            ttl_seconds: זמן חיים של רשומה
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        # מפתח -> (זמן תפוגה, ערך)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        שליפת ערך (ומיקומו מחדש בסוף תור ה-LRU)
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            _cache_requests.inc(cache=self.name, result="miss")
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            _cache_requests.inc(cache=self.name, result="expired")
+            return default
+
+        self._data.move_to_end(key)
+        _cache_requests.inc(cache=self.name, result="hit")
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        שמירת ערך, עם פינוי הרשומה הישנה ביותר אם צריך
+        """
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """הסרת רשומה"""
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        הסרת כל הרשומות שהמפתח שלהן עונה על התנאי
+        
+        Returns:
+            כמות הרשומות שהוסרו
+        """
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def memory_bytes(self) -> int:
+        """
+        הערכת הזיכרון שהמטמון תופס (המבנה והרשומות, בלי תוכן הערכים)
+        """
+        return sys.getsizeof(self._data) + sum(
+            sys.getsizeof(entry) for entry in self._data.values()
+        )
+
+    def clear(self):
+        """ריקון המטמון"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -11,16 +11,178 @@ load_dotenv()
 
 # ===== הגדרות Telegram =====
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# כתובת חלופית ל-Bot API (למשל tools.fake_telegram בבדיקות עומס)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
 ADMIN_USER_ID = int(os.getenv("ADMIN_USER_ID", "0"))
 
 # ===== הגדרות MongoDB =====
 MONGODB_URI = os.getenv("MONGODB_URI")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "brain_dump_bot")
+# חלוקת נתוני המשתמשים בין כמה אשכולות/מסדים: "שם=URI;שם=URI" (ריק = MONGODB_URI בלבד).
+# שם מסד בנתיב ה-URI גובר על MONGODB_DB_NAME. הראשון ברשימה הוא הראשי
+MONGODB_SHARDS = os.getenv("MONGODB_SHARDS", "")
+# חיבורים מקסימליים לכל לקוח (אחד לכל אשכול)
+MONGODB_POOL_SIZE = int(os.getenv("MONGODB_POOL_SIZE", "50"))
+# כל כמה זמן כל worker מרענן את שיבוצי המשתמשים שהוצמדו (בזמן העברה)
+SHARD_ASSIGNMENT_REFRESH_SECONDS = float(os.getenv("SHARD_ASSIGNMENT_REFRESH_SECONDS", "15"))
+# סף (במילישניות) שמעליו פקודת מונגו נרשמת בלוג כאיטית
+DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+# תקציבי זמן (maxTimeMS) לפי סוג שאילתה
+DB_DEADLINES_MS = {
+    "write": int(os.getenv("DB_DEADLINE_WRITE_MS", "2000")),          # כתיבות בנתיב החם
+    "list": int(os.getenv("DB_DEADLINE_LIST_MS", "3000")),            # שליפות רשימה
+    "search": int(os.getenv("DB_DEADLINE_SEARCH_MS", "4000")),        # חיפוש טקסט
+    "aggregate": int(os.getenv("DB_DEADLINE_AGGREGATE_MS", "5000")),  # אגרגציות וסיכומים
+    "export": int(os.getenv("DB_DEADLINE_EXPORT_MS", "20000")),       # ייצוא ופעולות המוניות
+}
+
+# זמני חיבור של הלקוח (כדי שמונגו איטי לא יתקע את ה-worker)
+DB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("DB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+DB_CONNECT_TIMEOUT_MS = int(os.getenv("DB_CONNECT_TIMEOUT_MS", "5000"))
+DB_SOCKET_TIMEOUT_MS = int(os.getenv("DB_SOCKET_TIMEOUT_MS", "30000"))
+
+# תוצאות אחרונות של תצוגות קריאה - מוגשות כשהשאילתה חורגת מהתקציב
+DB_READ_CACHE_SIZE = int(os.getenv("DB_READ_CACHE_SIZE", "500"))
+DB_READ_CACHE_TTL_SECONDS = int(os.getenv("DB_READ_CACHE_TTL_SECONDS", "900"))
 
 # ===== הגדרות Render =====
 PORT = int(os.getenv("PORT", 10000))
 RENDER_EXTERNAL_URL = os.getenv("RENDER_EXTERNAL_URL", "")
 
+# ===== הגבלת קצב שליחה לטלגרם =====
+# מגבלה כללית של טלגרם: כ-30 הודעות בשנייה
+RATE_LIMIT_GLOBAL_PER_SECOND = float(os.getenv("RATE_LIMIT_GLOBAL_PER_SECOND", "30"))
+# צ'אט פרטי: כהודעה בשנייה, עם פרץ קצר
+RATE_LIMIT_CHAT_PER_SECOND = float(os.getenv("RATE_LIMIT_CHAT_PER_SECOND", "1"))
+RATE_LIMIT_CHAT_BURST = int(os.getenv("RATE_LIMIT_CHAT_BURST", "3"))
+# קבוצות: כ-20 הודעות בדקה
+RATE_LIMIT_GROUP_PER_MINUTE = float(os.getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+# אישורי dump זהים לאותו צ'אט בתוך החלון הזה נשלחים פעם אחת
+RATE_LIMIT_ACK_COALESCE_SECONDS = float(os.getenv("RATE_LIMIT_ACK_COALESCE_SECONDS", "3"))
+# כמה פעמים לנסות שוב אחרי RetryAfter (429)
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+
+# ===== מעקב (tracing) אחרי עדכונים =====
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+# איזה חלק מהעדכונים נשמר (0-1)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# עדכון איטי מזה נשמר תמיד, בלי קשר לדגימה
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+# קובץ JSON-lines לייצוא (מתחלף כשהוא מגיע לגודל המקסימלי)
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# ===== תור עדכונים (webhook) =====
+# עומק מקסימלי - מעבר לזה ה-webhook מחזיר 503 וטלגרם מאט
+UPDATE_QUEUE_MAX_SIZE = int(os.getenv("UPDATE_QUEUE_MAX_SIZE", "1000"))
+# כמות workers שמעבדים עדכונים מהתור - משתמשים שונים מעובדים במקביל,
+# ועדכונים של אותו משתמש תמיד אחד אחרי השני לפי סדר ההגעה
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+# זמן מקסימלי לריקון התור בכיבוי
+UPDATE_QUEUE_DRAIN_SECONDS = int(os.getenv("UPDATE_QUEUE_DRAIN_SECONDS", "10"))
+
+# ===== מניעת עיבוד כפול של עדכונים (update_id) =====
+# כמות update_id אחרונים שנשמרים בזיכרון
+UPDATE_DEDUP_CAPACITY = int(os.getenv("UPDATE_DEDUP_CAPACITY", "10000"))
+# רישום משותף במונגו - נדרש כשיש כמה workers/instances
+UPDATE_DEDUP_MONGO = os.getenv("UPDATE_DEDUP_MONGO", "False").lower() == "true"
+# טלגרם שומר עדכונים עד 24 שעות, אין טעם לזכור יותר
+UPDATE_DEDUP_TTL_SECONDS = int(os.getenv("UPDATE_DEDUP_TTL_SECONDS", "86400"))
+
+# ===== מצב שיחה (מצב משתמש וסשנים של dump) =====
+# "memory" - בזיכרון התהליך (worker יחיד), "mongo" - משותף לכל ה-workers
+STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "memory").lower()
+# זמן חיים של מצב משתמש במטמון המקומי (מעל מונגו)
+STATE_CACHE_TTL_SECONDS = float(os.getenv("STATE_CACHE_TTL_SECONDS", "2"))
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))
+# סשן שלא עודכן זמן רב נמחק אוטומטית ממונגו (TTL)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# מגבלות לסשן dump בודד
+DUMP_MAX_MESSAGES = int(os.getenv("DUMP_MAX_MESSAGES", "500"))
+DUMP_MAX_CHARS = int(os.getenv("DUMP_MAX_CHARS", "100000"))
+# סשן בלי פעילות עובר מהזיכרון לאחסון קבוע (ומשוחזר בהודעה הבאה)
+DUMP_IDLE_TIMEOUT_SECONDS = int(os.getenv("DUMP_IDLE_TIMEOUT_SECONDS", "1800"))
+# סשן נטוש (בלי /done) נשמר אוטומטית אחרי הזמן הזה
+DUMP_AUTO_FINALIZE_SECONDS = int(os.getenv("DUMP_AUTO_FINALIZE_SECONDS", str(6 * 3600)))
+# כל כמה זמן רץ ניקוי הסשנים
+DUMP_SWEEP_INTERVAL_SECONDS = int(os.getenv("DUMP_SWEEP_INTERVAL_SECONDS", "60"))
+
+# ===== סיכומים תקופתיים (digest) =====
+# שעת השליחה (שעון מקומי, TIMEZONE)
+DIGEST_TIME = os.getenv("DIGEST_TIME", "20:00")
+# יום הסיכום השבועי (0=ראשון ... 6=שבת)
+DIGEST_WEEKLY_DAY = int(os.getenv("DIGEST_WEEKLY_DAY", "5"))
+# פריסת השליחה על פני חלון זמן, בקבוצות (shards) לפי user_id
+DIGEST_SPREAD_MINUTES = float(os.getenv("DIGEST_SPREAD_MINUTES", "30"))
+DIGEST_SHARDS = int(os.getenv("DIGEST_SHARDS", "30"))
+# כמות משתמשים מקסימלית באגרגציה אחת
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "500"))
+
+# ===== חיפוש inline (@bot <שאילתה>) =====
+# אינדקס תחיליות בזיכרון למשתמשים פעילים (LRU)
+INLINE_INDEX_USERS = int(os.getenv("INLINE_INDEX_USERS", "2000"))
+# כמה מחשבות אחרונות נטענות לאינדקס של משתמש
+INLINE_INDEX_THOUGHTS = int(os.getenv("INLINE_INDEX_THOUGHTS", "500"))
+# אינדקס שלא נגעו בו זמן רב יוצא מהזיכרון
+INLINE_INDEX_TTL_SECONDS = int(os.getenv("INLINE_INDEX_TTL_SECONDS", "3600"))
+# כמות תוצאות מקסימלית לתשובה (טלגרם מגביל ל-50)
+INLINE_RESULTS_LIMIT = int(os.getenv("INLINE_RESULTS_LIMIT", "20"))
+# כמה זמן טלגרם שומר את התשובה במטמון שלו (לכל משתמש בנפרד)
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "10"))
+
+# ===== עימוד תוצאות (/search, /today) =====
+# כמות מחשבות בעמוד
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "8"))
+# מקסימום תוצאות שנשמרות לדפדוף
+PAGE_MAX_RESULTS = int(os.getenv("PAGE_MAX_RESULTS", "100"))
+# רשימות התוצאות השמורות (בזיכרון, LRU) וכמה זמן אפשר לדפדף בהן
+PAGE_SNAPSHOT_CACHE_SIZE = int(os.getenv("PAGE_SNAPSHOT_CACHE_SIZE", "5000"))
+PAGE_SNAPSHOT_TTL_SECONDS = int(os.getenv("PAGE_SNAPSHOT_TTL_SECONDS", "1800"))
+
+# ===== בקרת קבלה (admission) לפני ה-handlers =====
+# תקציב לכל משתמש (לדקה, עם פרץ) ותקציב כללי (לשנייה), לכל סוג פעולה
+ADMISSION_BUDGETS = {
+    "write": {   # הודעות טקסט (ניתוח NLP ושמירה)
+        "per_minute": float(os.getenv("ADMISSION_WRITE_PER_MINUTE", "30")),
+        "burst": int(os.getenv("ADMISSION_WRITE_BURST", "20")),
+        "global_per_second": float(os.getenv("ADMISSION_WRITE_GLOBAL_PER_SECOND", "50")),
+    },
+    "search": {  # /search, /topic, /tag
+        "per_minute": float(os.getenv("ADMISSION_SEARCH_PER_MINUTE", "10")),
+        "burst": int(os.getenv("ADMISSION_SEARCH_BURST", "5")),
+        "global_per_second": float(os.getenv("ADMISSION_SEARCH_GLOBAL_PER_SECOND", "20")),
+    },
+    "export": {  # /export
+        "per_minute": float(os.getenv("ADMISSION_EXPORT_PER_MINUTE", "0.1")),
+        "burst": int(os.getenv("ADMISSION_EXPORT_BURST", "2")),
+        "global_per_second": float(os.getenv("ADMISSION_EXPORT_GLOBAL_PER_SECOND", "1")),
+    },
+}
+# חריגה קטנה מזה ממתינה לתורה במקום להידחות
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "2"))
+# הודעת "לאט לאט" אחת לכל משתמש בחלון הזה (השאר נדחות בשקט)
+ADMISSION_NOTICE_INTERVAL_SECONDS = float(os.getenv("ADMISSION_NOTICE_INTERVAL_SECONDS", "30"))
+
+# ===== ניתוח מחדש של מחשבות שמורות (/reanalyze) =====
+# מחשבות בכל סבב קריאה/כתיבה
+REANALYZE_BATCH_SIZE = int(os.getenv("REANALYZE_BATCH_SIZE", "500"))
+# תהליכים לניתוח ה-NLP במקביל
+REANALYZE_WORKERS = int(os.getenv("REANALYZE_WORKERS", "2"))
+# קצב יעד (מסמכים לשנייה) - כדי לא להעמיס על מונגו בזמן שהבוט עובד
+REANALYZE_OPS_PER_SECOND = float(os.getenv("REANALYZE_OPS_PER_SECOND", "200"))
+# worker שנפל משחרר את העבודה אחרי הזמן הזה (ואז אפשר להמשיך מנקודת העצירה)
+REANALYZE_LEASE_SECONDS = float(os.getenv("REANALYZE_LEASE_SECONDS", "120"))
+
+# ===== זיהוי מחשבות כפולות (אותו טקסט שנשלח שוב) =====
+# מחשבה שזהה למחשבה שנשמרה בחלון הזה לא נשמרת שוב (0 - בלי זיהוי).
+# חלון קצר - לחיצה כפולה, העברה או שליחה חוזרת; חזרה אמיתית אחרי
+# כמה דקות ("כן", "להתקשר לאמא") נשמרת כרגיל
+DEDUP_WINDOW_SECONDS = int(os.getenv("DEDUP_WINDOW_SECONDS", "300"))
+# טביעות אחרונות בזיכרון (LRU) - חוסכות את השאילתה למונגו ברוב המקרים
+DEDUP_RECENT_CACHE_SIZE = int(os.getenv("DEDUP_RECENT_CACHE_SIZE", "50000"))
+
 # ===== קטגוריות והגדרות NLP =====
 
 # קטגוריות עיקריות
@@ -166,12 +328,42 @@ MESSAGES = {
     
     "dump_mode_active": "✅",  # תגובה שקטה למהלך מצב dump
     
-    "dump_mode_end": """
-⌛ *מעבד את המחשבות שלך...*
+    "dump_session_full": """
+📦 הסשן הגיע למגבלה - ההודעה האחרונה לא נשמרה.
 
-רגע אחד, אני מסכם ומסווג את מה ששיתפת.
+שלח/י /done כדי לשמור את מה שנאסף, ואז /dump כדי להמשיך.
 """,
     
+    "dump_auto_saved": "💾 *סשן ה\"שפוך הכול\" שלך נשמר אוטומטית* (לא התקבל /done)\n\n",
+    
+    "digest_daily_title": "🌙 *הסיכום היומי שלך*\n",
+    
+    "digest_weekly_title": "📅 *הסיכום השבועי שלך*\n",
+    
+    "digest_footer": "\n/list לכל הקטגוריות • /digest off להפסקת הסיכומים",
+    
+    "digest_status": """
+📬 *סיכומים תקופתיים*
+
+מצב נוכחי: *{current}*
+
+/digest daily - סיכום יומי
+/digest weekly - סיכום שבועי
+/digest off - ללא סיכומים
+""",
+    
+    "digest_updated": "✅ הסיכומים עודכנו: *{current}*",
+    
+    "page_expired": "⌛ רשימת התוצאות פגה. הריצו שוב את הפקודה כדי לדפדף.",
+    
+    "throttled_user": "🐢 רגע, הרבה הודעות בבת אחת! ההודעה לא טופלה - אפשר לשלוח שוב בעוד {seconds} שניות.",
+    
+    "throttled_global": "⏳ הבוט עמוס כרגע וההודעה לא טופלה. אפשר לשלוח שוב בעוד כמה שניות.",
+    
+    "already_saved": "♻️ כבר נשמר - המחשבה הזו כבר אצלך.",
+    
+    "dump_save_failed": "⚠️ לא הצלחתי לשמור את הסשן כרגע. המחשבות לא אבדו - אפשר לנסות שוב /done בעוד רגע.",
+    
     "empty_dump": """
 😊 לא נרשמו מחשבות במהלך הסשן.
 
@@ -187,13 +379,15 @@ MESSAGES = {
 
 *פקודות חיפוש:*
 /list או /topics - כל הקטגוריות והנושאים
-/topic <שם> - הצגת פריטים מקטגוריה ספציפית
+/topic <שם> - מחשבות לפי נושא או קטגוריה
+/tag <מילה> - מחשבות לפי מילת מפתח
 /today - מה נרשם היום
 /week - מה נרשם השבוע
 /search <מילה> - חיפוש חופשי בכל המחשבות
 
 *פקודות ניהול:*
 /stats - סטטיסטיקה אישית
+/digest - סיכום יומי/שבועי של המחשבות
 /export - ייצוא המידע לקובץ
 /clear - ניקוי כל המידע (זהירות!)
 
@@ -231,3 +425,8 @@ TIMEZONE = "Asia/Jerusalem"
 
 # לוג
 DEBUG_MODE = os.getenv("DEBUG", "False").lower() == "true"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG_MODE else "INFO").upper()
+# json (שורת JSON לכל רשומה) או text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# דגימת לוגי debug לפי מודול, למשל: nlp_analyzer=0.01,database=0.1
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
@@ -4,24 +4,305 @@
 """
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring, IndexModel, UpdateOne, ASCENDING, DESCENDING, TEXT, ReturnDocument
+from pymongo.errors import PyMongoError, DuplicateKeyError, BulkWriteError
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
+from contextvars import ContextVar
+import asyncio
+import functools
+import threading
+import time
 import logging
+import bson
 from config import (
-    MONGODB_URI, 
-    MONGODB_DB_NAME, 
+    DB_SLOW_QUERY_MS,
+    DB_DEADLINES_MS,
+    DB_SERVER_SELECTION_TIMEOUT_MS,
+    DB_CONNECT_TIMEOUT_MS,
+    DB_SOCKET_TIMEOUT_MS,
+    DB_READ_CACHE_SIZE,
+    DB_READ_CACHE_TTL_SECONDS,
+    MONGODB_POOL_SIZE,
+    UPDATE_DEDUP_MONGO,
+    UPDATE_DEDUP_TTL_SECONDS,
+    SESSION_TTL_SECONDS,
+    BOT_STATES,
     THOUGHT_STATUS,
     CATEGORIES,
     TOPICS
 )
+from metrics import metrics, startup_phases, SIZE_BUCKETS
+from cache import TTLCache
+from sharding import ShardRouter, Shard, SHARDED_COLLECTIONS
+import tracing
 
-# הגדרת לוגר
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+# שם המתודה של Database שמריצה כרגע פקודות מונגו
+# (Motor מעתיק את ה-context ל-thread שמריץ את הפקודה בפועל)
+_current_method: ContextVar[str] = ContextVar("db_method", default="unknown")
+
+# מטריקות ברמת מתודה
+_method_latency = metrics.histogram(
+    "db_method_seconds", "זמן ריצה של מתודות Database"
+)
+_method_documents = metrics.histogram(
+    "db_method_documents", "כמות מסמכים שהחזירה מתודה", SIZE_BUCKETS
+)
+_method_errors = metrics.counter(
+    "db_method_errors_total", "חריגות שנזרקו ממתודות Database"
+)
+
+# מטריקות ברמת פקודת מונגו
+_command_latency = metrics.histogram(
+    "mongo_command_seconds", "זמן ריצה של פקודות מונגו"
+)
+_command_documents = metrics.histogram(
+    "mongo_command_documents", "מסמכים שהוחזרו מפקודת מונגו", SIZE_BUCKETS
+)
+_command_bytes = metrics.histogram(
+    "mongo_command_reply_bytes", "גודל תשובת מונגו בבתים", SIZE_BUCKETS
+)
+_slow_commands = metrics.counter(
+    "mongo_slow_commands_total", "פקודות מונגו שעברו את סף האיטיות"
+)
+
+# מטריקות תקציבי זמן
+_deadline_exceeded = metrics.counter(
+    "db_deadline_exceeded_total", "שאילתות שחרגו מתקציב הזמן שלהן"
+)
+_degraded_reads = metrics.counter(
+    "db_degraded_reads_total", "תצוגות קריאה שהוגשו ממטמון או חלקית"
+)
+
+# מרווח ל-asyncio.wait_for מעבר ל-maxTimeMS, כדי שהשרת יבטל ראשון
+DEADLINE_GRACE_SECONDS = 0.5
+
+
+# האינדקסים הרצויים לכל collection.
+# השמות זהים לשמות ברירת המחדל של מונגו, כך שאינדקסים קיימים מזוהים
+INDEX_SPECS = {
+    "thoughts": [
+        # אינדקס על user_id ותאריך (לשליפות מהירות)
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING)],
+            name="user_id_1_created_at_-1"
+        ),
+        # אינדקס טקסט לחיפוש (Full Text Search)
+        IndexModel([("raw_text", TEXT)], name="raw_text_text"),
+        # אינדקס על קטגוריות
+        IndexModel(
+            [("nlp_analysis.category", ASCENDING)],
+            name="nlp_analysis.category_1"
+        ),
+        # אינדקס על סטטוס
+        IndexModel([("status", ASCENDING)], name="status_1"),
+        # סינון לפי נושא / מילת מפתח (אינדקסים multikey - מערכים) עם מיון לפי תאריך
+        IndexModel(
+            [("user_id", ASCENDING), ("nlp_analysis.topics", ASCENDING), ("created_at", DESCENDING)],
+            name="user_id_1_nlp_analysis.topics_1_created_at_-1"
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("nlp_analysis.keywords", ASCENDING), ("created_at", DESCENDING)],
+            name="user_id_1_nlp_analysis.keywords_1_created_at_-1"
+        ),
+        # זיהוי מחשבה כפולה (אותו טקסט מנורמל) בתוך חלון זמן
+        IndexModel(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING), ("created_at", DESCENDING)],
+            name="user_id_1_content_hash_1_created_at_-1"
+        ),
+    ],
+    "users": [
+        # שליפת משתמש לפי מזהה טלגרם
+        IndexModel([("user_id", ASCENDING)], name="user_id_1"),
+        # מנויים לסיכומים תקופתיים
+        IndexModel([("settings.digest", ASCENDING)], name="settings.digest_1"),
+    ],
+    # סבבי סיכום שכבר הופעלו (worker אחד לכל סבב)
+    "digest_runs": [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_1",
+            expireAfterSeconds=14 * 24 * 3600
+        ),
+    ],
+}
+
+if UPDATE_DEDUP_MONGO:
+    # update_id שכבר טופלו - נמחקים אוטומטית אחרי ה-TTL
+    INDEX_SPECS["processed_updates"] = [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_1",
+            expireAfterSeconds=UPDATE_DEDUP_TTL_SECONDS
+        ),
+    ]
+
+# מצב שיחה וסשנים של dump (גם סשנים שפונו מהזיכרון) -
+# נמחקים אחרי תקופה ארוכה בלי פעילות
+INDEX_SPECS["sessions"] = [
+    IndexModel(
+        [("updated_at", ASCENDING)],
+        name="updated_at_1",
+        expireAfterSeconds=SESSION_TTL_SECONDS
+    ),
+    # איתור סשני dump נטושים
+    IndexModel(
+        [("state", ASCENDING), ("updated_at", ASCENDING)],
+        name="state_1_updated_at_1"
+    ),
+]
+
+# משתמשים שעבודת רקע צריכה לטפל בהם (מסמך לכל משתמש, לא מערך במסמך העבודה)
+INDEX_SPECS["job_users"] = [
+    IndexModel(
+        [("job_id", ASCENDING), ("user_id", ASCENDING)],
+        name="job_id_1_user_id_1",
+        unique=True
+    ),
+]
+
+
+class DeadlineExceeded(Exception):
+    """
+    שאילתה חרגה מתקציב הזמן שלה
+    """
+
+
+def _is_timeout(error: BaseException) -> bool:
+    """
+    האם השגיאה היא חריגת זמן (של asyncio או של מונגו)
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return isinstance(error, PyMongoError) and error.timeout
+
+
+def track_operation(func):
+    """
+    דקורטור למתודות Database - מודד זמן ריצה וכמות מסמכים,
+    ומסמן את שם המתודה עבור ה-CommandListener
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_method.set(name)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"db.{name}"):
+                result = await func(*args, **kwargs)
+        except Exception:
+            _method_errors.inc(method=name)
+            raise
+        finally:
+            _method_latency.observe(time.perf_counter() - start, method=name)
+            _current_method.reset(token)
+
+        if isinstance(result, list):
+            _method_documents.observe(len(result), method=name)
+
+        return result
+
+    return wrapper
+
+
+def _filter_shape(value: Any) -> Any:
+    """
+    צורת הפילטר בלי הערכים עצמם (לא לכתוב תוכן משתמש ללוג)
+    """
+    if isinstance(value, dict):
+        return {key: _filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_filter_shape(item) for item in value[:3]]
+    return "?"
+
+
+def _command_filter(command_name: str, command: Dict) -> Any:
+    """
+    חילוץ הפילטר מתוך פקודת מונגו לפי סוג הפקודה
+    """
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter") or command.get("query")
+    if command_name == "aggregate":
+        return command.get("pipeline")
+    if command_name == "update":
+        updates = command.get("updates") or [{}]
+        return updates[0].get("q")
+    if command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        return deletes[0].get("q")
+    if command_name == "findAndModify":
+        return command.get("query")
+    return None
+
+
+def _reply_documents(reply: Dict) -> int:
+    """
+    כמות המסמכים שהוחזרו בתשובת מונגו
+    """
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch")
+        if batch is None:
+            batch = cursor.get("nextBatch", [])
+        return len(batch)
+    return int(reply.get("n", 0))
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """
+    מאזין לפקודות מונגו - רושם זמני ריצה, מסמכים ובתים
+    לפי שם מתודה וסוג פקודה, ומתעד פקודות איטיות
+    """
+
+    def __init__(self, slow_threshold_ms: int = DB_SLOW_QUERY_MS):
+        self.slow_threshold = slow_threshold_ms / 1000
+        # פקודות פעילות: (connection, request_id) -> (מתודה, פקודה)
+        self._inflight: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        key = (event.connection_id, event.request_id)
+        with self._lock:
+            self._inflight[key] = (_current_method.get(), event.command)
+
+    def _finish(self, event, status: str, reply: Optional[Dict] = None):
+        key = (event.connection_id, event.request_id)
+        with self._lock:
+            method, command = self._inflight.pop(key, ("unknown", {}))
+
+        command_name = event.command_name
+        duration = event.duration_micros / 1_000_000
+        _command_latency.observe(
+            duration, method=method, command=command_name, status=status
+        )
+
+        if reply is not None:
+            _command_documents.observe(
+                _reply_documents(reply), method=method, command=command_name
+            )
+            _command_bytes.observe(
+                len(bson.encode(reply)), method=method, command=command_name
+            )
+
+        if duration >= self.slow_threshold:
+            _slow_commands.inc(method=method, command=command_name)
+            logger.warning(
+                "🐢 פקודת מונגו איטית: %s.%s %.0fms filter=%s",
+                method,
+                command_name,
+                duration * 1000,
+                _filter_shape(_command_filter(command_name, command))
+            )
+
+    def succeeded(self, event):
+        self._finish(event, "ok", event.reply)
+
+    def failed(self, event):
+        self._finish(event, "error")
+
 
 class Database:
     """
@@ -34,54 +315,110 @@ class Database:
         self.db = None
         self.thoughts_collection = None
         self.users_collection = None
+        self.processed_updates_collection = None
+        self.sessions_collection = None
+        self.summaries_collection = None
+        self.digest_runs_collection = None
+        self.jobs_collection = None
+        self.job_users_collection = None
+        self.command_listener = CommandLatencyListener()
+        # נתוני המשתמשים מחולקים בין shards לפי user_id
+        self.router = ShardRouter()
+        self._index_task: Optional[asyncio.Task] = None
+        self._assignments_task: Optional[asyncio.Task] = None
+        # תוצאות אחרונות של תצוגות קריאה (לשימוש כשחורגים מהתקציב)
+        self._read_cache = TTLCache(
+            "db_reads", DB_READ_CACHE_SIZE, DB_READ_CACHE_TTL_SECONDS
+        )
     
     async def connect(self):
         """
         יצירת חיבור למונגו DB
         """
         try:
-            self.client = AsyncIOMotorClient(MONGODB_URI)
-            self.db = self.client[MONGODB_DB_NAME]
+            self.router.connect(self._create_client)
+            
+            # ה-shard הראשי - גם הנתונים המשותפים לכל ה-workers
+            primary = self.router.primary
+            self.client = primary.client
+            self.db = primary.db
             self.thoughts_collection = self.db.thoughts
             self.users_collection = self.db.users
+            self.processed_updates_collection = self.db.processed_updates
+            self.sessions_collection = self.db.sessions
+            self.summaries_collection = self.db.user_summaries
+            self.digest_runs_collection = self.db.digest_runs
+            self.jobs_collection = self.db.jobs
+            self.job_users_collection = self.db.job_users
+            
+            # מיגרציית אינדקסים ברקע - לא חוסמת את עליית השרת
+            self._index_task = asyncio.create_task(self.ensure_indexes())
             
-            # יצירת אינדקסים
-            await self._create_indexes()
+            if self.router.sharded:
+                await self.router.refresh_assignments()
+                self._assignments_task = asyncio.create_task(
+                    self.router.run_assignment_refresher()
+                )
             
-            logger.info("✅ התחברות למונגו DB הצליחה")
+            logger.info(f"✅ התחברות למונגו DB הצליחה ({len(self.router.shards)} shards)")
             return True
             
         except Exception as e:
             logger.error(f"❌ שגיאה בהתחברות למונגו: {e}")
             return False
     
-    async def _create_indexes(self):
+    def _create_client(self, uri: str) -> AsyncIOMotorClient:
+        """לקוח (ומאגר חיבורים) לאשכול אחד"""
+        return AsyncIOMotorClient(
+            uri,
+            event_listeners=[self.command_listener],
+            serverSelectionTimeoutMS=DB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=DB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=DB_SOCKET_TIMEOUT_MS,
+            maxPoolSize=MONGODB_POOL_SIZE
+        )
+    
+    def _shard(self, user_id: int) -> Shard:
+        """ה-shard שמחזיק את הנתונים של המשתמש"""
+        return self.router.shard_for(user_id)
+    
+    async def ensure_indexes(self):
         """
-        יצירת אינדקסים לביצועים מיטביים
+        מיגרציית אינדקסים אידמפוטנטית - משווה לאינדקסים הקיימים
+        ובונה רק את מה שחסר (בפקודה אחת לכל collection)
         """
+        start = time.perf_counter()
+        created = []
+        
         try:
-            # אינדקס על user_id ותאריך (לשליפות מהירות)
-            await self.thoughts_collection.create_index([
-                ("user_id", 1),
-                ("created_at", -1)
-            ])
+            for shard in self.router.all():
+                for collection_name, models in INDEX_SPECS.items():
+                    # ב-shards משניים יש רק נתוני משתמשים
+                    if shard is not self.router.primary and collection_name not in SHARDED_COLLECTIONS:
+                        continue
+                    
+                    collection = shard.db[collection_name]
+                    existing = await collection.index_information()
+                    
+                    missing = [
+                        model for model in models
+                        if model.document["name"] not in existing
+                    ]
+                    if not missing:
+                        continue
+                    
+                    names = await collection.create_indexes(missing)
+                    created.extend(
+                        f"{shard.name}:{collection_name}.{name}" for name in names
+                    )
             
-            # אינדקס טקסט לחיפוש (Full Text Search)
-            await self.thoughts_collection.create_index([
-                ("raw_text", "text")
-            ])
+            elapsed = time.perf_counter() - start
+            startup_phases.observe(elapsed, phase="indexes")
             
-            # אינדקס על קטגוריות
-            await self.thoughts_collection.create_index([
-                ("nlp_analysis.category", 1)
-            ])
-            
-            # אינדקס על סטטוס
-            await self.thoughts_collection.create_index([
-                ("status", 1)
-            ])
-            
-            logger.info("✅ אינדקסים נוצרו בהצלחה")
+            if created:
+                logger.info(f"✅ אינדקסים נוצרו ({elapsed:.2f}s): {created}")
+            else:
+                logger.info(f"✅ כל האינדקסים קיימים ({elapsed:.2f}s)")
             
         except Exception as e:
             logger.error(f"⚠️ שגיאה ביצירת אינדקסים: {e}")
@@ -90,18 +427,113 @@ class Database:
         """
         סגירת החיבור למונגו
         """
+        for task in (self._index_task, self._assignments_task):
+            if task and not task.done():
+                task.cancel()
+        
         if self.client:
-            self.client.close()
+            self.router.close()
             logger.info("🔌 חיבור למונגו נסגר")
     
+    # ===== תקציבי זמן =====
+    
+    @staticmethod
+    def _deadline_ms(query_class: str) -> int:
+        """תקציב הזמן (במילישניות) של סוג שאילתה"""
+        return DB_DEADLINES_MS[query_class]
+    
+    async def _with_deadline(self, query_class: str, awaitable):
+        """
+        הרצת פעולה תחת תקציב הזמן של סוג השאילתה
+        
+        Raises:
+            DeadlineExceeded: אם הפעולה חרגה מהתקציב
+        """
+        timeout = self._deadline_ms(query_class) / 1000 + DEADLINE_GRACE_SECONDS
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except Exception as e:
+            if _is_timeout(e):
+                _deadline_exceeded.inc(
+                    method=_current_method.get(),
+                    query_class=query_class
+                )
+                raise DeadlineExceeded(query_class) from e
+            raise
+    
+    async def _collect(
+        self,
+        cursor,
+        query_class: str,
+        limit: int
+    ) -> tuple[List[Dict], bool]:
+        """
+        קריאת cursor תחת תקציב זמן
+        
+        Returns:
+            (המסמכים שנקראו, האם הקריאה הושלמה)
+        """
+        cursor = cursor.max_time_ms(self._deadline_ms(query_class))
+        results = []
+        
+        async def fill():
+            async for doc in cursor:
+                results.append(doc)
+                if len(results) >= limit:
+                    break
+        
+        try:
+            await self._with_deadline(query_class, fill())
+            return results, True
+        except DeadlineExceeded:
+            return results, False
+    
+    def _degraded_read(self, key: tuple, partial: Any) -> Any:
+        """
+        תוצאה חלופית לתצוגת קריאה שחרגה מהתקציב:
+        התוצאה האחרונה מהמטמון אם יש, אחרת מה שהספקנו לקרוא
+        """
+        cached = self._read_cache.get(key)
+        if cached is not None:
+            _degraded_reads.inc(method=key[0], source="cache")
+            logger.warning(f"⏱️ {key[0]}: חריגה מהתקציב - מוגשת תוצאה מהמטמון")
+            return cached
+        
+        _degraded_reads.inc(method=key[0], source="partial")
+        logger.warning(f"⏱️ {key[0]}: חריגה מהתקציב - מוגשת תוצאה חלקית")
+        return partial
+    
+    def get_operation_stats(self) -> Dict[str, List[Dict]]:
+        """
+        סטטיסטיקות ביצועים של פעולות הדאטהבייס
+        
+        Returns:
+            מילון: {שם מטריקה: רשימת סדרות לפי תוויות}
+        """
+        names = [
+            "db_method_seconds",
+            "db_method_documents",
+            "db_method_errors_total",
+            "mongo_command_seconds",
+            "mongo_command_documents",
+            "mongo_command_reply_bytes",
+            "mongo_slow_commands_total",
+            "db_deadline_exceeded_total",
+            "db_degraded_reads_total",
+        ]
+        snapshot = metrics.snapshot()
+        return {name: snapshot.get(name, []) for name in names}
+    
     # ===== פעולות על מחשבות (Thoughts) =====
     
+    @track_operation
     async def save_thought(
         self,
         user_id: int,
         raw_text: str,
         nlp_analysis: Dict[str, Any],
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        content_hash: Optional[str] = None
     ) -> str:
         """
         שמירת מחשבה חדשה
@@ -111,6 +543,7 @@ class Database:
             raw_text: הטקסט המקורי
             nlp_analysis: תוצאות ניתוח NLP
             metadata: מידע נוסף (אופציונלי)
+            content_hash: טביעת הטקסט המנורמל (לזיהוי כפילויות)
         
         Returns:
             מזהה המחשבה שנשמרה
@@ -124,9 +557,14 @@ class Database:
                 "status": THOUGHT_STATUS["ACTIVE"],
                 "metadata": metadata or {}
             }
+            if content_hash:
+                thought["content_hash"] = content_hash
             
-            result = await self.thoughts_collection.insert_one(thought)
-            logger.info(f"💾 מחשבה נשמרה: {result.inserted_id}")
+            result = await self._with_deadline(
+                "write",
+                self._shard(user_id).thoughts.insert_one(thought)
+            )
+            logger.debug("💾 מחשבה נשמרה: %s", result.inserted_id)
             
             return str(result.inserted_id)
             
@@ -134,6 +572,70 @@ class Database:
             logger.error(f"❌ שגיאה בשמירת מחשבה: {e}")
             raise
     
+    @track_operation
+    async def save_thoughts(
+        self,
+        user_id: int,
+        thoughts: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        שמירת כמה מחשבות בפקודה אחת (למשל בסיום סשן dump)
+        
+        Args:
+            user_id: מזהה המשתמש
+            thoughts: רשימת {"text": הטקסט המקורי, "analysis": תוצאות ניתוח NLP,
+                      "content_hash": טביעת הטקסט (אופציונלי)}.
+                      כל רשומה מקבלת "_id" קבוע בקריאה הראשונה - שמירה
+                      חוזרת של אותן רשומות (אחרי כישלון או חריגת זמן)
+                      לא יוצרת כפילויות
+        
+        Returns:
+            מזהי המחשבות שנשמרו, לפי הסדר
+        """
+        if not thoughts:
+            return []
+        
+        try:
+            from bson import ObjectId
+            
+            # מילישנייה בין מחשבה למחשבה - כדי שהמיון לפי זמן ישמור על הסדר
+            # (מונגו שומר זמנים ברזולוציה של מילישניות)
+            now = datetime.utcnow()
+            documents = []
+            for i, thought in enumerate(thoughts):
+                thought.setdefault("_id", ObjectId())
+                document = {
+                    "_id": thought["_id"],
+                    "user_id": user_id,
+                    "raw_text": thought["text"],
+                    "created_at": now + timedelta(milliseconds=i),
+                    "nlp_analysis": thought["analysis"],
+                    "status": THOUGHT_STATUS["ACTIVE"],
+                    "metadata": {}
+                }
+                if thought.get("content_hash"):
+                    document["content_hash"] = thought["content_hash"]
+                documents.append(document)
+            
+            try:
+                await self._with_deadline(
+                    "write",
+                    self._shard(user_id).thoughts.insert_many(documents, ordered=False)
+                )
+            except BulkWriteError as e:
+                # מחשבות שכבר נשמרו בניסיון קודם - לא שגיאה
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            
+            logger.debug("💾 %d מחשבות נשמרו למשתמש %s", len(documents), user_id)
+            
+            return [str(document["_id"]) for document in documents]
+            
+        except Exception as e:
+            logger.error(f"❌ שגיאה בשמירת מחשבות: {e}")
+            raise
+    
+    @track_operation
     async def get_user_thoughts(
         self,
         user_id: int,
@@ -143,7 +645,9 @@ class Database:
         topic: Optional[str] = None,
         status: Optional[str] = None,
         from_date: Optional[datetime] = None,
-        to_date: Optional[datetime] = None
+        to_date: Optional[datetime] = None,
+        keyword: Optional[str] = None,
+        projection: Optional[List[str]] = None
     ) -> List[Dict]:
         """
         שליפת מחשבות של משתמש עם אפשרויות סינון
@@ -157,6 +661,8 @@ class Database:
             status: סינון לפי סטטוס
             from_date: מתאריך
             to_date: עד תאריך
+            keyword: סינון לפי מילת מפתח
+            projection: רק השדות האלה (למשל ["_id"] לרשימת מזהים)
         
         Returns:
             רשימת מחשבות
@@ -171,6 +677,9 @@ class Database:
             if topic:
                 query["nlp_analysis.topics"] = topic
             
+            if keyword:
+                query["nlp_analysis.keywords"] = keyword
+            
             if status:
                 query["status"] = status
             else:
@@ -186,13 +695,24 @@ class Database:
                     query["created_at"]["$lte"] = to_date
             
             # שליפה
-            cursor = self.thoughts_collection.find(query).sort(
+            fields = {field: 1 for field in projection} if projection else None
+            cursor = self._shard(user_id).thoughts.find(query, fields).sort(
                 "created_at", -1
             ).skip(skip).limit(limit)
             
-            thoughts = await cursor.to_list(length=limit)
+            cache_key = (
+                "get_user_thoughts", user_id, limit, skip,
+                category, topic, status, from_date, to_date,
+                keyword, tuple(projection) if projection else None
+            )
+            thoughts, complete = await self._collect(cursor, "list", limit)
+            
+            if not complete:
+                return self._degraded_read(cache_key, thoughts)
             
-            logger.info(f"📥 נשלפו {len(thoughts)} מחשבות למשתמש {user_id}")
+            self._read_cache.set(cache_key, thoughts)
+            
+            logger.debug("📥 נשלפו %d מחשבות למשתמש %s", len(thoughts), user_id)
             
             return thoughts
             
@@ -200,6 +720,7 @@ class Database:
             logger.error(f"❌ שגיאה בשליפת מחשבות: {e}")
             return []
     
+    @track_operation
     async def search_thoughts(
         self,
         user_id: int,
@@ -225,16 +746,22 @@ class Database:
                 "$text": {"$search": search_term}
             }
             
-            cursor = self.thoughts_collection.find(
+            cursor = self._shard(user_id).thoughts.find(
                 query,
                 {"score": {"$meta": "textScore"}}
             ).sort(
                 [("score", {"$meta": "textScore"})]
             ).limit(limit)
             
-            results = await cursor.to_list(length=limit)
+            cache_key = ("search_thoughts", user_id, search_term, limit)
+            results, complete = await self._collect(cursor, "search", limit)
+            
+            if not complete:
+                return self._degraded_read(cache_key, results)
             
-            logger.info(f"🔍 נמצאו {len(results)} תוצאות עבור '{search_term}'")
+            self._read_cache.set(cache_key, results)
+            
+            logger.debug("🔍 נמצאו %d תוצאות עבור '%s'", len(results), search_term)
             
             return results
             
@@ -242,6 +769,7 @@ class Database:
             logger.error(f"❌ שגיאה בחיפוש: {e}")
             return []
     
+    @track_operation
     async def get_thoughts_by_date_range(
         self,
         user_id: int,
@@ -257,14 +785,87 @@ class Database:
         Returns:
             רשימת מחשבות
         """
-        from_date = datetime.utcnow() - timedelta(days=days_back)
+        # עיגול לדקה - כדי שקריאות חוזרות ייפלו על אותו מפתח במטמון
+        from_date = (datetime.utcnow() - timedelta(days=days_back)).replace(
+            second=0, microsecond=0
+        )
         
         return await self.get_user_thoughts(
             user_id=user_id,
             from_date=from_date,
             limit=100
         )
-    
+
+    @track_operation
+    async def get_thoughts_by_ids(
+        self,
+        user_id: int,
+        thought_ids: List[str]
+    ) -> List[Dict]:
+        """
+        שליפת מחשבות לפי מזהים (למשל עמוד מתוך תוצאות שמורות)
+
+        Args:
+            user_id: מזהה המשתמש (מחשבות של משתמש אחר לא יוחזרו)
+            thought_ids: המזהים, בסדר הרצוי
+
+        Returns:
+            המחשבות הפעילות מתוך הרשימה, לפי סדר המזהים
+        """
+        if not thought_ids:
+            return []
+
+        try:
+            from bson import ObjectId
+
+            cursor = self._shard(user_id).thoughts.find({
+                "_id": {"$in": [ObjectId(thought_id) for thought_id in thought_ids]},
+                "user_id": user_id,
+                "status": THOUGHT_STATUS["ACTIVE"]
+            })
+
+            found, _ = await self._collect(cursor, "list", len(thought_ids))
+            by_id = {str(thought["_id"]): thought for thought in found}
+
+            return [by_id[thought_id] for thought_id in thought_ids if thought_id in by_id]
+
+        except Exception as e:
+            logger.error(f"❌ שגיאה בשליפת מחשבות לפי מזהים: {e}")
+            return []
+
+    @track_operation
+    async def find_duplicate_thought(
+        self,
+        user_id: int,
+        content_hash: str,
+        since: datetime
+    ) -> Optional[Dict]:
+        """
+        מחשבה פעילה עם אותו טקסט (מנורמל) שנשמרה מאז since
+
+        Returns:
+            {"_id", "created_at"} של המחשבה, או None אם אין
+            (גם בשגיאה - עדיף לשמור פעמיים מאשר לאבד מחשבה)
+        """
+        try:
+            return await self._with_deadline(
+                "write",
+                self._shard(user_id).thoughts.find_one(
+                    {
+                        "user_id": user_id,
+                        "content_hash": content_hash,
+                        "created_at": {"$gte": since},
+                        "status": THOUGHT_STATUS["ACTIVE"]
+                    },
+                    {"_id": 1, "created_at": 1}
+                )
+            )
+
+        except Exception as e:
+            logger.error(f"❌ שגיאה בבדיקת כפילות: {e}")
+            return None
+
+    @track_operation
     async def get_category_summary(self, user_id: int) -> Dict[str, int]:
         """
         סיכום כמות מחשבות לפי קטגוריות
@@ -291,11 +892,22 @@ class Database:
                 }
             ]
             
-            results = await self.thoughts_collection.aggregate(pipeline).to_list(None)
+            cache_key = ("get_category_summary", user_id)
+            try:
+                results = await self._with_deadline(
+                    "aggregate",
+                    self._shard(user_id).thoughts.aggregate(
+                        pipeline,
+                        maxTimeMS=self._deadline_ms("aggregate")
+                    ).to_list(None)
+                )
+            except DeadlineExceeded:
+                return self._degraded_read(cache_key, {})
             
             summary = {item["_id"]: item["count"] for item in results if item["_id"]}
+            self._read_cache.set(cache_key, summary)
             
-            logger.info(f"📊 סיכום קטגוריות למשתמש {user_id}: {summary}")
+            logger.debug("📊 סיכום קטגוריות למשתמש %s: %s", user_id, summary)
             
             return summary
             
@@ -303,6 +915,7 @@ class Database:
             logger.error(f"❌ שגיאה בסיכום קטגוריות: {e}")
             return {}
     
+    @track_operation
     async def get_topic_summary(self, user_id: int) -> Dict[str, int]:
         """
         סיכום כמות מחשבות לפי נושאים
@@ -331,9 +944,20 @@ class Database:
                 {"$sort": {"count": -1}}
             ]
             
-            results = await self.thoughts_collection.aggregate(pipeline).to_list(None)
+            cache_key = ("get_topic_summary", user_id)
+            try:
+                results = await self._with_deadline(
+                    "aggregate",
+                    self._shard(user_id).thoughts.aggregate(
+                        pipeline,
+                        maxTimeMS=self._deadline_ms("aggregate")
+                    ).to_list(None)
+                )
+            except DeadlineExceeded:
+                return self._degraded_read(cache_key, {})
             
             summary = {item["_id"]: item["count"] for item in results if item["_id"]}
+            self._read_cache.set(cache_key, summary)
             
             return summary
             
@@ -341,6 +965,7 @@ class Database:
             logger.error(f"❌ שגיאה בסיכום נושאים: {e}")
             return {}
     
+    @track_operation
     async def update_thought_status(
         self,
         thought_id: str,
@@ -359,17 +984,33 @@ class Database:
         try:
             from bson import ObjectId
             
-            result = await self.thoughts_collection.update_one(
-                {"_id": ObjectId(thought_id)},
-                {"$set": {"status": new_status}}
-            )
+            # רק המזהה ידוע - מחפשים בכל ה-shards
+            previous = None
+            for shard in self.router.all():
+                previous = await self._with_deadline(
+                    "write",
+                    shard.thoughts.find_one_and_update(
+                        {"_id": ObjectId(thought_id)},
+                        {"$set": {"status": new_status}},
+                        projection={"user_id": 1, "status": 1}
+                    )
+                )
+                if previous:
+                    break
+            
+            if not previous or previous.get("status") == new_status:
+                return False
             
-            return result.modified_count > 0
+            # הסיכום המצטבר כבר לא מדויק - ייבנה מחדש בקריאה הבאה
+            await self.invalidate_user_summary(previous["user_id"])
+            
+            return True
             
         except Exception as e:
             logger.error(f"❌ שגיאה בעדכון סטטוס: {e}")
             return False
     
+    @track_operation
     async def delete_all_user_thoughts(self, user_id: int) -> int:
         """
         מחיקה מוחלטת של כל מחשבות המשתמש
@@ -381,10 +1022,14 @@ class Database:
             כמות המחשבות שנמחקו
         """
         try:
-            result = await self.thoughts_collection.delete_many(
-                {"user_id": user_id}
+            result = await self._with_deadline(
+                "export",
+                self._shard(user_id).thoughts.delete_many({"user_id": user_id})
             )
             
+            self._read_cache.discard_where(lambda key: key[1] == user_id)
+            await self.invalidate_user_summary(user_id)
+            
             logger.warning(f"🗑️ נמחקו {result.deleted_count} מחשבות למשתמש {user_id}")
             
             return result.deleted_count
@@ -393,8 +1038,746 @@ class Database:
             logger.error(f"❌ שגיאה במחיקת מחשבות: {e}")
             return 0
     
+    # ===== סיכומים מצטברים (ל-/list) =====
+    
+    @track_operation
+    async def get_user_summary(self, user_id: int) -> Optional[Dict[str, Dict[str, int]]]:
+        """
+        שליפת הסיכום המצטבר של המשתמש
+        
+        Returns:
+            {"categories": {...}, "topics": {...}} או None אם עדיין לא נבנה
+        """
+        try:
+            doc = await self._with_deadline(
+                "list",
+                self._shard(user_id).summaries.find_one({"_id": user_id})
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה בשליפת סיכום: {e}")
+            return None
+        
+        if not doc:
+            return None
+        
+        return {
+            "categories": {k: v for k, v in doc.get("categories", {}).items() if v > 0},
+            "topics": {k: v for k, v in doc.get("topics", {}).items() if v > 0}
+        }
+    
+    @track_operation
+    async def rebuild_user_summary(self, user_id: int) -> Dict[str, Dict[str, int]]:
+        """
+        בנייה מחדש של הסיכום המצטבר מתוך המחשבות (אגרגציה מלאה)
+        
+        Returns:
+            {"categories": {...}, "topics": {...}}
+        """
+        categories, topics = await asyncio.gather(
+            self.get_category_summary(user_id),
+            self.get_topic_summary(user_id)
+        )
+        summary = {"categories": categories, "topics": topics}
+        
+        try:
+            await self._with_deadline(
+                "write",
+                self._shard(user_id).summaries.replace_one(
+                    {"_id": user_id},
+                    {**summary, "updated_at": datetime.utcnow()},
+                    upsert=True
+                )
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה בשמירת סיכום: {e}")
+        
+        return summary
+    
+    @track_operation
+    async def bump_user_summary(self, user_id: int, analyses: List[Dict[str, Any]]):
+        """
+        עדכון הסיכום המצטבר אחרי שמירת מחשבות חדשות
+        
+        מעדכן רק סיכום שכבר קיים - סיכום חסר ייבנה במלואו בקריאה הבאה
+        
+        Args:
+            user_id: מזהה המשתמש
+            analyses: תוצאות ה-NLP של המחשבות שנשמרו
+        """
+        increments: Dict[str, int] = {}
+        for analysis in analyses:
+            fields = [("categories", analysis.get("category"))]
+            fields += [("topics", topic) for topic in analysis.get("topics", [])]
+            for group, name in fields:
+                # שמות עם נקודה או $ אינם חוקיים כשדה במונגו
+                if not name or "." in name or name.startswith("$"):
+                    continue
+                key = f"{group}.{name}"
+                increments[key] = increments.get(key, 0) + 1
+        
+        if not increments:
+            return
+        
+        try:
+            await self._with_deadline(
+                "write",
+                self._shard(user_id).summaries.update_one(
+                    {"_id": user_id},
+                    {
+                        "$inc": increments,
+                        "$set": {"updated_at": datetime.utcnow()}
+                    }
+                )
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה בעדכון סיכום: {e}")
+    
+    @track_operation
+    async def invalidate_user_summary(self, user_id: int):
+        """
+        מחיקת הסיכום המצטבר (אחרי שינוי שלא ניתן לעדכן בהפרש)
+        """
+        try:
+            await self._with_deadline(
+                "write",
+                self._shard(user_id).summaries.delete_one({"_id": user_id})
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה במחיקת סיכום: {e}")
+    
+    # ===== עדכוני טלגרם =====
+    
+    @track_operation
+    async def claim_update(self, update_id: int) -> bool:
+        """
+        סימון עדכון כמטופל (משותף לכל ה-workers)
+        
+        Args:
+            update_id: מזהה העדכון מטלגרם
+        
+        Returns:
+            True אם העדכון נתפס עכשיו, False אם כבר טופל בעבר
+        """
+        try:
+            await self._with_deadline(
+                "write",
+                self.processed_updates_collection.insert_one({
+                    "_id": update_id,
+                    "created_at": datetime.utcnow()
+                })
+            )
+            return True
+            
+        except DuplicateKeyError:
+            return False
+            
+        except Exception as e:
+            # עדיף לעבד פעמיים מאשר לאבד עדכון
+            logger.error(f"❌ שגיאה ברישום עדכון {update_id}: {e}")
+            return True
+    
+    # ===== סיכומים תקופתיים (digest) =====
+    
+    @track_operation
+    async def set_digest_preference(self, user_id: int, period: str) -> bool:
+        """
+        עדכון תדירות הסיכום של המשתמש
+        
+        Args:
+            user_id: מזהה המשתמש
+            period: daily / weekly / off
+        
+        Returns:
+            האם העדכון הצליח
+        """
+        try:
+            result = await self._with_deadline(
+                "write",
+                self._shard(user_id).users.update_one(
+                    {"user_id": user_id},
+                    {"$set": {"settings.digest": period}}
+                )
+            )
+            return result.matched_count > 0
+            
+        except Exception as e:
+            logger.error(f"❌ שגיאה בעדכון הגדרת סיכום: {e}")
+            return False
+    
+    @track_operation
+    async def get_digest_subscribers(self, period: str) -> List[int]:
+        """
+        כל המשתמשים שנרשמו לסיכום בתדירות הזו (והתראות לא כבויות)
+        
+        Returns:
+            רשימת מזהי משתמשים
+        """
+        try:
+            user_ids = set()
+            for shard in self.router.all():
+                docs = await self._with_deadline(
+                    "export",
+                    shard.users.find(
+                        {
+                            "settings.digest": period,
+                            "settings.notifications": {"$ne": False}
+                        },
+                        {"user_id": 1, "_id": 0},
+                        max_time_ms=self._deadline_ms("export")
+                    ).to_list(None)
+                )
+                # משתמש באמצע העברה יכול להופיע בשני shards
+                user_ids.update(doc["user_id"] for doc in docs)
+            return sorted(user_ids)
+            
+        except Exception as e:
+            logger.error(f"❌ שגיאה בשליפת מנויים לסיכום: {e}")
+            return []
+    
+    @track_operation
+    async def claim_digest_run(self, run_id: str) -> bool:
+        """
+        תפיסת סבב סיכום (כדי שרק worker אחד ישלח אותו)
+        
+        Returns:
+            True אם הסבב נתפס עכשיו
+        """
+        try:
+            await self._with_deadline(
+                "write",
+                self.digest_runs_collection.insert_one({
+                    "_id": run_id,
+                    "created_at": datetime.utcnow()
+                })
+            )
+            return True
+            
+        except DuplicateKeyError:
+            return False
+            
+        except Exception as e:
+            # עדיף לדלג על סבב מאשר לשלוח אותו פעמיים
+            logger.error(f"❌ שגיאה בתפיסת סבב סיכום {run_id}: {e}")
+            return False
+    
+    @track_operation
+    async def get_digest_summaries(
+        self,
+        user_ids: List[int],
+        since: datetime
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        סיכום המחשבות מהתקופה לכמה משתמשים - באגרגציה אחת
+        
+        Args:
+            user_ids: המשתמשים בסבב
+            since: תחילת התקופה (UTC)
+        
+        Returns:
+            {user_id: {"total": int, "categories": {קטגוריה: כמות}}}
+            (משתמשים בלי מחשבות בתקופה לא מופיעים)
+        """
+        if not user_ids:
+            return {}
+        
+        # אגרגציה אחת לכל shard, רק על המשתמשים שלו
+        results = []
+        for shard_name, shard_users in self.router.group(user_ids).items():
+            results.extend(await self._digest_summaries_on(
+                self.router.shards[shard_name], shard_users, since
+            ))
+        
+        return {
+            item["_id"]: {
+                "total": item["total"],
+                "categories": {
+                    category["name"]: category["count"]
+                    for category in item["categories"]
+                    if category["name"]
+                }
+            }
+            for item in results
+        }
+    
+    async def _digest_summaries_on(
+        self,
+        shard: Shard,
+        user_ids: List[int],
+        since: datetime
+    ) -> List[Dict]:
+        """
+        אגרגציית הסיכומים על shard אחד (רשימה ריקה בשגיאה)
+        """
+        pipeline = [
+            {
+                "$match": {
+                    "user_id": {"$in": user_ids},
+                    "created_at": {"$gte": since},
+                    "status": THOUGHT_STATUS["ACTIVE"]
+                }
+            },
+            {
+                "$group": {
+                    "_id": {"user_id": "$user_id", "category": "$nlp_analysis.category"},
+                    "count": {"$sum": 1}
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$_id.user_id",
+                    "total": {"$sum": "$count"},
+                    "categories": {"$push": {"name": "$_id.category", "count": "$count"}}
+                }
+            }
+        ]
+        
+        try:
+            return await self._with_deadline(
+                "export",
+                shard.thoughts.aggregate(
+                    pipeline,
+                    maxTimeMS=self._deadline_ms("export")
+                ).to_list(None)
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה בחישוב סיכומים ({shard.name}): {e}")
+            return []
+    
+    # ===== עבודות רקע (ניתוח מחדש) =====
+    
+    @track_operation
+    async def claim_job(self, job_id: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        תפיסת עבודת רקע (worker אחד בכל פעם) - המסמך נוצר אם עוד אין
+        
+        Returns:
+            מסמך העבודה (עם נקודת ההמשך), או None אם worker אחר מחזיק בה
+        """
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=lease_seconds)
+        
+        job = await self._with_deadline(
+            "write",
+            self.jobs_collection.find_one_and_update(
+                {"_id": job_id, "lease_until": {"$not": {"$gt": now}}},
+                {"$set": {"lease_until": lease_until}},
+                return_document=ReturnDocument.AFTER
+            )
+        )
+        if job is not None:
+            return job
+        
+        try:
+            job = {"_id": job_id, "lease_until": lease_until, "created_at": now}
+            await self._with_deadline("write", self.jobs_collection.insert_one(job))
+            return job
+        except DuplicateKeyError:
+            return None
+    
+    @track_operation
+    async def update_job(
+        self,
+        job_id: str,
+        fields: Dict[str, Any],
+        lease_seconds: Optional[float] = None
+    ):
+        """
+        שמירת נקודת ההמשך של עבודה (והארכת ההחזקה בה)
+        
+        Args:
+            fields: שדות לעדכון ($set)
+            lease_seconds: הארכת ההחזקה; None משחרר אותה
+        """
+        lease_until = (
+            datetime.utcnow() + timedelta(seconds=lease_seconds)
+            if lease_seconds else None
+        )
+        update: Dict[str, Any] = {
+            "$set": {**fields, "lease_until": lease_until, "updated_at": datetime.utcnow()}
+        }
+        
+        await self._with_deadline(
+            "write",
+            self.jobs_collection.update_one({"_id": job_id}, update)
+        )
+    
+    @track_operation
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        """מסמך העבודה (למצב ולהתקדמות)"""
+        return await self._with_deadline(
+            "list",
+            self.jobs_collection.find_one({"_id": job_id})
+        )
+    
+    @track_operation
+    async def add_job_users(self, job_id: str, user_ids: List[int]):
+        """
+        רישום משתמשים שהעבודה צריכה לטפל בהם (משתמש שכבר רשום - בלי שינוי)
+        """
+        if not user_ids:
+            return
+        
+        now = datetime.utcnow()
+        await self._with_deadline(
+            "write",
+            self.job_users_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"job_id": job_id, "user_id": user_id},
+                        {"$setOnInsert": {"created_at": now}},
+                        upsert=True
+                    )
+                    for user_id in user_ids
+                ],
+                ordered=False
+            )
+        )
+    
+    @track_operation
+    async def get_job_users(
+        self,
+        job_id: str,
+        after_user: Optional[int],
+        limit: int
+    ) -> List[int]:
+        """
+        עמוד של משתמשים רשומים לעבודה, לפי סדר user_id
+        
+        Args:
+            after_user: ה-user_id האחרון שכבר טופל (None - מההתחלה)
+        """
+        query: Dict[str, Any] = {"job_id": job_id}
+        if after_user is not None:
+            query["user_id"] = {"$gt": after_user}
+        
+        cursor = self.job_users_collection.find(
+            query, {"_id": 0, "user_id": 1}
+        ).sort("user_id", ASCENDING).limit(limit)
+        
+        users, complete = await self._collect(cursor, "list", limit)
+        if not complete:
+            raise DeadlineExceeded("list")
+        return [user["user_id"] for user in users]
+    
+    @track_operation
+    async def count_job_users(self, job_id: str) -> int:
+        """כמה משתמשים רשומים לעבודה"""
+        return await self._with_deadline(
+            "aggregate",
+            self.job_users_collection.count_documents({"job_id": job_id})
+        )
+    
+    @track_operation
+    async def clear_job_users(self, job_id: str):
+        """מחיקת המשתמשים הרשומים לעבודה (בהתחלה מחדש ובסיום)"""
+        await self._with_deadline(
+            "export",
+            self.job_users_collection.delete_many({"job_id": job_id})
+        )
+    
+    @track_operation
+    async def scan_thoughts(
+        self,
+        shard_name: str,
+        after_id: Optional[Any],
+        limit: int
+    ) -> List[Dict]:
+        """
+        המחשבות הבאות לפי סדר _id ב-shard אחד (לסריקה שאפשר להמשיך)
+        
+        Args:
+            after_id: ה-_id האחרון שכבר נסרק (None - מההתחלה)
+        """
+        query = {"_id": {"$gt": after_id}} if after_id is not None else {}
+        cursor = self.router.shards[shard_name].thoughts.find(
+            query,
+            {"user_id": 1, "raw_text": 1, "nlp_analysis": 1}
+        ).sort("_id", ASCENDING).limit(limit)
+        
+        thoughts, complete = await self._collect(cursor, "export", limit)
+        if not complete:
+            raise DeadlineExceeded("export")
+        return thoughts
+    
+    @track_operation
+    async def write_analyses(
+        self,
+        shard_name: str,
+        changes: List[tuple]
+    ) -> int:
+        """
+        כתיבת ניתוחים מעודכנים בפקודה אחת (unordered)
+        
+        Args:
+            changes: רשימת (_id, ניתוח חדש)
+        
+        Returns:
+            כמה מחשבות עודכנו
+        """
+        if not changes:
+            return 0
+        
+        result = await self._with_deadline(
+            "export",
+            self.router.shards[shard_name].thoughts.bulk_write(
+                [
+                    UpdateOne({"_id": thought_id}, {"$set": {"nlp_analysis": analysis}})
+                    for thought_id, analysis in changes
+                ],
+                ordered=False
+            )
+        )
+        return result.modified_count
+    
+    # ===== מצב שיחה (סשנים) =====
+    
+    @track_operation
+    async def get_session(self, user_id: int) -> Optional[Dict]:
+        """
+        שליפת מצב השיחה של משתמש
+        
+        Args:
+            user_id: מזהה המשתמש
+        
+        Returns:
+            מסמך הסשן, או None אם אין
+        """
+        return await self._with_deadline(
+            "write",
+            self.sessions_collection.find_one(
+                {"_id": user_id},
+                {"state": 1},
+                max_time_ms=self._deadline_ms("write")
+            )
+        )
+    
+    @track_operation
+    async def start_dump_session(self, user_id: int):
+        """
+        פתיחת סשן dump חדש (מחליף סשן קודם אם היה)
+        
+        Args:
+            user_id: מזהה המשתמש
+        """
+        await self._with_deadline(
+            "write",
+            self.sessions_collection.update_one(
+                {"_id": user_id},
+                {
+                    "$set": {
+                        "state": BOT_STATES["DUMP_MODE"],
+                        "messages": [],
+                        "tally": {},
+                        "chars": 0,
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                upsert=True
+            )
+        )
+    
+    @track_operation
+    async def push_dump_message(
+        self,
+        user_id: int,
+        entry: Dict[str, Any],
+        max_messages: int,
+        max_chars: int
+    ) -> bool:
+        """
+        הוספת הודעה מנותחת לסשן dump פעיל (אטומי), בכפוף למגבלות הסשן,
+        ועדכון הספירה הרצה לפי קטגוריה
+        
+        Args:
+            user_id: מזהה המשתמש
+            entry: {"text": טקסט ההודעה, "analysis": תוצאות ניתוח NLP}
+            max_messages: מקסימום הודעות בסשן
+            max_chars: מקסימום תווים בסשן
+        
+        Returns:
+            False אם אין סשן dump פעיל או שהסשן מלא
+        """
+        text = entry["text"]
+        category = entry["analysis"]["category"]
+        result = await self._with_deadline(
+            "write",
+            self.sessions_collection.update_one(
+                {
+                    "_id": user_id,
+                    "state": BOT_STATES["DUMP_MODE"],
+                    f"messages.{max_messages - 1}": {"$exists": False},
+                    # $not כדי שגם סשן בלי שדה chars יתאים
+                    "chars": {"$not": {"$gt": max_chars - len(text)}}
+                },
+                {
+                    "$push": {"messages": entry},
+                    "$inc": {"chars": len(text), f"tally.{category}": 1},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+        )
+        return result.matched_count > 0
+    
+    @track_operation
+    async def end_dump_session(self, user_id: int) -> Optional[Dict]:
+        """
+        סגירת סשן dump והחזרת מה שנאסף (אטומי)
+        
+        Args:
+            user_id: מזהה המשתמש
+        
+        Returns:
+            {"messages", "tally", "updated_at"}, או None אם לא היה סשן dump פעיל
+        """
+        session = await self._with_deadline(
+            "write",
+            self.sessions_collection.find_one_and_update(
+                {"_id": user_id, "state": BOT_STATES["DUMP_MODE"]},
+                {
+                    "$set": {
+                        "state": BOT_STATES["NORMAL"],
+                        "messages": [],
+                        "tally": {},
+                        "chars": 0,
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                projection={"messages": 1, "tally": 1, "updated_at": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+        )
+        return session
+    
+    @track_operation
+    async def restore_dump_session(
+        self,
+        user_id: int,
+        messages: List[Dict],
+        tally: Dict[str, int],
+        last_activity: datetime
+    ):
+        """
+        החזרת סשן dump שנסגר אבל לא נשמר (למשל כשהשמירה נכשלה).
+        אם בינתיים נפתח סשן חדש - ההודעות נוספות לפניו
+        
+        Args:
+            user_id: מזהה המשתמש
+            messages: ההודעות שנאספו (עם הניתוחים)
+            tally: ספירה לפי קטגוריה
+            last_activity: זמן ההודעה האחרונה בסשן שהוחזר - נשמר (ולא
+                           מתאפס), כך שהשמירה האוטומטית תנסה שוב בסבב הבא
+        """
+        chars = sum(len(entry["text"]) for entry in messages)
+        
+        merged = await self._with_deadline(
+            "write",
+            self.sessions_collection.update_one(
+                {"_id": user_id, "state": BOT_STATES["DUMP_MODE"]},
+                {
+                    "$push": {"messages": {"$each": messages, "$position": 0}},
+                    "$inc": {
+                        "chars": chars,
+                        **{f"tally.{category}": count for category, count in tally.items()}
+                    },
+                    "$min": {"updated_at": last_activity}
+                }
+            )
+        )
+        if merged.matched_count:
+            return
+        
+        await self._with_deadline(
+            "write",
+            self.sessions_collection.update_one(
+                {"_id": user_id},
+                {
+                    "$set": {
+                        "state": BOT_STATES["DUMP_MODE"],
+                        "messages": messages,
+                        "tally": tally,
+                        "chars": chars,
+                        "updated_at": last_activity
+                    }
+                },
+                upsert=True
+            )
+        )
+    
+    @track_operation
+    async def spill_dump_session(
+        self,
+        user_id: int,
+        messages: List[Dict],
+        tally: Dict[str, int],
+        last_activity: datetime
+    ):
+        """
+        שמירת סשן dump שפונה מהזיכרון
+        
+        Args:
+            user_id: מזהה המשתמש
+            messages: ההודעות שנאספו (עם הניתוחים)
+            tally: ספירה לפי קטגוריה
+            last_activity: זמן ההודעה האחרונה
+        """
+        await self._with_deadline(
+            "write",
+            self.sessions_collection.update_one(
+                {"_id": user_id},
+                {
+                    "$set": {
+                        "state": BOT_STATES["DUMP_MODE"],
+                        "messages": messages,
+                        "tally": tally,
+                        "chars": sum(len(entry["text"]) for entry in messages),
+                        "updated_at": last_activity
+                    }
+                },
+                upsert=True
+            )
+        )
+    
+    @track_operation
+    async def take_dump_session(self, user_id: int) -> Optional[Dict]:
+        """
+        שליפה ומחיקה של סשן dump שמור (לשחזור לזיכרון)
+        
+        Args:
+            user_id: מזהה המשתמש
+        
+        Returns:
+            {"messages", "tally"}, או None אם אין סשן שמור
+        """
+        return await self._with_deadline(
+            "write",
+            self.sessions_collection.find_one_and_delete(
+                {"_id": user_id, "state": BOT_STATES["DUMP_MODE"]},
+                projection={"messages": 1, "tally": 1}
+            )
+        )
+    
+    @track_operation
+    async def get_dump_session_ids(self, idle_since: Optional[datetime] = None) -> List[int]:
+        """
+        מזהי המשתמשים שיש להם סשן dump שמור
+        
+        Args:
+            idle_since: רק סשנים שלא עודכנו מאז (אופציונלי)
+        
+        Returns:
+            רשימת מזהי משתמשים
+        """
+        query = {"state": BOT_STATES["DUMP_MODE"]}
+        if idle_since:
+            query["updated_at"] = {"$lt": idle_since}
+        
+        cursor = self.sessions_collection.find(query, {"_id": 1})
+        sessions, _ = await self._collect(cursor, "list", limit=10_000)
+        return [session["_id"] for session in sessions]
+    
     # ===== פעולות על משתמשים =====
     
+    @track_operation
     async def get_or_create_user(self, user_id: int, user_data: Dict) -> Dict:
         """
         שליפה או יצירת משתמש
@@ -407,7 +1790,13 @@ class Database:
             מסמך המשתמש
         """
         try:
-            user = await self.users_collection.find_one({"user_id": user_id})
+            user = await self._with_deadline(
+                "write",
+                self._shard(user_id).users.find_one(
+                    {"user_id": user_id},
+                    max_time_ms=self._deadline_ms("write")
+                )
+            )
             
             if not user:
                 # יצירת משתמש חדש
@@ -426,7 +1815,10 @@ class Database:
                     }
                 }
                 
-                await self.users_collection.insert_one(user)
+                await self._with_deadline(
+                    "write",
+                    self._shard(user_id).users.insert_one(user)
+                )
                 logger.info(f"👤 משתמש חדש נוצר: {user_id}")
             
             return user
@@ -435,6 +1827,7 @@ class Database:
             logger.error(f"❌ שגיאה בניהול משתמש: {e}")
             return {}
     
+    @track_operation
     async def update_user_stats(self, user_id: int):
         """
         עדכון סטטיסטיקות משתמש
@@ -444,25 +1837,35 @@ class Database:
         """
         try:
             # ספירת מחשבות
-            total_thoughts = await self.thoughts_collection.count_documents({
-                "user_id": user_id,
-                "status": THOUGHT_STATUS["ACTIVE"]
-            })
+            total_thoughts = await self._with_deadline(
+                "write",
+                self._shard(user_id).thoughts.count_documents(
+                    {
+                        "user_id": user_id,
+                        "status": THOUGHT_STATUS["ACTIVE"]
+                    },
+                    maxTimeMS=self._deadline_ms("write")
+                )
+            )
             
             # עדכון
-            await self.users_collection.update_one(
-                {"user_id": user_id},
-                {
-                    "$set": {
-                        "stats.total_thoughts": total_thoughts,
-                        "stats.last_activity": datetime.utcnow()
+            await self._with_deadline(
+                "write",
+                self._shard(user_id).users.update_one(
+                    {"user_id": user_id},
+                    {
+                        "$set": {
+                            "stats.total_thoughts": total_thoughts,
+                            "stats.last_activity": datetime.utcnow()
+                        }
                     }
-                }
+                )
             )
             
         except Exception as e:
             logger.error(f"❌ שגיאה בעדכון סטטיסטיקות: {e}")
     
+    @track_operation
     async def get_user_stats(self, user_id: int) -> Dict:
         """
         שליפת סטטיסטיקות משתמש מפורטות
@@ -474,7 +1877,13 @@ class Database:
             מילון עם סטטיסטיקות
         """
         try:
-            user = await self.users_collection.find_one({"user_id": user_id})
+            user = await self._with_deadline(
+                "list",
+                self._shard(user_id).users.find_one(
+                    {"user_id": user_id},
+                    max_time_ms=self._deadline_ms("list")
+                )
+            )
             
             if not user:
                 return {}
@@ -498,5 +1907,13 @@ class Database:
             return {}
 
 
-# יצירת אובייקט גלובלי
-db = Database()
+# האובייקט הגלובלי נוצר בשימוש הראשון ולא בזמן ה-import
+_db: Optional[Database] = None
+
+
+def get_db() -> Database:
+    """המופע Database הגלובלי (נוצר בקריאה הראשונה)"""
+    global _db
+    if _db is None:
+        _db = Database()
+    return _db
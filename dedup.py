@@ -0,0 +1,183 @@
+"""
+מניעת עיבוד כפול של עדכונים מטלגרם
+
+טלגרם שולח שוב עדכון אחרי timeout או תשובה שאינה 2xx.
+שכבה ראשונה - טבעת חסומה בזיכרון של update_id אחרונים.
+שכבה שנייה (אופציונלית) - collection במונגו עם TTL, משותף לכל ה-workers.
+
+בנוסף - זיהוי מחשבות כפולות (לחיצה כפולה, העברה, שליחה חוזרת) לפי
+טביעה של הטקסט המנורמל: קודם טביעות אחרונות בזיכרון, ואז שאילתה
+אחת על האינדקס (user_id, content_hash, created_at).
+"""
+
+import hashlib
+import logging
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from cache import TTLCache
+from config import (
+    UPDATE_DEDUP_CAPACITY,
+    UPDATE_DEDUP_MONGO,
+    DEDUP_WINDOW_SECONDS,
+    DEDUP_RECENT_CACHE_SIZE
+)
+from database import get_db
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_duplicates = metrics.counter(
+    "update_duplicates_total", "עדכונים כפולים שזוהו ודולגו"
+)
+_thought_duplicates = metrics.counter(
+    "thought_duplicates_total", "מחשבות כפולות שלא נשמרו שוב, לפי שכבה"
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    נרמול לפני השוואה: צורת יוניקוד אחידה, אותיות קטנות ורווחים מצומצמים
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def content_hash(text: str) -> str:
+    """טביעה של הטקסט המנורמל (נשמרת במחשבה בשדה content_hash)"""
+    return hashlib.blake2b(normalize_text(text).encode(), digest_size=16).hexdigest()
+
+
+class UpdateDeduplicator:
+    """
+    זיהוי עדכונים שכבר התקבלו לפי update_id
+    """
+
+    def __init__(
+        self,
+        capacity: int = UPDATE_DEDUP_CAPACITY,
+        use_mongo: bool = UPDATE_DEDUP_MONGO
+    ):
+        self.capacity = capacity
+        self.use_mongo = use_mongo
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+
+    def check_and_mark(self, update_id: int) -> bool:
+        """
+        בדיקה בזיכרון וסימון העדכון כנראה
+
+        Returns:
+            True אם העדכון כבר התקבל בתהליך הזה
+        """
+        if update_id in self._seen:
+            _duplicates.inc(layer="memory")
+            return True
+
+        self._seen[update_id] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+
+        return False
+
+    def forget(self, update_id: int):
+        """
+        ביטול סימון (למשל כשהעדכון נדחה וטלגרם ישלח אותו שוב)
+        """
+        self._seen.pop(update_id, None)
+
+    async def claim(self, update_id: int) -> bool:
+        """
+        תפיסת העדכון ברישום המשותף (אם מופעל)
+
+        Returns:
+            True אם מותר לעבד את העדכון
+        """
+        if not self.use_mongo:
+            return True
+
+        if await get_db().claim_update(update_id):
+            return True
+
+        _duplicates.inc(layer="mongo")
+        logger.info(f"♻️ עדכון {update_id} כבר טופל על ידי worker אחר")
+        return False
+
+
+class ThoughtDeduplicator:
+    """
+    זיהוי מחשבה שכבר נשמרה בחלון הזמן האחרון
+    """
+
+    def __init__(
+        self,
+        window_seconds: int = DEDUP_WINDOW_SECONDS,
+        cache_size: int = DEDUP_RECENT_CACHE_SIZE
+    ):
+        self.window_seconds = window_seconds
+        # (user_id, טביעה) -> מזהה המחשבה
+        self._recent = TTLCache(
+            "recent_thought_hashes",
+            max_size=cache_size,
+            ttl_seconds=max(1, window_seconds)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def find(self, user_id: int, digest: str) -> Optional[str]:
+        """
+        מזהה המחשבה הזהה שנשמרה בחלון הזמן, או None
+        """
+        if not self.enabled:
+            return None
+
+        thought_id = self._recent.get((user_id, digest))
+        if thought_id is not None:
+            _thought_duplicates.inc(layer="memory")
+            return thought_id
+
+        since = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        found = await get_db().find_duplicate_thought(user_id, digest, since)
+        if not found:
+            return None
+
+        _thought_duplicates.inc(layer="mongo")
+        thought_id = str(found["_id"])
+        self.remember(user_id, digest, thought_id, saved_at=found["created_at"])
+        return thought_id
+
+    def remember(
+        self,
+        user_id: int,
+        digest: str,
+        thought_id: str,
+        saved_at: Optional[datetime] = None
+    ):
+        """
+        סימון טביעה שנשמרה - עד סוף החלון שלה
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.window_seconds
+        if saved_at is not None:
+            ttl -= (datetime.utcnow() - saved_at).total_seconds()
+        if ttl > 0:
+            self._recent.set((user_id, digest), thought_id, ttl=ttl)
+
+    def forget_user(self, user_id: int):
+        """
+        ניקוי הטביעות של משתמש (למשל אחרי מחיקת כל המחשבות)
+        """
+        self._recent.discard_where(lambda key: key[0] == user_id)
+
+
+# יצירת אובייקטים גלובליים
+deduplicator = UpdateDeduplicator()
+thought_deduplicator = ThoughtDeduplicator()
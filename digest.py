@@ -0,0 +1,184 @@
+"""
+סיכומים תקופתיים (יומי / שבועי) למשתמשים שנרשמו עם /digest
+
+בשעת הסיכום נתפס סבב (worker אחד בלבד), נשלפים המנויים ומחולקים
+לקבוצות (shards) לפי user_id. כל קבוצה מתוזמנת לנקודה אחרת בחלון השליחה,
+ומריצה אגרגציה אחת למשתמשים שלה ושליחה בעדיפות רקע דרך מתזמן הקצב -
+כך אלפי משתמשים לא פוגעים במונגו ובטלגרם באותו רגע.
+"""
+
+import logging
+import warnings
+from datetime import datetime, time as dt_time, timedelta
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+from telegram.constants import ParseMode
+from telegram.error import Forbidden
+from telegram.ext import ContextTypes, JobQueue
+from telegram.warnings import PTBUserWarning
+
+from config import (
+    DIGEST_TIME,
+    DIGEST_WEEKLY_DAY,
+    DIGEST_SPREAD_MINUTES,
+    DIGEST_SHARDS,
+    DIGEST_BATCH_SIZE,
+    MESSAGES,
+    TIMEZONE
+)
+from database import get_db
+from metrics import metrics
+from nlp_analyzer import get_nlp
+from rate_limiter import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# תקופות וטווח הזמן שכל אחת מסכמת
+PERIODS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(days=7),
+}
+
+# שמות לתצוגה (והכינויים שמתקבלים ב-/digest)
+PERIOD_LABELS = {"daily": "יומי", "weekly": "שבועי", "off": "כבוי"}
+PERIOD_ALIASES = {
+    "daily": "daily", "יומי": "daily",
+    "weekly": "weekly", "שבועי": "weekly",
+    "off": "off", "כבוי": "off", "stop": "off",
+}
+
+_sent = metrics.counter("digest_sent_total", "סיכומים שנשלחו")
+_failed = metrics.counter("digest_failed_total", "סיכומים שלא נשלחו")
+_shard_time = metrics.histogram(
+    "digest_shard_seconds", "זמן עיבוד קבוצת משתמשים בסבב סיכום"
+)
+
+
+def shard_users(user_ids: List[int], shards: int) -> List[List[int]]:
+    """
+    חלוקת המשתמשים לקבוצות קבועות (אותו משתמש תמיד באותה קבוצה)
+    """
+    groups: List[List[int]] = [[] for _ in range(max(1, shards))]
+    for user_id in user_ids:
+        groups[user_id % len(groups)].append(user_id)
+    return groups
+
+
+def format_digest(period: str, summary: Dict) -> str:
+    """
+    הודעת הסיכום למשתמש אחד
+    """
+    lines = [MESSAGES[f"digest_{period}_title"]]
+    lines.append(f"💭 *{summary['total']}* מחשבות חדשות\n")
+
+    for category, count in sorted(
+        summary["categories"].items(),
+        key=lambda item: item[1],
+        reverse=True
+    ):
+        emoji = get_nlp().get_category_emoji(category)
+        lines.append(f"  {emoji} {category}: {count}")
+
+    lines.append(MESSAGES["digest_footer"])
+    return "\n".join(lines)
+
+
+class DigestScheduler:
+    """
+    תזמון הסבבים על ה-JobQueue של PTB
+    """
+
+    def __init__(
+        self,
+        shards: int = DIGEST_SHARDS,
+        spread_minutes: float = DIGEST_SPREAD_MINUTES,
+        batch_size: int = DIGEST_BATCH_SIZE
+    ):
+        self.shards = shards
+        self.spread = timedelta(minutes=spread_minutes)
+        self.batch_size = batch_size
+
+    def schedule(self, job_queue: JobQueue):
+        """
+        רישום הסבב היומי והשבועי
+        """
+        hour, minute = (int(part) for part in DIGEST_TIME.split(":"))
+        at = dt_time(hour=hour, minute=minute, tzinfo=ZoneInfo(TIMEZONE))
+
+        job_queue.run_daily(self._run_slot, at, data="daily", name="digest-daily")
+        # DIGEST_WEEKLY_DAY כבר לפי המיפוי של PTB 20 (0=ראשון) - האזהרה מיותרת
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", PTBUserWarning)
+            job_queue.run_daily(
+                self._run_slot, at, days=(DIGEST_WEEKLY_DAY,),
+                data="weekly", name="digest-weekly"
+            )
+        logger.info(f"📬 סיכומים מתוזמנים ל-{DIGEST_TIME} ({TIMEZONE})")
+
+    async def _run_slot(self, context: ContextTypes.DEFAULT_TYPE):
+        """
+        תחילת סבב: תפיסה, שליפת מנויים ותזמון הקבוצות לאורך החלון
+        """
+        period = context.job.data
+        now = datetime.utcnow()
+        run_id = f"{period}:{now:%Y-%m-%d}"
+
+        if not await get_db().claim_digest_run(run_id):
+            logger.info(f"📬 סבב {run_id} כבר נשלח על ידי worker אחר")
+            return
+
+        user_ids = await get_db().get_digest_subscribers(period)
+        if not user_ids:
+            return
+
+        since = now - PERIODS[period]
+        groups = shard_users(user_ids, self.shards)
+        step = self.spread / len(groups)
+
+        for index, group in enumerate(groups):
+            if not group:
+                continue
+            context.job_queue.run_once(
+                self._send_shard,
+                when=step * index,
+                data={"period": period, "user_ids": group, "since": since},
+                name=f"digest-{period}-{index}"
+            )
+
+        logger.info(
+            f"📬 סבב {run_id}: {len(user_ids)} מנויים ב-{len(groups)} קבוצות "
+            f"לאורך {self.spread}"
+        )
+
+    async def _send_shard(self, context: ContextTypes.DEFAULT_TYPE):
+        """
+        קבוצה אחת: אגרגציה אחת לכל batch, ואז שליחה בעדיפות רקע
+        """
+        data = context.job.data
+        period = data["period"]
+        user_ids = data["user_ids"]
+        started = datetime.utcnow()
+
+        for i in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[i:i + self.batch_size]
+            summaries = await get_db().get_digest_summaries(batch, data["since"])
+
+            for user_id, summary in summaries.items():
+                try:
+                    await context.bot.send_message(
+                        chat_id=user_id,
+                        text=format_digest(period, summary),
+                        parse_mode=ParseMode.MARKDOWN,
+                        rate_limit_args=PRIORITY_BACKGROUND
+                    )
+                    _sent.inc(period=period)
+                except Forbidden:
+                    # המשתמש חסם את הבוט - אין טעם להמשיך לשלוח לו
+                    _failed.inc(period=period, reason="blocked")
+                    await get_db().set_digest_preference(user_id, "off")
+                except Exception as e:
+                    _failed.inc(period=period, reason="error")
+                    logger.warning(f"⚠️ סיכום ל-{user_id} לא נשלח: {e}")
+
+        _shard_time.observe((datetime.utcnow() - started).total_seconds(), period=period)
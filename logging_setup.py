@@ -0,0 +1,144 @@
+"""
+הגדרת הלוגים של התהליך
+
+הקריאה ל-logger בלולאת האירועים רק מכניסה את הרשומה לתור (QueueHandler),
+ו-thread ברקע (QueueListener) מפרמט וכותב ל-stderr.
+- הפרמוט עצמו (כולל איחוד ההודעה עם הארגומנטים) קורה ב-thread של הכתיבה
+- לוגי debug תכופים נדגמים לפי מודול (LOG_SAMPLE_RATES)
+- פלט JSON בשורה אחת לרשומה (או טקסט רגיל, LOG_FORMAT=text)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES
+import tracing
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """'nlp_analyzer=0.01,database=0.1' -> {"nlp_analyzer": 0.01, "database": 0.1}"""
+    rates = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    דגימה של רשומות debug לפי מודול (שם ה-logger או אחד מההורים שלו)
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate_for(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate_for(record.name)
+        return rate is None or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler שלא מפרמט בזמן הקריאה - רק מצמיד את ה-trace הנוכחי
+    (ה-QueueHandler הרגיל מאחד את ההודעה עם הארגומנטים כבר בלולאה)
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = tracing.current_span()
+        if span is not None:
+            record.trace_id = span.trace.trace_id
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    רשומה אחת = אובייקט JSON אחד בשורה
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    output_format: str = LOG_FORMAT,
+    sample_rates: str = LOG_SAMPLE_RATES
+):
+    """
+    חיבור ה-root logger לתור והפעלת ה-thread שכותב (פעם אחת לתהליך)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    if output_format == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = LazyQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample_rates)))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # ספריות רועשות - רק אזהרות
+    for name in ("httpx", "pymongo", "apscheduler"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(
+        handler.queue, stream, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """כתיבת מה שנשאר בתור ועצירת ה-thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
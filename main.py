@@ -1,68 +1,174 @@
 """
 נקודת הכניסה הראשית לבוט ריקון מוח
-מגדיר webhook ו-Flask server עבור Render
+מגדיר webhook ושרת aiohttp עבור Render
+
+השרת, ה-Application של PTB והלקוח של Motor חולקים לולאת אירועים
+אחת שחיה לאורך כל חיי התהליך
 """
 
 import asyncio
 import logging
-from flask import Flask, request
+import time
+from contextlib import contextmanager
+from aiohttp import web
 from telegram import Update
-import os
 
-from config import PORT, RENDER_EXTERNAL_URL, DEBUG_MODE
-from bot import bot
+from config import PORT, RENDER_EXTERNAL_URL, TELEGRAM_BOT_TOKEN
+from bot import get_bot
+from database import get_db
+from update_queue import update_queue, QueueFull
+from dedup import deduplicator
+from metrics import metrics, monitor_event_loop_lag, startup_phases
+import tracing
+from logging_setup import setup_logging
 
-# הגדרת לוגר
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG if DEBUG_MODE else logging.INFO
-)
+# הגדרת לוגר (כתיבה מ-thread ברקע)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# יצירת Flask app
-app = Flask(__name__)
+# עדכונים שהבוט מבקש מטלגרם
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+
+class StartupTimer:
+    """
+    מדידת זמני שלבי העלייה של התהליך
+    """
+    
+    def __init__(self):
+        self.phases = {}
+        self._started = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, name: str):
+        """מדידת שלב אחד"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = round(elapsed, 3)
+            startup_phases.observe(elapsed, phase=name)
+    
+    def report(self):
+        """כתיבת סיכום הזמנים ללוג"""
+        total = time.perf_counter() - self._started
+        self.phases["total"] = round(total, 3)
+        summary = ", ".join(f"{name}={sec}s" for name, sec in self.phases.items())
+        logger.info(f"⏱️ זמני עלייה: {summary}")
+
 
+startup_timer = StartupTimer()
 
-@app.route('/')
-def index():
+
+async def index(request: web.Request) -> web.Response:
     """
     נקודת קצה בסיסית לבדיקת בריאות השרת
     """
-    return {
+    return web.json_response({
         "status": "running",
         "bot": "Brain Dump Bot",
-        "version": "1.0.0"
-    }, 200
+        "version": "1.0.0",
+        "startup": startup_timer.phases
+    })
 
 
-@app.route('/health')
-def health():
+async def health(request: web.Request) -> web.Response:
     """
     Health check endpoint עבור Render
     """
-    return {"status": "healthy"}, 200
+    return web.json_response({"status": "healthy"})
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    """
+    כל המטריקות בפורמט Prometheus
+    """
+    return web.Response(
+        text=metrics.render_prometheus(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+        charset="utf-8"
+    )
 
 
-@app.route(f'/{os.getenv("TELEGRAM_BOT_TOKEN")}', methods=['POST'])
-async def webhook():
+async def webhook(request: web.Request) -> web.Response:
     """
     Webhook endpoint לקבלת עדכונים מטלגרם
+    
+    מאמת את העדכון, מכניס אותו לתור ומחזיר תשובה מיידית -
+    העיבוד עצמו קורה ברקע (update_queue)
     """
     try:
         # קבלת הנתונים מטלגרם
-        json_data = request.get_json(force=True)
-        
-        # יצירת Update object
-        update = Update.de_json(json_data, bot.application.bot)
+        json_data = await request.json()
         
-        # עיבוד העדכון
-        await bot.application.process_update(update)
+        if not isinstance(json_data, dict) or not isinstance(json_data.get("update_id"), int):
+            raise ValueError("missing update_id")
         
-        return {"status": "ok"}, 200
+        # יצירת Update object
+        update = Update.de_json(json_data, get_bot().application.bot)
         
     except Exception as e:
-        logger.error(f"❌ שגיאה בעיבוד webhook: {e}")
-        return {"status": "error", "message": str(e)}, 500
+        logger.warning(f"⚠️ עדכון לא תקין התקבל ב-webhook: {e}")
+        return web.json_response(
+            {"status": "error", "message": "invalid update"},
+            status=400
+        )
+    
+    # עדכון שכבר התקבל (שליחה חוזרת של טלגרם) - מאשרים בלי לעבד שוב
+    if deduplicator.check_and_mark(update.update_id):
+        return web.json_response({"status": "duplicate"})
+    
+    # ה-trace נפתח כאן ונסגר בסוף העיבוד ב-worker
+    root = tracing.begin_trace(
+        "update",
+        update_id=update.update_id,
+        type=(
+            "callback_query" if update.callback_query
+            else "inline_query" if update.inline_query
+            else "message"
+        )
+    )
+    
+    try:
+        update_queue.submit(update)
+    except QueueFull:
+        # טלגרם ינסה שוב מאוחר יותר
+        tracing.finish_trace(root, status="rejected")
+        deduplicator.forget(update.update_id)
+        logger.warning(f"🚦 התור מלא - עדכון {update.update_id} נדחה")
+        return web.json_response(
+            {"status": "overloaded"},
+            status=503,
+            headers={"Retry-After": "5"}
+        )
+    
+    return web.json_response({"status": "ok"})
+
+
+async def process_update(update: Update):
+    """
+    עיבוד עדכון מהתור - אחרי תפיסה ברישום המשותף
+    (כדי ששני workers לא יעבדו את אותו עדכון)
+    """
+    root = tracing.current_span()
+    if root:
+        tracing.record_span("queue_wait", root.start, time.perf_counter())
+    
+    try:
+        with tracing.span("dedup_claim"):
+            claimed = await deduplicator.claim(update.update_id)
+        if not claimed:
+            tracing.finish_trace(root, status="duplicate")
+            return
+        
+        await get_bot().application.process_update(update)
+    except Exception:
+        tracing.finish_trace(root, status="error")
+        raise
+    
+    tracing.finish_trace(root, status="ok")
 
 
 async def setup_webhook():
@@ -70,30 +176,26 @@ async def setup_webhook():
     הגדרת webhook עם טלגרם
     """
     try:
-        # אתחול הבוט
-        await bot.setup()
-        
-        # הגדרת ה-webhook URL
-        webhook_url = f"{RENDER_EXTERNAL_URL}/{os.getenv('TELEGRAM_BOT_TOKEN')}"
+        bot = get_bot()
         
-        # מחיקת webhook קיים (במקרה שיש)
-        await bot.application.bot.delete_webhook(drop_pending_updates=True)
+        # אתחול הבוט (האינדקסים נבנים ברקע)
+        with startup_timer.phase("bot_setup"):
+            await bot.setup()
         
-        logger.info("🗑️ Webhook קיים נמחק")
+        # אתחול הבוט (צריך לקרוא initialize פעם אחת)
+        with startup_timer.phase("app_initialize"):
+            await bot.application.initialize()
         
-        # הגדרת webhook חדש
-        await bot.application.bot.set_webhook(
-            url=webhook_url,
-            drop_pending_updates=True,
-            allowed_updates=["message", "callback_query"]
-        )
+        # הגדרת ה-webhook URL
+        webhook_url = f"{RENDER_EXTERNAL_URL}/{TELEGRAM_BOT_TOKEN}"
         
-        logger.info(f"✅ Webhook הוגדר בהצלחה: {webhook_url}")
+        with startup_timer.phase("webhook"):
+            await register_webhook(webhook_url)
         
-        # אתחול הבוט (צריך לקרוא initialize פעם אחת)
-        await bot.application.initialize()
-        await bot.application.start()
+        with startup_timer.phase("app_start"):
+            await bot.application.start()
         
+        startup_timer.report()
         logger.info("🤖 הבוט פעיל ומוכן לעבודה!")
         
         return True
@@ -103,12 +205,92 @@ async def setup_webhook():
         return False
 
 
+async def on_startup(app: web.Application):
+    """
+    אתחול הבוט בתוך הלולאה של השרת
+    """
+    if not await setup_webhook():
+        raise RuntimeError("הגדרת הבוט נכשלה")
+    
+    await update_queue.start(process_update)
+    app["loop_lag_monitor"] = asyncio.create_task(monitor_event_loop_lag())
+
+
+async def on_cleanup(app: web.Application):
+    """
+    כיבוי מסודר של הבוט והחיבור למונגו
+    """
+    monitor = app.get("loop_lag_monitor")
+    if monitor:
+        monitor.cancel()
+    
+    # קודם מסיימים לעבד את מה שכבר בתור
+    await update_queue.stop()
+    
+    bot = get_bot()
+    if bot.application and bot.application.running:
+        await bot.application.stop()
+        await bot.application.shutdown()
+    
+    # סשנים פתוחים נשמרים לפני שהחיבור נסגר
+    await bot.shutdown()
+    await get_db().close()
+    tracing.exporter.close()
+    
+    logger.info("🛑 הבוט נעצר")
+
+
+def build_app() -> web.Application:
+    """
+    בניית אפליקציית ה-aiohttp עם כל הנתיבים
+    """
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_post(f'/{TELEGRAM_BOT_TOKEN}', webhook)
+    
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    
+    return app
+
+
+async def create_app() -> web.Application:
+    """
+    Factory עבור gunicorn (aiohttp.GunicornWebWorker)
+    """
+    return build_app()
+
+
+async def register_webhook(webhook_url: str):
+    """
+    רישום ה-webhook בטלגרם - רק אם הכתובת או סוגי העדכונים השתנו
+    (set_webhook מחליף webhook קיים, אין צורך למחוק קודם)
+    """
+    telegram_bot = get_bot().application.bot
+    info = await telegram_bot.get_webhook_info()
+    
+    if info.url == webhook_url and set(info.allowed_updates or []) == set(ALLOWED_UPDATES):
+        logger.info("✅ Webhook כבר מוגדר - מדלג על רישום מחדש")
+        return
+    
+    await telegram_bot.set_webhook(
+        url=webhook_url,
+        drop_pending_updates=True,
+        allowed_updates=ALLOWED_UPDATES
+    )
+    
+    logger.info(f"✅ Webhook הוגדר בהצלחה: {webhook_url}")
+
+
 def run_polling():
     """
     הרצה במצב polling (לפיתוח מקומי)
     שימושי רק לבדיקות - לא עובד ב-Render
     """
     async def main():
+        bot = get_bot()
         await bot.setup()
         
         # הפעלת polling
@@ -126,6 +308,7 @@ def run_polling():
             logger.info("🛑 עצירת הבוט...")
             await bot.application.stop()
             await bot.application.shutdown()
+            await bot.shutdown()
     
     asyncio.run(main())
 
@@ -145,17 +328,9 @@ def main():
         # Render mode - הרצה עם webhook
         logger.info("🚀 מתחיל בוט במצב Render (webhook)")
         
-        # הגדרת webhook (async)
-        # נריץ את זה בלולאת אירועים חדשה
-        asyncio.run(setup_webhook())
-        
-        # הרצת Flask server
-        logger.info(f"🌐 Flask server מתחיל על פורט {PORT}")
-        app.run(
-            host='0.0.0.0',
-            port=PORT,
-            debug=DEBUG_MODE
-        )
+        # הגדרת ה-webhook קורית ב-on_startup, באותה לולאה של השרת
+        logger.info(f"🌐 שרת aiohttp מתחיל על פורט {PORT}")
+        web.run_app(build_app(), host='0.0.0.0', port=PORT)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,304 @@
+"""
+מודול מטריקות פנימי
+היסטוגרמות ומונים בזיכרון, בטוחים לשימוש מכמה threads,
+עם ייצוא בפורמט הטקסט של Prometheus
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# גבולות ברירת מחדל להיסטוגרמות זמן (בשניות)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# גבולות להיסטוגרמות של גדלים (מסמכים / בתים)
+SIZE_BUCKETS = (
+    0, 1, 5, 10, 20, 50, 100, 500, 1000,
+    10_000, 100_000, 1_000_000
+)
+
+
+def _labels_key(labels: Dict[str, str]) -> Tuple:
+    """המרת תוויות למפתח קבוע"""
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Dict, extra: Optional[Tuple[str, str]] = None) -> str:
+    """תוויות בפורמט Prometheus: {a="1",b="2"}"""
+    items = list(labels.items())
+    if extra:
+        items.append(extra)
+    if not items:
+        return ""
+    parts = []
+    for name, value in items:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    מונה מצטבר עם תוויות
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """הגדלת המונה"""
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> List[Dict]:
+        """צילום מצב נוכחי"""
+        with self._lock:
+            return [
+                {"labels": dict(key), "value": value}
+                for key, value in self._values.items()
+            ]
+
+
+class Gauge:
+    """
+    ערך נוכחי עם תוויות (נקבע ישירות או נמדד בזמן הקריאה)
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        """קביעת ערך"""
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """פונקציה שתחושב בכל צילום מצב"""
+        key = _labels_key(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def snapshot(self) -> List[Dict]:
+        """צילום מצב נוכחי"""
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+
+        for key, func in functions.items():
+            values[key] = func()
+
+        return [
+            {"labels": dict(key), "value": value}
+            for key, value in values.items()
+        ]
+
+
+class Histogram:
+    """
+    היסטוגרמה עם דליים קבועים ותוויות
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Tuple = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # לכל סדרה: [מונים לפי דלי (+ דלי אינסוף), סכום, כמות, מקסימום]
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """רישום ערך"""
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            if value > series[3]:
+                series[3] = value
+
+    def _quantile(self, counts: List[int], total: int, q: float) -> float:
+        """הערכת אחוזון לפי הדליים (הגבול העליון של הדלי)"""
+        if total == 0:
+            return 0.0
+        target = q * total
+        running = 0
+        for i, count in enumerate(counts):
+            running += count
+            if running >= target:
+                if i < len(self.buckets):
+                    return self.buckets[i]
+                return float("inf")
+        return float("inf")
+
+    def snapshot(self) -> List[Dict]:
+        """צילום מצב נוכחי כולל אחוזונים משוערים"""
+        with self._lock:
+            items = [
+                (key, list(series[0]), series[1], series[2], series[3])
+                for key, series in self._series.items()
+            ]
+
+        result = []
+        for key, counts, total_sum, count, maximum in items:
+            result.append({
+                "labels": dict(key),
+                "buckets": counts,
+                "sum": total_sum,
+                "count": count,
+                "max": maximum,
+                "avg": total_sum / count if count else 0.0,
+                "p50": self._quantile(counts, count, 0.50),
+                "p95": self._quantile(counts, count, 0.95),
+                "p99": self._quantile(counts, count, 0.99),
+            })
+        return result
+
+
+class MetricsRegistry:
+    """
+    רישום מרכזי של כל המטריקות בתהליך
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        """שליפה או יצירה של מונה"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Counter(name, description)
+                self._metrics[name] = metric
+            return metric
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        """שליפה או יצירה של מד"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Gauge(name, description)
+                self._metrics[name] = metric
+            return metric
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """שליפה או יצירה של היסטוגרמה"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Histogram(name, description, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def get(self, name: str) -> Optional[object]:
+        """שליפת מטריקה לפי שם"""
+        return self._metrics.get(name)
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """צילום מצב של כל המטריקות"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render_prometheus(self) -> str:
+        """
+        כל המטריקות בפורמט הטקסט של Prometheus (גרסה 0.0.4)
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+
+        lines = []
+        for metric in metrics:
+            if metric.description:
+                description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+                lines.append(f"# HELP {metric.name} {description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+
+            for series in metric.snapshot():
+                labels = series["labels"]
+                if metric.kind != "histogram":
+                    lines.append(
+                        f"{metric.name}{_format_labels(labels)} {_format_value(series['value'])}"
+                    )
+                    continue
+
+                # דליים מצטברים, כולל +Inf
+                running = 0
+                bounds = list(metric.buckets) + [float("inf")]
+                for bound, count in zip(bounds, series["buckets"]):
+                    running += count
+                    le = ("le", _format_value(bound))
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels, le)} {running}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(series['sum'])}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {series['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+# יצירת אובייקט גלובלי
+metrics = MetricsRegistry()
+
+# שלבי עליית התהליך (main) ובניית האינדקסים ברקע (database)
+startup_phases = metrics.histogram(
+    "startup_phase_seconds", "זמני שלבי עליית התהליך"
+)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """
+    מדידת עיכוב לולאת האירועים - כמה מאוחר מתעוררת שינה קצרה.
+    עיכוב גבוה = קוד סינכרוני שחוסם את הלולאה
+    """
+    lag_histogram = metrics.histogram(
+        "event_loop_lag_seconds", "עיכוב לולאת האירועים מעבר לזמן המתוכנן"
+    )
+    lag_gauge = metrics.gauge(
+        "event_loop_lag_last_seconds", "העיכוב האחרון שנמדד בלולאת האירועים"
+    )
+    while True:
+        expected = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.monotonic() - expected)
+        lag_histogram.observe(lag)
+        lag_gauge.set(lag)
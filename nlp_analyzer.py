@@ -3,14 +3,26 @@
 מזהה קטגוריות, נושאים ומילות מפתח בטקסט עברי
 """
 
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 import re
 import logging
+import time
 from config import CATEGORIES, TOPICS
+from metrics import metrics
+import tracing
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_stage_time = metrics.histogram(
+    "nlp_stage_seconds", "זמן כל שלב בניתוח NLP"
+)
+
+
+def _record_stage(stage: str, start: float, end: float):
+    """רישום זמן שלב - גם במטריקות וגם ב-trace הנוכחי"""
+    _stage_time.observe(end - start, stage=stage)
+    tracing.record_span(f"nlp.{stage}", start, end)
+
 
 class NLPAnalyzer:
     """
@@ -63,20 +75,33 @@ class NLPAnalyzer:
         if not text or not text.strip():
             return self._empty_analysis()
         
+        started = time.perf_counter()
+        
         # נירמול הטקסט
         normalized_text = self._normalize_text(text)
+        normalized = time.perf_counter()
+        _record_stage("normalize", started, normalized)
         
         # זיהוי קטגוריה
         category, category_confidence = self._detect_category(normalized_text)
+        categorized = time.perf_counter()
+        _record_stage("category", normalized, categorized)
         
         # זיהוי נושאים
         topics = self._detect_topics(normalized_text)
+        topics_done = time.perf_counter()
+        _record_stage("topics", categorized, topics_done)
         
         # חילוץ מילות מפתח
         keywords = self._extract_keywords(normalized_text)
+        keywords_done = time.perf_counter()
+        _record_stage("keywords", topics_done, keywords_done)
         
         # ניתוח רגש בסיסי
         sentiment = self._basic_sentiment_analysis(normalized_text)
+        finished = time.perf_counter()
+        _record_stage("sentiment", keywords_done, finished)
+        _record_stage("total", started, finished)
         
         analysis = {
             "category": category,
@@ -86,7 +111,7 @@ class NLPAnalyzer:
             "confidence": category_confidence
         }
         
-        logger.info(f"📊 ניתוח הושלם: קטגוריה={category}, נושאים={topics}")
+        logger.debug("📊 ניתוח הושלם: קטגוריה=%s, נושאים=%s", category, topics)
         
         return analysis
     
@@ -154,7 +179,7 @@ class NLPAnalyzer:
         # ככל שיותר טריגרים - ביטחון גבוה יותר
         confidence = min(score / 3.0, 1.0)  # מקסימום 1.0
         
-        logger.debug(f"🎯 קטגוריה: {category_name} (ציון: {score}, ביטחון: {confidence:.2f})")
+        logger.debug("🎯 קטגוריה: %s (ציון: %s, ביטחון: %.2f)", category_name, score, confidence)
         
         return category_name, confidence
     
@@ -182,7 +207,7 @@ class NLPAnalyzer:
             key=lambda t: list(self.topics.keys()).index(t)
         )
         
-        logger.debug(f"🏷️ נושאים שזוהו: {detected_topics}")
+        logger.debug("🏷️ נושאים שזוהו: %s", detected_topics)
         
         return detected_topics
     
@@ -376,5 +401,13 @@ class NLPAnalyzer:
         return "\n".join(summary_lines)
 
 
-# יצירת אובייקט גלובלי
-nlp = NLPAnalyzer()
+# האובייקט הגלובלי נוצר בשימוש הראשון ולא בזמן ה-import
+_nlp: Optional[NLPAnalyzer] = None
+
+
+def get_nlp() -> NLPAnalyzer:
+    """המופע NLPAnalyzer הגלובלי (נוצר בקריאה הראשונה)"""
+    global _nlp
+    if _nlp is None:
+        _nlp = NLPAnalyzer()
+    return _nlp
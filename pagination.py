@@ -0,0 +1,127 @@
+"""
+דפדוף בתוצאות (/search, /today) בכפתורי הקודם/הבא
+
+בהרצת הפקודה נשמרת "תמונת מצב" קטנה של התוצאות - רק רשימת המזהים
+וטביעת אצבע של השאילתה - תחת טוקן קצר שנכנס ל-callback_data.
+דפדוף שולף רק את העמוד המבוקש לפי _id ($in), בלי להריץ שוב את החיפוש.
+"""
+
+import hashlib
+import math
+from typing import List, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from cache import TTLCache
+from config import PAGE_SIZE, PAGE_SNAPSHOT_CACHE_SIZE, PAGE_SNAPSHOT_TTL_SECONDS
+
+# קידומת ה-callback_data של כפתורי הדפדוף: "page:<טוקן>:<עמוד>"
+CALLBACK_PREFIX = "page:"
+# הכפתור האמצעי (מספר העמוד) לא עושה כלום
+PAGE_INDICATOR = "page_indicator"
+
+
+class ResultSnapshot:
+    """
+    תוצאות שמורות של הרצת פקודה אחת
+    """
+
+    __slots__ = ("user_id", "kind", "title", "ids", "fingerprint")
+
+    def __init__(self, user_id: int, kind: str, title: str, ids: List[str], fingerprint: str):
+        self.user_id = user_id
+        self.kind = kind
+        # כותרת ההודעה (למשל "נמצאו 23 תוצאות עבור 'עבודה'")
+        self.title = title
+        self.ids = ids
+        self.fingerprint = fingerprint
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(len(self.ids) / PAGE_SIZE))
+
+    def page_ids(self, page: int) -> List[str]:
+        """המזהים של עמוד (מ-0)"""
+        return self.ids[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+
+
+def fingerprint(user_id: int, kind: str, query: str, ids: List[str]) -> str:
+    """
+    טביעת אצבע של השאילתה והתוצאות - אותה שאילתה עם אותן תוצאות
+    מקבלת אותו טוקן (ולא תופסת עוד מקום במטמון)
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"{user_id}\x00{kind}\x00{query}\x00".encode())
+    digest.update(",".join(ids).encode())
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """
+    תמונות המצב בזיכרון (LRU עם תפוגה)
+    """
+
+    def __init__(
+        self,
+        max_size: int = PAGE_SNAPSHOT_CACHE_SIZE,
+        ttl_seconds: float = PAGE_SNAPSHOT_TTL_SECONDS
+    ):
+        self._snapshots = TTLCache("page_snapshots", max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def save(
+        self,
+        user_id: int,
+        kind: str,
+        query: str,
+        title: str,
+        ids: List[str]
+    ) -> ResultSnapshot:
+        """
+        שמירת תוצאות (הטוקן לכפתורים הוא snapshot.fingerprint)
+        """
+        token = fingerprint(user_id, kind, query, ids)[:10]
+        snapshot = ResultSnapshot(user_id, kind, title, ids, token)
+        self._snapshots.set(token, snapshot)
+        return snapshot
+
+    def get(self, token: str, user_id: int) -> Optional[ResultSnapshot]:
+        """
+        תמונת המצב של הטוקן - רק אם היא של המשתמש הזה ועדיין בתוקף
+        """
+        snapshot = self._snapshots.get(token)
+        if snapshot is None or snapshot.user_id != user_id:
+            return None
+        return snapshot
+
+
+def parse_callback(data: str) -> Optional[tuple]:
+    """'page:<טוקן>:<עמוד>' -> (טוקן, עמוד), או None אם הנתונים לא תקינים"""
+    token, _, page = data[len(CALLBACK_PREFIX):].partition(":")
+    if not token or not page.isdigit():
+        return None
+    return token, int(page)
+
+
+def page_keyboard(token: str, page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+    """
+    כפתורי הקודם/הבא (בלי כפתורים אם יש עמוד אחד)
+    """
+    if pages <= 1:
+        return None
+
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(
+            "▶️ הקודם", callback_data=f"{CALLBACK_PREFIX}{token}:{page - 1}"
+        ))
+    buttons.append(InlineKeyboardButton(
+        f"{page + 1}/{pages}", callback_data=PAGE_INDICATOR
+    ))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(
+            "הבא ◀️", callback_data=f"{CALLBACK_PREFIX}{token}:{page + 1}"
+        ))
+    return InlineKeyboardMarkup([buttons])
+
+
+snapshots = SnapshotStore()
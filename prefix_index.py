@@ -0,0 +1,241 @@
+"""
+אינדקס תחיליות בזיכרון לחיפוש inline (@bot <שאילתה>)
+
+חיפוש $text של מונגו מוצא רק מילים שלמות, ושאילתות inline מגיעות בזמן
+ההקלדה ("פגי" לפני "פגישה"). לכן לכל משתמש פעיל נבנה אינדקס קטן בזיכרון:
+המחשבות האחרונות שלו, ורשימה ממוינת של המילים שבהן - כך שחיפוש תחילית
+הוא חיפוש בינארי ולא סריקה.
+
+האינדקסים נשמרים ב-TTLCache (LRU) - משתמש שלא חיפש ולא כתב זמן רב
+יוצא מהזיכרון, ונטען מחדש מהמחשבות האחרונות שלו בחיפוש הבא.
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from cache import TTLCache
+from config import (
+    INLINE_INDEX_USERS,
+    INLINE_INDEX_THOUGHTS,
+    INLINE_INDEX_TTL_SECONDS
+)
+from database import get_db
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# אותיות שימוש שנדבקות לתחילת מילה בעברית (ו, ה, ב, ל, מ, ש, כ)
+HEBREW_PREFIXES = "והבלמשכ"
+
+# אינדקס שנטען ריק (למשל כשמונגו לא ענה) לא נשמר לזמן ארוך
+EMPTY_INDEX_TTL_SECONDS = 60
+
+_TOKEN = re.compile(r"\w+")
+
+_lookup_time = metrics.histogram(
+    "inline_lookup_seconds", "זמן חיפוש תחיליות באינדקס בזיכרון"
+)
+_loads = metrics.counter(
+    "inline_index_loads_total", "טעינות אינדקס משתמש ממונגו"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    מילים מנורמלות מטקסט (אותיות קטנות, בלי פיסוק)
+    """
+    return _TOKEN.findall(text.lower())
+
+
+def _index_terms(token: str) -> Set[str]:
+    """
+    המונחים שנכנסים לאינדקס עבור מילה - המילה עצמה, ואם היא מתחילה
+    באות שימוש גם בלעדיה (כך "פגישה" מוצאת גם את "והפגישה")
+    """
+    terms = {token}
+    stripped = token
+    while len(stripped) > 2 and stripped[0] in HEBREW_PREFIXES:
+        stripped = stripped[1:]
+        terms.add(stripped)
+    return terms
+
+
+class UserPrefixIndex:
+    """
+    האינדקס של משתמש אחד: מחשבות אחרונות + מילה -> מזהי מחשבות
+    """
+
+    def __init__(self, max_thoughts: int = INLINE_INDEX_THOUGHTS):
+        self.max_thoughts = max_thoughts
+        # מזהה -> המחשבה (לפי סדר ההוספה, הישנה ראשונה)
+        self.thoughts: Dict[str, Dict] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._terms: List[str] = []
+
+    def add(self, thought_id: str, raw_text: str, category: str, created_at: datetime):
+        """
+        הוספת מחשבה (והוצאת הישנה ביותר אם האינדקס מלא)
+        """
+        if thought_id in self.thoughts:
+            return
+
+        terms: Set[str] = set()
+        for token in tokenize(raw_text):
+            terms |= _index_terms(token)
+
+        self.thoughts[thought_id] = {
+            "id": thought_id,
+            "raw_text": raw_text,
+            "category": category,
+            "created_at": created_at,
+            "terms": terms,
+        }
+        for term in terms:
+            ids = self._postings.get(term)
+            if ids is None:
+                self._postings[term] = ids = set()
+                bisect.insort(self._terms, term)
+            ids.add(thought_id)
+
+        while len(self.thoughts) > self.max_thoughts:
+            self._remove(next(iter(self.thoughts)))
+
+    def _remove(self, thought_id: str):
+        thought = self.thoughts.pop(thought_id)
+        for term in thought["terms"]:
+            ids = self._postings[term]
+            ids.discard(thought_id)
+            if not ids:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _ids_with_prefix(self, prefix: str) -> Set[str]:
+        """כל המחשבות שיש בהן מילה שמתחילה ב-prefix"""
+        ids: Set[str] = set()
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            ids |= self._postings[term]
+        return ids
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        """
+        מחשבות שמכילות את כל מילות השאילתה (כל מילה כתחילית),
+        מהחדשה לישנה. שאילתה ריקה - המחשבות האחרונות
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            matches = list(self.thoughts)
+        else:
+            ids: Optional[Set[str]] = None
+            # המילים הארוכות קודם - הן המסננות ביותר
+            for token in sorted(tokens, key=len, reverse=True):
+                found = self._ids_with_prefix(token)
+                ids = found if ids is None else ids & found
+                if not ids:
+                    return []
+            matches = [thought_id for thought_id in self.thoughts if thought_id in ids]
+
+        return [self.thoughts[thought_id] for thought_id in reversed(matches[-limit:])]
+
+
+class PrefixIndexCache:
+    """
+    אינדקסים של המשתמשים הפעילים, עם טעינה ממונגו בפעם הראשונה
+    """
+
+    def __init__(
+        self,
+        max_users: int = INLINE_INDEX_USERS,
+        max_thoughts: int = INLINE_INDEX_THOUGHTS,
+        ttl_seconds: float = INLINE_INDEX_TTL_SECONDS
+    ):
+        self.max_thoughts = max_thoughts
+        self._indexes = TTLCache("inline_index", max_size=max_users, ttl_seconds=ttl_seconds)
+        # טעינה אחת בכל פעם למשתמש (שאילתות inline מגיעות ברצף בזמן ההקלדה)
+        self._loading: Dict[int, asyncio.Future] = {}
+
+    async def get(self, user_id: int) -> UserPrefixIndex:
+        """
+        האינדקס של המשתמש - מהזיכרון, או טעינה מהמחשבות האחרונות שלו
+        """
+        # בלי לחדש את התפוגה: אינדקס ריק (או טעינה שנכשלה) נשמר לזמן קצר,
+        # וגם אינדקס מלא נטען מחדש מדי פעם (ה-LRU ממילא שומר משתמשים פעילים)
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            index = await self._load(user_id)
+            future.set_result(index)
+            return index
+        except BaseException as e:
+            future.set_exception(e)
+            # אם אף אחד אחר לא מחכה - שלא תודפס אזהרה על חריגה שלא נקראה
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+
+    async def _load(self, user_id: int) -> UserPrefixIndex:
+        started = time.monotonic()
+        thoughts = await get_db().get_user_thoughts(user_id, limit=self.max_thoughts)
+
+        index = UserPrefixIndex(self.max_thoughts)
+        # מהישנה לחדשה, כך שהחדשות נשארות אם יש יותר מדי
+        for thought in reversed(thoughts):
+            index.add(
+                str(thought["_id"]),
+                thought["raw_text"],
+                thought["nlp_analysis"]["category"],
+                thought["created_at"]
+            )
+
+        self._indexes.set(
+            user_id, index,
+            ttl=None if thoughts else EMPTY_INDEX_TTL_SECONDS
+        )
+        _loads.inc()
+        logger.debug(
+            "🔎 אינדקס inline נטען למשתמש %s: %d מחשבות ב-%.0fms",
+            user_id, len(thoughts), (time.monotonic() - started) * 1000
+        )
+        return index
+
+    async def search(self, user_id: int, query: str, limit: int) -> List[Dict]:
+        """
+        חיפוש תחיליות במחשבות של המשתמש
+        """
+        index = await self.get(user_id)
+        started = time.perf_counter()
+        results = index.search(query, limit)
+        _lookup_time.observe(time.perf_counter() - started)
+        return results
+
+    def add(self, user_id: int, thought_id: str, raw_text: str, category: str):
+        """
+        מחשבה חדשה - נכנסת לאינדקס רק אם הוא כבר בזיכרון
+        (אחרת היא תיטען ממונגו בחיפוש הבא)
+        """
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(thought_id, raw_text, category, datetime.utcnow())
+
+    def invalidate(self, user_id: int):
+        """הוצאת האינדקס של המשתמש (אחרי מחיקה או שינוי סטטוס)"""
+        self._indexes.pop(user_id)
+
+
+prefix_index = PrefixIndexCache()
@@ -0,0 +1,331 @@
+"""
+מתזמן שליחה לטלגרם עם הגבלת קצב
+
+משתלב ב-PTB כ-rate_limiter של ה-Application, כך שכל קריאה ל-Bot API
+עוברת דרכו:
+- token bucket גלובלי ו-token bucket לכל צ'אט
+- סדר עדיפויות: תשובות לפקודות לפני אישורי dump ושליחות רקע
+- איחוד אישורי dump זהים לאותו צ'אט בתוך חלון זמן
+- כיבוד retry_after (429) ועצירת כל השליחות עד שהוא עובר
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    RATE_LIMIT_GLOBAL_PER_SECOND,
+    RATE_LIMIT_CHAT_PER_SECOND,
+    RATE_LIMIT_CHAT_BURST,
+    RATE_LIMIT_GROUP_PER_MINUTE,
+    RATE_LIMIT_ACK_COALESCE_SECONDS,
+    RATE_LIMIT_MAX_RETRIES
+)
+from metrics import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# עדיפויות (מספר נמוך = קודם)
+PRIORITY_COMMAND = 0     # תשובות לפקודות ולהודעות (ברירת מחדל)
+PRIORITY_ACK = 1         # אישורי dump - ניתנים לאיחוד
+PRIORITY_BACKGROUND = 2  # הודעות יזומות (שמירה אוטומטית, סיכומים)
+
+# כמות מקסימלית של דליים לצ'אטים לפני ניקוי דליים מלאים
+_MAX_CHAT_BUCKETS = 10_000
+
+_send_wait = metrics.histogram(
+    "telegram_send_wait_seconds", "זמן המתנה לאישור שליחה מהמתזמן"
+)
+_coalesced = metrics.counter(
+    "telegram_acks_coalesced_total", "אישורי dump שאוחדו ולא נשלחו"
+)
+_retry_after = metrics.counter(
+    "telegram_retry_after_total", "תשובות 429 (RetryAfter) מטלגרם"
+)
+
+JSONResult = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+
+class TokenBucket:
+    """
+    דלי אסימונים - קצב קבוע עם אפשרות לפרץ קצר
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: אסימונים לשנייה
+            capacity: גודל הפרץ המקסימלי
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now: float, amount: float = 1) -> float:
+        """
+        כמה זמן עד שיהיו מספיק אסימונים (0 = עכשיו)
+        """
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, now: float, amount: float = 1):
+        """לקיחת אסימונים (אחרי שבדקנו שיש)"""
+        self._refill(now)
+        self.tokens -= amount
+
+    def try_consume(self, now: float, amount: float = 1) -> bool:
+        """לקיחת אסימונים אם יש, בלי להמתין"""
+        if self.wait_time(now, amount) > 0:
+            return False
+        self.tokens -= amount
+        return True
+
+    def is_full(self, now: float) -> bool:
+        """האם הדלי מלא (כלומר לא היה בשימוש לאחרונה)"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """
+    מימוש BaseRateLimiter של PTB
+
+    rate_limit_args של כל קריאה הוא העדיפות (PRIORITY_*).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = RATE_LIMIT_GLOBAL_PER_SECOND,
+        chat_rate: float = RATE_LIMIT_CHAT_PER_SECOND,
+        chat_burst: int = RATE_LIMIT_CHAT_BURST,
+        group_rate_per_minute: float = RATE_LIMIT_GROUP_PER_MINUTE,
+        coalesce_window: float = RATE_LIMIT_ACK_COALESCE_SECONDS,
+        max_retries: int = RATE_LIMIT_MAX_RETRIES
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        # בקשות שממתינות לאישור: (עדיפות, מספר סידורי, צ'אט, future)
+        self._waiting: List[Tuple[int, int, Union[int, str], asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        # עצירה כללית בעקבות RetryAfter
+        self._paused_until = 0.0
+        # אישורים: (צ'אט, טקסט) -> (זמן, future של התוצאה)
+        self._recent_acks: Dict[Tuple, Tuple[float, asyncio.Future]] = {}
+
+        depth = metrics.gauge(
+            "telegram_send_queue_depth", "בקשות שממתינות למתזמן השליחה"
+        )
+        depth.set_function(lambda: len(self._waiting))
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+        for _, _, _, future in self._waiting:
+            if not future.done():
+                future.cancel()
+        self._waiting.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                self._chats = {
+                    key: value for key, value in self._chats.items()
+                    if not value.is_full(now)
+                }
+            # מזהה שלילי = קבוצה/ערוץ
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch_loop(self):
+        """
+        שחרור בקשות ממתינות לפי עדיפות, כשיש אסימון גלובלי ואסימון לצ'אט
+        """
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._global.wait_time(now))
+
+            if delay <= 0:
+                delay = float("inf")
+                for item in sorted(self._waiting):
+                    if item[3].done():
+                        # הממתין בוטל - מוציאים אותו בלי לבזבז אסימון
+                        self._waiting.remove(item)
+                        heapq.heapify(self._waiting)
+                        continue
+                    chat_delay = self._chat_bucket(item[2]).wait_time(now)
+                    if chat_delay <= 0:
+                        self._waiting.remove(item)
+                        heapq.heapify(self._waiting)
+                        self._global.consume(now)
+                        self._chat_bucket(item[2]).consume(now)
+                        item[3].set_result(None)
+                        delay = 0
+                        break
+                    delay = min(delay, chat_delay)
+
+            if delay > 0:
+                # בקשה חדשה עשויה להיות מוכנה לפני כן - מתעוררים גם עליה
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _acquire(self, chat_id: Union[int, str], priority: int):
+        """
+        המתנה לתורנו לשלוח לצ'אט
+        """
+        future = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._sequence), chat_id, future)
+        heapq.heappush(self._waiting, item)
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # בוטלנו לפני שהגיע תורנו - התור לא יבזבז עלינו אסימון
+            if item in self._waiting:
+                self._waiting.remove(item)
+                heapq.heapify(self._waiting)
+            raise
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> JSONResult:
+        priority = PRIORITY_COMMAND if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+
+        # איחוד אישורי dump זהים שנשלחו לאחרונה או שממתינים
+        ack_key = None
+        if priority == PRIORITY_ACK and chat_id is not None:
+            ack_key = (chat_id, data.get("text"))
+            recent = self._recent_acks.get(ack_key)
+            if recent and time.monotonic() - recent[0] < self.coalesce_window:
+                _coalesced.inc()
+                return await asyncio.shield(recent[1])
+
+            result_future = asyncio.get_running_loop().create_future()
+            self._recent_acks[ack_key] = (time.monotonic(), result_future)
+            self._prune_acks()
+
+        try:
+            with tracing.span(f"telegram.{endpoint}", priority=priority):
+                result = await self._send(callback, args, kwargs, endpoint, chat_id, priority)
+        except BaseException as e:
+            if ack_key:
+                self._recent_acks.pop(ack_key, None)
+                if not result_future.done():
+                    result_future.set_exception(e)
+                    # מי שמחכה לתוצאה יקבל את השגיאה, אין צורך בלוג נוסף
+                    result_future.exception()
+            raise
+
+        if ack_key and not result_future.done():
+            result_future.set_result(result)
+        return result
+
+    def _prune_acks(self):
+        """ניקוי אישורים ישנים"""
+        if len(self._recent_acks) < 1000:
+            return
+        cutoff = time.monotonic() - self.coalesce_window
+        self._recent_acks = {
+            key: value for key, value in self._recent_acks.items()
+            if value[0] >= cutoff
+        }
+
+    async def _send(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        chat_id: Optional[Union[int, str]],
+        priority: int
+    ) -> JSONResult:
+        """
+        המתנה לאסימונים ושליחה, עם ניסיון חוזר אחרי RetryAfter
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            else:
+                # קריאות שאינן הודעה לצ'אט (callback, webhook...) לא מוגבלות,
+                # אבל כן עוצרות בזמן RetryAfter
+                pause = self._paused_until - started
+                if pause > 0:
+                    await asyncio.sleep(pause)
+            waited = time.monotonic() - started
+            _send_wait.observe(waited, endpoint=endpoint)
+            if waited > 0.001:
+                now = time.perf_counter()
+                tracing.record_span("rate_limit_wait", now - waited, now, attempt=attempt)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                _retry_after.inc(endpoint=endpoint)
+                self._paused_until = max(
+                    self._paused_until,
+                    time.monotonic() + e.retry_after + 0.1
+                )
+                if attempt == self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"🚦 טלגרם ביקש להמתין {e.retry_after}s ({endpoint}) - "
+                    f"ניסיון {attempt}/{self.max_retries}"
+                )
+                if self._wakeup:
+                    self._wakeup.set()
@@ -0,0 +1,272 @@
+"""
+ניתוח מחדש של כל המחשבות השמורות (אחרי שינוי ב-CATEGORIES / TOPICS)
+
+העבודה סורקת את thoughts לפי סדר _id בכל shard, מנתחת כל סבב
+ב-batch_analyze במאגר תהליכים, וכותבת רק את מה שהשתנה ב-bulk_write
+אחד (unordered). אחרי כל סבב נשמרת נקודת המשך במונגו - עבודה שנעצרה
+(כיבוי, קריסה) ממשיכה מאותה נקודה בהרצה הבאה.
+
+בסוף נבנים מחדש הסיכומים המצטברים של המשתמשים שהקטגוריה או הנושאים
+של מחשבה שלהם השתנו. המשתמשים האלה נרשמים ב-collection נפרד (job_users,
+מסמך לכל משתמש) לפני כתיבת הניתוחים - כך שגם אחרי קריסה באמצע סבב
+אף משתמש לא נשכח. הקצב הכולל מוגבל ב-REANALYZE_OPS_PER_SECOND.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import (
+    CATEGORIES,
+    TOPICS,
+    REANALYZE_BATCH_SIZE,
+    REANALYZE_WORKERS,
+    REANALYZE_OPS_PER_SECOND,
+    REANALYZE_LEASE_SECONDS
+)
+from database import get_db
+from metrics import metrics
+from prefix_index import prefix_index
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = "reanalysis"
+
+# משתמשים בכל עמוד בשלב בניית הסיכומים (ואחרי כל עמוד - נקודת המשך)
+SUMMARY_CHECKPOINT_EVERY = 50
+
+_processed = metrics.counter(
+    "reanalysis_thoughts_total", "מחשבות שנסרקו בניתוח מחדש, לפי תוצאה"
+)
+
+
+def ruleset_fingerprint() -> str:
+    """
+    טביעת אצבע של הקטגוריות והנושאים - שינוי בהם מתחיל את העבודה מהתחלה
+    """
+    rules = json.dumps({"categories": CATEGORIES, "topics": TOPICS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(rules.encode()).hexdigest()[:12]
+
+
+def _analyze_chunk(texts: List[str]) -> List[Dict]:
+    """רץ בתהליך נפרד - כל תהליך טוען את המנתח פעם אחת"""
+    from nlp_analyzer import get_nlp
+    return get_nlp().batch_analyze(texts)
+
+
+def format_status(job: Optional[Dict]) -> str:
+    """מצב העבודה להצגה למנהל"""
+    if not job or "status" not in job:
+        return "🔄 ניתוח מחדש עוד לא הורץ"
+
+    lines = [
+        f"🔄 ניתוח מחדש: {job['status']} ({job.get('phase', '')})",
+        f"נסרקו: {job.get('scanned', 0)}",
+        f"עודכנו: {job.get('changed', 0)}",
+    ]
+    if job.get("phase") in ("summaries", "done"):
+        lines.append(f"סיכומים: {job.get('summaries_done', 0)}/{job.get('summaries_total', 0)}")
+    lease_until = job.get("lease_until")
+    if job["status"] == "running" and (not lease_until or lease_until < datetime.utcnow()):
+        lines.append("⚠️ לא רץ כרגע - /reanalyze ימשיך מנקודת העצירה")
+    return "\n".join(lines)
+
+
+class ReanalysisJob:
+    """
+    הרצה אחת (או המשך) של הניתוח מחדש
+    """
+
+    def __init__(
+        self,
+        batch_size: int = REANALYZE_BATCH_SIZE,
+        workers: int = REANALYZE_WORKERS,
+        ops_per_second: float = REANALYZE_OPS_PER_SECOND,
+        lease_seconds: float = REANALYZE_LEASE_SECONDS
+    ):
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        # פרץ של סבב שלם לכל היותר, ואז לפי הקצב
+        self._bucket = TokenBucket(ops_per_second, max(ops_per_second, batch_size))
+
+    async def _throttle(self, amount: int):
+        """המתנה לפי קצב היעד (amount פעולות)"""
+        wait = self._bucket.wait_time(time.monotonic(), amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._bucket.consume(time.monotonic(), amount)
+
+    async def _analyze(self, pool: ProcessPoolExecutor, texts: List[str]) -> List[Dict]:
+        """ניתוח סבב אחד - מחולק לחלקים שווים בין התהליכים"""
+        loop = asyncio.get_running_loop()
+        size = -(-len(texts) // self.workers)
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _analyze_chunk, chunk) for chunk in chunks
+        ))
+        return [analysis for chunk in results for analysis in chunk]
+
+    async def run(self, restart: bool = False) -> Optional[Dict]:
+        """
+        הרצה עד הסוף (או המשך מנקודת העצירה)
+
+        Args:
+            restart: להתחיל מההתחלה גם אם יש נקודת המשך
+
+        Returns:
+            מסמך העבודה בסוף, או None אם worker אחר כבר מריץ אותה
+        """
+        job = await get_db().claim_job(JOB_ID, self.lease_seconds)
+        if job is None:
+            return None
+
+        ruleset = ruleset_fingerprint()
+        if restart or job.get("status") != "running" or job.get("ruleset") != ruleset:
+            job = {
+                "status": "running",
+                "phase": "scan",
+                "ruleset": ruleset,
+                "cursors": {},
+                "done_shards": [],
+                "scanned": 0,
+                "changed": 0,
+                "summaries_after": None,
+                "summaries_done": 0,
+                "summaries_total": 0,
+                "started_at": datetime.utcnow(),
+            }
+            await get_db().clear_job_users(JOB_ID)
+            await get_db().update_job(JOB_ID, job, self.lease_seconds)
+            logger.info(f"🔄 ניתוח מחדש התחיל (כללים {ruleset})")
+        else:
+            logger.info(f"🔄 ניתוח מחדש ממשיך אחרי {job.get('scanned', 0)} מחשבות")
+
+        try:
+            if job["phase"] == "scan":
+                await self._scan(job)
+                job["phase"] = "summaries"
+                total = await get_db().count_job_users(JOB_ID)
+                await get_db().update_job(
+                    JOB_ID,
+                    {"phase": "summaries", "summaries_total": total},
+                    self.lease_seconds
+                )
+
+            await self._rebuild_summaries()
+            await get_db().update_job(
+                JOB_ID,
+                {"status": "done", "phase": "done", "finished_at": datetime.utcnow()}
+            )
+            await get_db().clear_job_users(JOB_ID)
+        except BaseException:
+            # נקודת ההמשך כבר שמורה - רק משחררים את ההחזקה
+            with contextlib.suppress(Exception):
+                await asyncio.shield(get_db().update_job(JOB_ID, {}))
+            raise
+
+        return await get_db().get_job(JOB_ID)
+
+    async def _scan(self, job: Dict):
+        """
+        שלב א: סריקה, ניתוח וכתיבה של מה שהשתנה
+        """
+        pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            for shard_name in get_db().router.shards:
+                if shard_name in job["done_shards"]:
+                    continue
+                await self._scan_shard(job, shard_name, pool)
+                job["done_shards"].append(shard_name)
+                await get_db().update_job(
+                    JOB_ID, {"done_shards": job["done_shards"]}, self.lease_seconds
+                )
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _scan_shard(self, job: Dict, shard_name: str, pool: ProcessPoolExecutor):
+        after = job["cursors"].get(shard_name)
+
+        while True:
+            batch = await get_db().scan_thoughts(shard_name, after, self.batch_size)
+            if not batch:
+                return
+
+            await self._throttle(len(batch))
+            analyses = await self._analyze(pool, [thought.get("raw_text") or "" for thought in batch])
+
+            changes = []
+            affected = set()
+            for thought, analysis in zip(batch, analyses):
+                previous = thought.get("nlp_analysis") or {}
+                if previous == analysis:
+                    continue
+                changes.append((thought["_id"], analysis))
+                if (previous.get("category") != analysis["category"]
+                        or previous.get("topics") != analysis["topics"]):
+                    affected.add(thought["user_id"])
+
+            # המשתמשים נרשמים לפני הכתיבה: אחרי קריסה בין השתיים הסבב נסרק
+            # שוב, והמחשבות שכבר נכתבו נראות "ללא שינוי" - בלי הרישום הזה
+            # הסיכום שלהם לא היה נבנה מחדש. רישום מיותר לא מזיק.
+            await get_db().add_job_users(JOB_ID, sorted(affected))
+
+            changed = 0
+            if changes:
+                await self._throttle(len(changes))
+                changed = await get_db().write_analyses(shard_name, changes)
+
+            after = batch[-1]["_id"]
+            job["scanned"] += len(batch)
+            job["changed"] += changed
+            _processed.inc(len(batch) - len(changes), result="unchanged")
+            _processed.inc(len(changes), result="changed")
+
+            await get_db().update_job(
+                JOB_ID,
+                {
+                    f"cursors.{shard_name}": after,
+                    "scanned": job["scanned"],
+                    "changed": job["changed"],
+                },
+                self.lease_seconds
+            )
+
+    async def _rebuild_summaries(self):
+        """
+        שלב ב: בנייה מחדש של הסיכומים המצטברים של המשתמשים שהושפעו
+        """
+        job = await get_db().get_job(JOB_ID)
+        after = job.get("summaries_after")
+        done = job.get("summaries_done", 0)
+
+        while True:
+            users = await get_db().get_job_users(JOB_ID, after, SUMMARY_CHECKPOINT_EVERY)
+            if not users:
+                return
+
+            for user_id in users:
+                await self._throttle(1)
+                await get_db().rebuild_user_summary(user_id)
+                # גם באינדקס ה-inline שמורה הקטגוריה. זה מנקה רק את ה-worker
+                # שמריץ את העבודה - ב-workers אחרים האינדקס (והאימוג'י של הקטגוריה
+                # בתוצאות) מתעדכן רק כשהוא פג, תוך INLINE_INDEX_TTL_SECONDS לכל היותר
+                prefix_index.invalidate(user_id)
+
+            after = users[-1]
+            done += len(users)
+            await get_db().update_job(
+                JOB_ID,
+                {"summaries_after": after, "summaries_done": done},
+                self.lease_seconds
+            )
@@ -0,0 +1,221 @@
+"""
+חלוקת נתוני המשתמשים בין כמה אשכולות / מסדי מונגו לפי user_id
+
+כל משתמש משויך ל-shard אחד בגיבוב עקבי (consistent hashing) - הוספת
+shard מזיזה רק כ-1/N מהמשתמשים. לכל אשכול יש לקוח (ומאגר חיבורים) אחד,
+גם אם כמה shards הם מסדים שונים על אותו אשכול.
+
+רק נתוני המשתמש מחולקים (SHARDED_COLLECTIONS). מה שמשותף לכל ה-workers
+(עדכונים שטופלו, סשנים, סבבי סיכום, שיבוצים) נשאר ב-shard הראשי.
+
+שיבוץ מפורש (shard_assignments) גובר על הגיבוב - כך משתמש נשאר במקומו
+עד שהנתונים שלו הועברו בפועל (tools/rebalance.py).
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from config import (
+    MONGODB_URI,
+    MONGODB_DB_NAME,
+    MONGODB_SHARDS,
+    SHARD_ASSIGNMENT_REFRESH_SECONDS
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# collections שהמסמכים שלהם שייכים למשתמש אחד ועוברים איתו
+SHARDED_COLLECTIONS = ("thoughts", "users", "user_summaries")
+
+# נקודות וירטואליות לכל shard על הטבעת (לפיזור אחיד)
+VIRTUAL_NODES = 128
+
+
+def parse_shards(value: str) -> List[Tuple[str, str]]:
+    """
+    'a=mongodb://h1/db_a;b=mongodb+srv://h2' -> [("a", ...), ("b", ...)]
+    """
+    shards = []
+    for part in value.split(";"):
+        name, _, uri = part.strip().partition("=")
+        if name.strip() and uri.strip():
+            shards.append((name.strip(), uri.strip()))
+    return shards
+
+
+def split_uri(uri: str, default_db: str) -> Tuple[str, str]:
+    """
+    URI של shard -> (URI של האשכול בלי שם המסד, שם המסד)
+    """
+    parts = urlsplit(uri)
+    db_name = parts.path.strip("/") or default_db
+    return urlunsplit((parts.scheme, parts.netloc, "/", parts.query, "")), db_name
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    טבעת גיבוב עקבי: user_id -> שם shard
+    """
+
+    def __init__(self, names: List[str], vnodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{name}#{i}"), name)
+            for name in names
+            for i in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def node_for(self, user_id: int) -> str:
+        index = bisect.bisect(self._keys, _hash(str(user_id))) % len(self._keys)
+        return self._names[index]
+
+
+class Shard:
+    """
+    shard אחד: מסד על אשכול מסוים, ו-collections של נתוני המשתמשים
+    """
+
+    __slots__ = ("name", "client", "db", "thoughts", "users", "summaries")
+
+    def __init__(self, name: str, client, db_name: str):
+        self.name = name
+        self.client = client
+        self.db = client[db_name]
+        self.thoughts = self.db.thoughts
+        self.users = self.db.users
+        self.summaries = self.db.user_summaries
+
+    def __repr__(self) -> str:
+        return f"Shard({self.name!r})"
+
+
+class ShardRouter:
+    """
+    ניתוב user_id ל-shard: קודם שיבוץ מפורש, אחרת לפי הטבעת
+    """
+
+    def __init__(
+        self,
+        shards: str = MONGODB_SHARDS,
+        default_uri: Optional[str] = MONGODB_URI,
+        default_db: str = MONGODB_DB_NAME
+    ):
+        self._specs = parse_shards(shards)
+        self._default_uri = default_uri
+        self._default_db = default_db
+        self.shards: Dict[str, Shard] = {}
+        self.ring: Optional[HashRing] = None
+        # user_id -> שם shard (רק משתמשים שהוצמדו)
+        self._assignments: Dict[int, str] = {}
+        self._clients: Dict[str, object] = {}
+
+        assigned = metrics.gauge(
+            "shard_assignments", "משתמשים עם שיבוץ מפורש ל-shard"
+        )
+        assigned.set_function(lambda: len(self._assignments))
+
+    def connect(self, client_factory: Callable[[str], object]):
+        """
+        יצירת ה-shards - לקוח אחד לכל אשכול (client_factory(uri))
+        """
+        if not self._specs:
+            # בלי MONGODB_SHARDS - shard יחיד, בדיוק כמו החיבור הישן
+            client = client_factory(self._default_uri)
+            self._clients[self._default_uri] = client
+            self.shards = {"main": Shard("main", client, self._default_db)}
+        else:
+            for name, uri in self._specs:
+                cluster_uri, db_name = split_uri(uri, self._default_db)
+                client = self._clients.get(cluster_uri)
+                if client is None:
+                    client = self._clients[cluster_uri] = client_factory(cluster_uri)
+                self.shards[name] = Shard(name, client, db_name)
+
+        self.ring = HashRing(list(self.shards))
+
+    @property
+    def primary(self) -> Shard:
+        """ה-shard הראשי (הראשון ברשימה) - שם נשמרים הנתונים המשותפים"""
+        return next(iter(self.shards.values()))
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def all(self) -> List[Shard]:
+        return list(self.shards.values())
+
+    def home_of(self, user_id: int) -> str:
+        """ה-shard של המשתמש לפי הטבעת בלבד (בלי שיבוץ מפורש)"""
+        return self.ring.node_for(user_id)
+
+    def shard_for(self, user_id: int) -> Shard:
+        """ה-shard שבו נמצאים כרגע הנתונים של המשתמש"""
+        name = self._assignments.get(user_id)
+        if name is None or name not in self.shards:
+            name = self.ring.node_for(user_id)
+        return self.shards[name]
+
+    def group(self, user_ids: List[int]) -> Dict[str, List[int]]:
+        """חלוקת משתמשים לפי shard -> {שם shard: [user_id, ...]}"""
+        groups: Dict[str, List[int]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.shard_for(user_id).name, []).append(user_id)
+        return groups
+
+    @property
+    def assignments_collection(self):
+        return self.primary.db.shard_assignments
+
+    async def assign(self, user_id: int, shard_name: str):
+        """הצמדת משתמש ל-shard (גוברת על הטבעת)"""
+        await self.assignments_collection.update_one(
+            {"_id": user_id},
+            {"$set": {"shard": shard_name, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._assignments[user_id] = shard_name
+
+    async def unassign(self, user_id: int):
+        """שחרור ההצמדה - המשתמש חוזר למקום שלו בטבעת"""
+        await self.assignments_collection.delete_one({"_id": user_id})
+        self._assignments.pop(user_id, None)
+
+    async def refresh_assignments(self):
+        """
+        טעינת השיבוצים המפורשים מה-shard הראשי
+        """
+        assignments = {}
+        async for doc in self.assignments_collection.find({}, {"shard": 1}):
+            assignments[doc["_id"]] = doc["shard"]
+        self._assignments = assignments
+
+    async def run_assignment_refresher(
+        self,
+        interval: float = SHARD_ASSIGNMENT_REFRESH_SECONDS
+    ):
+        """
+        ריענון תקופתי (ברקע) - כך כל ה-workers רואים העברות של משתמשים
+        """
+        while True:
+            try:
+                await self.refresh_assignments()
+            except Exception as e:
+                logger.warning(f"⚠️ לא ניתן לרענן שיבוצי shards: {e}")
+            await asyncio.sleep(interval)
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
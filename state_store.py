@@ -0,0 +1,465 @@
+"""
+אחסון מצב השיחה של המשתמשים (מצב רגיל / dump) וסשנים של dump
+
+שני מימושים:
+- InMemoryStateStore - בזיכרון התהליך, מתאים ל-worker יחיד.
+  סשן בלי פעילות מפונה לאחסון קבוע (collection sessions) ומשוחזר
+  בהודעה הבאה, כך שהזיכרון חסום וסשנים לא הולכים לאיבוד ב-restart
+- MongoStateStore - משותף לכל ה-workers וה-instances, עם מטמון מקומי
+  קצר-מועד למצב המשתמש כדי שהנתיב החם לא יפנה למונגו בכל הודעה
+
+בשני המימושים סשן נטוש (בלי /done) נשמר אוטומטית כמחשבות
+אחרי DUMP_AUTO_FINALIZE_SECONDS
+
+כל הודעה בסשן נשמרת יחד עם הניתוח שלה, והסשן מחזיק ספירה רצה
+לפי קטגוריה - כך ש-/done רק שומר ומציג סיכום מוכן
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from config import (
+    BOT_STATES,
+    STATE_STORE_BACKEND,
+    STATE_CACHE_TTL_SECONDS,
+    STATE_CACHE_SIZE,
+    DUMP_MAX_MESSAGES,
+    DUMP_MAX_CHARS,
+    DUMP_IDLE_TIMEOUT_SECONDS,
+    DUMP_AUTO_FINALIZE_SECONDS,
+    DUMP_SWEEP_INTERVAL_SECONDS
+)
+from cache import TTLCache
+from database import get_db
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_spilled_total = metrics.counter(
+    "dump_sessions_spilled_total", "סשנים שפונו מהזיכרון לאחסון קבוע"
+)
+_restored_total = metrics.counter(
+    "dump_sessions_restored_total", "סשנים ששוחזרו מאחסון קבוע לזיכרון"
+)
+_finalized_total = metrics.counter(
+    "dump_sessions_auto_finalized_total", "סשנים נטושים שנשמרו אוטומטית"
+)
+_full_total = metrics.counter(
+    "dump_sessions_full_total", "הודעות שנדחו כי הסשן הגיע למגבלה"
+)
+
+
+class SessionFull(Exception):
+    """
+    סשן ה-dump הגיע למגבלת ההודעות או התווים
+    """
+
+
+class StateStore(ABC):
+    """
+    ממשק בסיס לאחסון מצב שיחה
+    """
+
+    @abstractmethod
+    async def get_state(self, user_id: int) -> str:
+        """
+        המצב הנוכחי של המשתמש (BOT_STATES)
+        """
+
+    @abstractmethod
+    async def start_dump(self, user_id: int):
+        """
+        כניסה למצב dump עם סשן ריק
+        """
+
+    @abstractmethod
+    async def append_dump(self, user_id: int, text: str, analysis: Dict) -> bool:
+        """
+        הוספת הודעה מנותחת לסשן ה-dump
+
+        Returns:
+            False אם המשתמש לא במצב dump
+
+        Raises:
+            SessionFull: אם הסשן הגיע למגבלה
+        """
+
+    @abstractmethod
+    async def end_dump(self, user_id: int) -> Optional["DumpSession"]:
+        """
+        יציאה ממצב dump והחזרת הסשן שנאסף
+
+        Returns:
+            הסשן, או None אם המשתמש לא היה במצב dump
+        """
+
+    @abstractmethod
+    async def restore_dump(self, user_id: int, session: "DumpSession"):
+        """
+        החזרת סשן שנסגר ב-end_dump אבל לא נשמר (למשל כשהשמירה נכשלה),
+        כדי ש-/done או השמירה האוטומטית ינסו שוב.
+        אם בינתיים נפתח סשן חדש - ההודעות הישנות נוספות לפניו
+        """
+
+    async def load(self):
+        """
+        טעינה בעליית התהליך
+        """
+
+    async def evict_idle(self, idle_seconds: float) -> int:
+        """
+        פינוי סשנים שלא היו פעילים מהזיכרון
+
+        Returns:
+            כמות הסשנים שפונו
+        """
+        return 0
+
+    async def spill_all(self):
+        """
+        פינוי כל הסשנים מהזיכרון (בכיבוי)
+        """
+
+    def memory_bytes(self) -> int:
+        """
+        הערכת הזיכרון שתופס מצב השיחה בתהליך
+        """
+        return 0
+
+
+def _entry(message: Union[str, Dict]) -> Dict:
+    """
+    הודעה בסשן: {"text", "analysis"}.
+    סשנים ישנים שמרו טקסט בלבד - הניתוח שלהם יושלם בשמירה
+    """
+    if isinstance(message, str):
+        return {"text": message, "analysis": None}
+    return message
+
+
+def _deep_size(value: Any) -> int:
+    """הערכת זיכרון של מבנה מקונן (מילונים, רשימות, מחרוזות)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+
+class DumpSession:
+    """
+    סשן dump - הודעות מנותחות + ספירה רצה לפי קטגוריה
+    """
+
+    __slots__ = ("messages", "tally", "chars", "last_activity")
+
+    def __init__(
+        self,
+        messages: Optional[List[Union[str, Dict]]] = None,
+        tally: Optional[Dict[str, int]] = None,
+        last_activity: Optional[float] = None
+    ):
+        self.messages: List[Dict] = [_entry(m) for m in messages or []]
+        if tally is None:
+            tally = {}
+            for entry in self.messages:
+                if entry["analysis"]:
+                    category = entry["analysis"]["category"]
+                    tally[category] = tally.get(category, 0) + 1
+        self.tally: Dict[str, int] = dict(tally)
+        self.chars = sum(len(entry["text"]) for entry in self.messages)
+        self.last_activity = last_activity if last_activity is not None else time.time()
+
+    def add(self, text: str, analysis: Dict):
+        """הוספת הודעה מנותחת"""
+        self.messages.append({"text": text, "analysis": analysis})
+        category = analysis["category"]
+        self.tally[category] = self.tally.get(category, 0) + 1
+        self.chars += len(text)
+        self.last_activity = time.time()
+
+    def memory_bytes(self) -> int:
+        """הזיכרון שתופסות ההודעות, הניתוחים והספירה"""
+        return _deep_size(self.messages) + _deep_size(self.tally)
+
+
+class InMemoryStateStore(StateStore):
+    """
+    מצב שיחה בזיכרון התהליך, עם פינוי סשנים לא פעילים למונגו
+    """
+
+    def __init__(
+        self,
+        max_messages: int = DUMP_MAX_MESSAGES,
+        max_chars: int = DUMP_MAX_CHARS
+    ):
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        # סשני dump פעילים (רק משתמשים במצב dump מופיעים כאן)
+        self.sessions: Dict[int, DumpSession] = {}
+        # משתמשים שהסשן שלהם פונה לאחסון קבוע
+        self._spilled: set = set()
+
+    async def get_state(self, user_id: int) -> str:
+        if user_id in self.sessions or user_id in self._spilled:
+            return BOT_STATES["DUMP_MODE"]
+        return BOT_STATES["NORMAL"]
+
+    async def start_dump(self, user_id: int):
+        if user_id in self._spilled:
+            # סשן חדש מחליף את הקודם, גם אם הוא שמור
+            self._spilled.discard(user_id)
+            await get_db().take_dump_session(user_id)
+
+        self.sessions[user_id] = DumpSession()
+
+    async def _restore(self, user_id: int) -> Optional[DumpSession]:
+        """
+        שחזור סשן שפונה לאחסון קבוע
+        """
+        if user_id not in self._spilled:
+            return None
+
+        self._spilled.discard(user_id)
+        stored = await get_db().take_dump_session(user_id)
+        if stored is None:
+            return None
+
+        session = DumpSession(stored.get("messages"), stored.get("tally"))
+        self.sessions[user_id] = session
+        _restored_total.inc()
+        logger.info(f"♻️ סשן dump של {user_id} שוחזר ({len(session.messages)} הודעות)")
+        return session
+
+    async def append_dump(self, user_id: int, text: str, analysis: Dict) -> bool:
+        session = self.sessions.get(user_id) or await self._restore(user_id)
+        if session is None:
+            return False
+
+        if (
+            len(session.messages) >= self.max_messages
+            or session.chars + len(text) > self.max_chars
+        ):
+            _full_total.inc()
+            raise SessionFull()
+
+        session.add(text, analysis)
+        return True
+
+    async def end_dump(self, user_id: int) -> Optional[DumpSession]:
+        if user_id not in self.sessions:
+            await self._restore(user_id)
+
+        return self.sessions.pop(user_id, None)
+
+    async def restore_dump(self, user_id: int, session: DumpSession):
+        current = self.sessions.get(user_id) or await self._restore(user_id)
+        if current is not None:
+            # הזמן הישן נשמר - כדי שהשמירה האוטומטית תנסה שוב כבר בסבב הבא
+            session = DumpSession(
+                session.messages + current.messages,
+                last_activity=min(session.last_activity, current.last_activity)
+            )
+        self.sessions[user_id] = session
+
+    async def load(self):
+        self._spilled.update(await get_db().get_dump_session_ids())
+        if self._spilled:
+            logger.info(f"🗂️ {len(self._spilled)} סשני dump שמורים ממתינים לשחזור")
+
+    async def _spill(self, user_id: int, session: DumpSession) -> bool:
+        """
+        כתיבת סשן לאחסון קבוע והוצאתו מהזיכרון
+        """
+        written = list(session.messages)
+        try:
+            await get_db().spill_dump_session(
+                user_id,
+                written,
+                dict(session.tally),
+                datetime.utcfromtimestamp(session.last_activity)
+            )
+        except Exception as e:
+            logger.error(f"❌ שגיאה בפינוי סשן של {user_id}: {e}")
+            return False
+
+        if self.sessions.get(user_id) is not session or len(session.messages) != len(written):
+            # המשתמש היה פעיל בזמן הכתיבה - הסשן נשאר בזיכרון,
+            # והעותק השמור מיותר
+            await get_db().take_dump_session(user_id)
+            return False
+
+        del self.sessions[user_id]
+        self._spilled.add(user_id)
+        _spilled_total.inc()
+        return True
+
+    async def evict_idle(self, idle_seconds: float) -> int:
+        cutoff = time.time() - idle_seconds
+        idle = [
+            (user_id, session)
+            for user_id, session in self.sessions.items()
+            if session.last_activity < cutoff
+        ]
+
+        evicted = 0
+        for user_id, session in idle:
+            if await self._spill(user_id, session):
+                evicted += 1
+
+        if evicted:
+            logger.info(f"📤 {evicted} סשני dump לא פעילים פונו מהזיכרון")
+        return evicted
+
+    async def spill_all(self):
+        for user_id, session in list(self.sessions.items()):
+            await self._spill(user_id, session)
+
+    def memory_bytes(self) -> int:
+        return (
+            sys.getsizeof(self.sessions)
+            + sys.getsizeof(self._spilled)
+            + sum(session.memory_bytes() for session in self.sessions.values())
+        )
+
+
+class MongoStateStore(StateStore):
+    """
+    מצב שיחה במונגו (collection sessions) + מטמון מקומי למצב המשתמש
+
+    המטמון המקומי מתעדכן בכל כתיבה מה-worker הזה. שינוי שנעשה ב-worker
+    אחר ייראה כאן לכל המאוחר אחרי STATE_CACHE_TTL_SECONDS.
+    הוספת הודעה לסשן מותנית במצב dump ובמגבלות במונגו עצמו, כך שמטמון
+    ישן לא יכול להוסיף הודעה לסשן שכבר נסגר.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = DUMP_MAX_MESSAGES,
+        max_chars: int = DUMP_MAX_CHARS
+    ):
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self._states = TTLCache("user_states", STATE_CACHE_SIZE, STATE_CACHE_TTL_SECONDS)
+
+    async def get_state(self, user_id: int) -> str:
+        state = self._states.get(user_id)
+        if state is not None:
+            return state
+
+        session = await get_db().get_session(user_id)
+        state = (session or {}).get("state", BOT_STATES["NORMAL"])
+        self._states.set(user_id, state)
+        return state
+
+    async def start_dump(self, user_id: int):
+        await get_db().start_dump_session(user_id)
+        self._states.set(user_id, BOT_STATES["DUMP_MODE"])
+
+    async def append_dump(self, user_id: int, text: str, analysis: Dict) -> bool:
+        entry = {"text": text, "analysis": analysis}
+        if await get_db().push_dump_message(user_id, entry, self.max_messages, self.max_chars):
+            return True
+
+        # לא נוסף - או שהמשתמש כבר לא במצב dump, או שהסשן מלא
+        session = await get_db().get_session(user_id)
+        if session and session.get("state") == BOT_STATES["DUMP_MODE"]:
+            self._states.set(user_id, BOT_STATES["DUMP_MODE"])
+            _full_total.inc()
+            raise SessionFull()
+
+        self._states.set(user_id, BOT_STATES["NORMAL"])
+        return False
+
+    async def end_dump(self, user_id: int) -> Optional[DumpSession]:
+        stored = await get_db().end_dump_session(user_id)
+        self._states.set(user_id, BOT_STATES["NORMAL"])
+        if stored is None:
+            return None
+        return DumpSession(
+            stored.get("messages"),
+            stored.get("tally"),
+            last_activity=stored["updated_at"].replace(tzinfo=timezone.utc).timestamp()
+        )
+
+    async def restore_dump(self, user_id: int, session: DumpSession):
+        await get_db().restore_dump_session(
+            user_id,
+            session.messages,
+            dict(session.tally),
+            datetime.utcfromtimestamp(session.last_activity)
+        )
+        self._states.set(user_id, BOT_STATES["DUMP_MODE"])
+
+    def memory_bytes(self) -> int:
+        return self._states.memory_bytes()
+
+
+def create_state_store(backend: str = STATE_STORE_BACKEND) -> StateStore:
+    """
+    יצירת מימוש לפי ההגדרות
+    """
+    if backend == "mongo":
+        logger.info("🗂️ מצב שיחה נשמר במונגו")
+        store = MongoStateStore()
+    else:
+        if backend != "memory":
+            logger.warning(f"⚠️ STATE_STORE_BACKEND לא מוכר: {backend} - משתמש בזיכרון")
+        store = InMemoryStateStore()
+
+    memory = metrics.gauge(
+        "session_state_bytes", "הערכת הזיכרון שתופס מצב השיחה (מצבים וסשנים)"
+    )
+    memory.set_function(store.memory_bytes)
+
+    return store
+
+
+async def run_session_sweeper(
+    store: StateStore,
+    finalize: Callable[[int, DumpSession], Awaitable],
+    interval: float = DUMP_SWEEP_INTERVAL_SECONDS
+):
+    """
+    לולאת רקע: פינוי סשנים לא פעילים מהזיכרון ושמירה אוטומטית
+    של סשנים נטושים
+
+    Args:
+        store: אחסון מצב השיחה
+        finalize: שמירת הסשן כמחשבות (user_id, session)
+        interval: כל כמה שניות לרוץ
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            await store.evict_idle(DUMP_IDLE_TIMEOUT_SECONDS)
+
+            cutoff = datetime.utcnow() - timedelta(seconds=DUMP_AUTO_FINALIZE_SECONDS)
+            for user_id in await get_db().get_dump_session_ids(idle_since=cutoff):
+                session = await store.end_dump(user_id)
+                if not session or not session.messages:
+                    continue
+
+                try:
+                    await finalize(user_id, session)
+                except Exception as e:
+                    # הסשן הוחזר - ננסה שוב בסבב הבא
+                    logger.error(f"❌ שמירה אוטומטית של סשן {user_id} נכשלה: {e}")
+                    continue
+                _finalized_total.inc()
+                logger.info(
+                    f"💾 סשן dump נטוש של {user_id} נשמר אוטומטית "
+                    f"({len(session.messages)} הודעות)"
+                )
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ שגיאה בניקוי סשנים: {e}")
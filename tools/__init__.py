@@ -0,0 +1,3 @@
+"""
+כלי עזר לפיתוח ולתפעול (הרצה עם python -m tools.<שם>)
+"""
@@ -0,0 +1,165 @@
+"""
+שרת מקומי שמחקה את ה-Bot API של טלגרם
+
+מקבל את הקריאות היוצאות של הבוט (sendMessage, editMessageText וכו'),
+רושם אותן ומחזיר תשובה סבירה - כך אפשר להריץ את הבוט בבדיקת עומס
+בלי לפנות לטלגרם האמיתי.
+
+הבוט מופנה לשרת עם:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot
+
+שימוש עצמאי:
+    python -m tools.fake_telegram --port 8081
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# מתודות שמחזירות הודעה
+_MESSAGE_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+
+class FakeTelegramAPI:
+    """
+    Bot API מדומה שרושם כל קריאה
+
+    מי שמחכה לתשובה של הבוט בצ'אט מסוים נרשם עם expect(chat_id),
+    וה-future שלו מתמלא בקריאה הבאה שמיועדת לצ'אט הזה.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: השהיה מלאכותית לכל קריאה (בשניות)
+        """
+        self.latency = latency
+        self.calls: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = {}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    def expect(self, chat_id: int) -> asyncio.Future:
+        """
+        future שיתמלא בקריאה הבאה של הבוט לצ'אט (שם המתודה)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[str(chat_id)] = future
+        return future
+
+    def forget(self, chat_id: int):
+        """ביטול המתנה (למשל אחרי timeout)"""
+        self._waiters.pop(str(chat_id), None)
+
+    @staticmethod
+    def _chat_key(method: str, params: Dict[str, Any]) -> Optional[str]:
+        """
+        לאיזה צ'אט שייכת הקריאה
+        (ב-answerCallbackQuery המזהה מקודד בתחילת callback_query_id)
+        """
+        if "chat_id" in params:
+            return str(params["chat_id"])
+        if method == "answerCallbackQuery":
+            return str(params.get("callback_query_id", "")).split(":", 1)[0]
+        return None
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        """תשובה סבירה לכל מתודה"""
+        if method == "getMe":
+            return {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "Fake Bot",
+                "username": "fake_brain_dump_bot",
+            }
+
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+
+        if method in _MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id", 0))
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        טיפול בקריאה - /bot<token>/<method>
+        """
+        method = request.match_info["method"]
+
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            # PTB שולח form, עם ערכים מורכבים מקודדים כ-JSON
+            params = dict(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.counts[method] = self.counts.get(method, 0) + 1
+        self.calls.append({"method": method, "at": time.monotonic(), "params": params})
+
+        key = self._chat_key(method, params)
+        if key is not None:
+            waiter = self._waiters.pop(key, None)
+            if waiter and not waiter.done():
+                waiter.set_result(method)
+
+        return web.Response(
+            text=json.dumps({"ok": True, "result": self._result(method, params)}),
+            content_type="application/json",
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081):
+        """הפעלת השרת"""
+        app = web.Application()
+        app.router.add_post("/{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        """עצירת השרת"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot API מדומה")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="השהיה לכל קריאה (שניות)")
+    args = parser.parse_args()
+
+    async def serve():
+        api = FakeTelegramAPI(latency=args.latency)
+        await api.start(args.host, args.port)
+        print(f"fake Bot API on http://{args.host}:{args.port}/bot<token>/<method>")
+        try:
+            while True:
+                await asyncio.sleep(10)
+                print(f"calls: {api.counts}")
+        finally:
+            await api.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
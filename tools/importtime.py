@@ -0,0 +1,126 @@
+"""
+דוח זמני import ובדיקת תקציב
+
+מריץ `python -X importtime -c "import <module>"` בתהליך נפרד (כמה פעמים,
+ולוקח את הריצה המהירה כדי לסנן רעש), ומציג את המודולים הכבדים.
+עם --budget-ms מחזיר קוד יציאה 1 אם זמן ה-import חורג מהתקציב -
+כך אפשר לתפוס רגרסיה ב-cold start לפני פריסה.
+
+הבדיקה נכשלת גם אם ה-import בנה את אחד האובייקטים הגלובליים
+(db, nlp, bot) - הם אמורים להיווצר רק בשימוש הראשון, ולכן לא נמדדים כאן.
+
+שימוש:
+    python -m tools.importtime
+    python -m tools.importtime --module main --budget-ms 900 --top 15
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# תקציב ברירת מחדל ל-import של main (מילישניות)
+DEFAULT_BUDGET_MS = 1000.0
+
+# (מודול, משתנה) של האובייקטים הגלובליים שנוצרים בשימוש הראשון
+LAZY_SINGLETONS = [
+    ("database", "_db"),
+    ("nlp_analyzer", "_nlp"),
+    ("bot", "_bot"),
+]
+
+# מודפס אחרי ה-import: אילו מהם כבר נבנו
+_CHECK_BUILT = (
+    "import sys; print(','.join(f'{m}.{a}' for m, a in %r "
+    "if getattr(sys.modules.get(m), a, None) is not None))"
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure(module: str) -> Tuple[List[Dict], List[str]]:
+    """
+    ריצה אחת
+
+    Returns:
+        (רשימת {"name", "self_ms", "cumulative_ms", "depth"},
+         האובייקטים הגלובליים שנבנו בזמן ה-import)
+    """
+    code = f"import {module}; " + _CHECK_BUILT % (LAZY_SINGLETONS,)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        entries.append({
+            "name": name,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(indent) - 1) // 2,
+        })
+
+    built = [name for name in completed.stdout.strip().split(",") if name]
+    return entries, built
+
+
+def total_ms(entries: List[Dict], module: str) -> float:
+    """זמן ה-import הכולל של המודול המבוקש"""
+    for entry in entries:
+        if entry["name"] == module and entry["depth"] == 0:
+            return entry["cumulative_ms"]
+    return sum(entry["self_ms"] for entry in entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="דוח זמני import")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=3, help="כמה ריצות (נלקחת המהירה)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)),
+        help="תקציב לזמן ה-import הכולל (0 = בלי בדיקה)",
+    )
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    best, built = min(runs, key=lambda run: total_ms(run[0], args.module))
+    total = total_ms(best, args.module)
+
+    print(f"import {args.module}: {total:.1f}ms (best of {len(runs)})")
+
+    print(f"\ntop {args.top} direct imports by cumulative time:")
+    direct = [entry for entry in best if entry["depth"] == 1]
+    for entry in sorted(direct, key=lambda e: e["cumulative_ms"], reverse=True)[:args.top]:
+        print(f"  {entry['cumulative_ms']:>8.1f}ms  {entry['name']}")
+
+    print(f"\ntop {args.top} modules by self time:")
+    for entry in sorted(best, key=lambda e: e["self_ms"], reverse=True)[:args.top]:
+        print(f"  {entry['self_ms']:>8.1f}ms  {entry['name']}")
+
+    if built:
+        print(f"\n❌ built at import time: {', '.join(built)} (use get_db()/get_nlp()/get_bot())")
+        sys.exit(1)
+
+    if args.budget_ms and total > args.budget_ms:
+        print(f"\n❌ over budget: {total:.1f}ms > {args.budget_ms:.0f}ms")
+        sys.exit(1)
+    if args.budget_ms:
+        print(f"\n✅ within budget ({args.budget_ms:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
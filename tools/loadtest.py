@@ -0,0 +1,382 @@
+"""
+בדיקת עומס ל-endpoint של ה-webhook
+
+שני מצבים:
+- flood: שולח עדכוני טקסט במקביל ומודד רק את קבלת ה-webhook
+  (משמש להשוואה בין מודלי הרצה, למשל Flask מול aiohttp)
+- scenarios (ברירת מחדל): משתמשים מדומים מריצים תמהיל של טקסט, סשני dump,
+  /list, /search ולחיצות על כפתורים, בקצב נתון. ה-Bot API מוחלף בשרת
+  מקומי (tools.fake_telegram) שרץ בתוך הכלי, וזמן התגובה נמדד מהשליחה
+  ל-webhook ועד שהבוט עונה בצ'אט - כלומר מקצה לקצה.
+
+הרצת הבוט מול השרת המדומה (מונגו מקומי, מצב בזיכרון, בלי הגבלת קצב,
+בלי איחוד אישורים ועם תקציבי admission גבוהים - אחרת המדידה היא של
+המגבלות). RENDER_EXTERNAL_URL הוא מה שמפעיל את מצב ה-webhook (בלעדיו
+main.py רץ ב-polling והבקשות לא מגיעות לבוט):
+    TELEGRAM_BOT_TOKEN=123:load TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot \\
+    RENDER_EXTERNAL_URL=http://127.0.0.1:10000 MONGODB_URI=mongodb://localhost:27017 \\
+    MONGODB_DB_NAME=brain_dump_load STATE_STORE_BACKEND=memory \\
+    RATE_LIMIT_CHAT_PER_SECOND=1000 RATE_LIMIT_CHAT_BURST=1000 \\
+    RATE_LIMIT_GLOBAL_PER_SECOND=100000 RATE_LIMIT_ACK_COALESCE_SECONDS=0 \\
+    ADMISSION_WRITE_PER_MINUTE=100000 ADMISSION_WRITE_BURST=100000 \\
+    ADMISSION_WRITE_GLOBAL_PER_SECOND=100000 ADMISSION_SEARCH_PER_MINUTE=100000 \\
+    ADMISSION_SEARCH_BURST=100000 ADMISSION_SEARCH_GLOBAL_PER_SECOND=100000 \\
+    python main.py
+
+הטקסטים שנשלחים ייחודיים (מספר רץ בסוף), כך שהם עוברים את מסלול
+הניתוח והשמירה ולא נענים ב"כבר נשמר" של זיהוי הכפילויות.
+
+ואז:
+    python -m tools.loadtest --url http://127.0.0.1:10000/123:load \\
+        --requests 2000 --users 50 --rate 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from tools.fake_telegram import FakeTelegramAPI
+
+# מזהה עדכון רץ - כל בקשה מקבלת update_id ייחודי
+_update_ids = itertools.count(1)
+# מספר רץ לטקסטים - כדי שאף מחשבה לא תזוהה ככפולה
+_text_ids = itertools.count(1)
+
+# תמהיל ברירת המחדל (משקלים יחסיים)
+DEFAULT_MIX = {"text": 50, "dump": 15, "list": 15, "search": 10, "callback": 10}
+
+SAMPLE_TEXTS = [
+    "צריך לקנות חלב ולחם",
+    "רעיון לפרויקט חדש בעבודה",
+    "אני מרגיש קצת לחוץ היום",
+    "לקבוע תור לרופא שיניים",
+    "ללמוד פייתון אסינכרוני",
+    "להתקשר לאמא בערב",
+]
+
+
+def _sample_text(rng: random.Random) -> str:
+    """טקסט לדוגמה, ייחודי בכל קריאה"""
+    return f"{rng.choice(SAMPLE_TEXTS)} {next(_text_ids)}"
+
+
+def _user(user_id: int) -> Dict:
+    return {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": "Load",
+        "username": f"load_{user_id}",
+    }
+
+
+def build_text_update(user_id: int, text: str) -> Dict:
+    """
+    בניית Update סינתטי של הודעת טקסט (או פקודה, אם הטקסט מתחיל ב-/)
+    """
+    update_id = next(_update_ids)
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        # CommandHandler מזהה פקודה רק לפי entity מסוג bot_command
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+    return {"update_id": update_id, "message": message}
+
+
+def build_callback_update(user_id: int, data: str) -> Dict:
+    """
+    בניית Update סינתטי של לחיצה על כפתור
+    (מזהה המשתמש מקודד ב-id כדי שהשרת המדומה ישייך את התשובה)
+    """
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": f"{user_id}:{update_id}",
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "✅ נשמר!",
+            },
+        },
+    }
+
+
+def scenario_steps(kind: str, user_id: int, rng: random.Random) -> List[Tuple[str, Dict]]:
+    """
+    רצף העדכונים של תרחיש אחד - רשימת (תווית, update)
+    """
+    if kind == "text":
+        return [("text", build_text_update(user_id, _sample_text(rng)))]
+
+    if kind == "dump":
+        steps = [("/dump", build_text_update(user_id, "/dump"))]
+        for _ in range(rng.randint(3, 8)):
+            steps.append(("dump_message", build_text_update(user_id, _sample_text(rng))))
+        steps.append(("/done", build_text_update(user_id, "/done")))
+        return steps
+
+    if kind == "list":
+        return [("/list", build_text_update(user_id, "/list"))]
+
+    if kind == "search":
+        word = rng.choice(SAMPLE_TEXTS).split()[-1]
+        return [("/search", build_text_update(user_id, f"/search {word}"))]
+
+    if kind == "callback":
+        return [("callback", build_callback_update(user_id, "show_all"))]
+
+    raise ValueError(f"unknown scenario: {kind}")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """אחוזון פשוט (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Pacer:
+    """
+    קצב שליחה גלובלי (עדכונים לשנייה) לכל המשתמשים המדומים
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1 / rate if rate else 0.0
+        self._next = time.monotonic()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(self._next, now)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def run(url: str, total: int, concurrency: int, users: int) -> Dict:
+    """
+    מצב flood - מדידת קבלת ה-webhook בלבד
+
+    Returns:
+        מילון עם התוצאות
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = itertools.count()
+
+    async def worker(session: aiohttp.ClientSession):
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            payload = build_text_update(
+                user_id=100_000 + i % users,
+                text=f"צריך לקנות חלב לבית {i}",
+            )
+            start = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "statuses": statuses,
+    }
+
+
+async def run_scenarios(
+    url: str,
+    total: int,
+    users: int,
+    rate: Optional[float],
+    mix: Dict[str, int],
+    api: FakeTelegramAPI,
+    reply_timeout: float = 10.0,
+    seed: int = 0
+) -> Dict:
+    """
+    מצב scenarios - משתמשים מדומים, כל אחד שולח עדכון וממתין לתשובת הבוט
+    לפני הבא (כמו משתמש אמיתי, וגם כדי לשייך כל תשובה לעדכון שלה)
+
+    Returns:
+        מילון עם התוצאות, כולל פילוח לפי פקודה
+    """
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    pacer = Pacer(rate)
+    sent = itertools.count()
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, Dict[str, int]] = {}
+
+    def error(label: str, reason: str):
+        bucket = errors.setdefault(label, {})
+        bucket[reason] = bucket.get(reason, 0) + 1
+
+    async def send(session: aiohttp.ClientSession, user_id: int, label: str, payload: Dict) -> bool:
+        await pacer.wait()
+        reply = api.expect(user_id)
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json=payload) as response:
+                await response.read()
+                if response.status != 200:
+                    api.forget(user_id)
+                    error(label, f"http_{response.status}")
+                    return False
+            await asyncio.wait_for(reply, timeout=reply_timeout)
+        except asyncio.TimeoutError:
+            api.forget(user_id)
+            error(label, "no_reply")
+            return False
+        except aiohttp.ClientError:
+            api.forget(user_id)
+            error(label, "connection")
+            return False
+        latencies.setdefault(label, []).append(time.perf_counter() - start)
+        return True
+
+    async def virtual_user(session: aiohttp.ClientSession, user_id: int):
+        while next(sent) < total:
+            kind = rng.choices(kinds, weights)[0]
+            for label, payload in scenario_steps(kind, user_id, rng):
+                if not await send(session, user_id, label, payload):
+                    # סשן dump שנקטע - לא ממשיכים את שאר הצעדים
+                    break
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(
+            virtual_user(session, 200_000 + i) for i in range(users)
+        ))
+    elapsed = time.perf_counter() - started
+
+    commands = {}
+    for label in sorted(set(latencies) | set(errors)):
+        values = latencies.get(label, [])
+        commands[label] = {
+            "ok": len(values),
+            "errors": errors.get(label, {}),
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+        }
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "elapsed": elapsed,
+        "completed": completed,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "commands": commands,
+        "api_calls": dict(api.counts),
+    }
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    """'text=50,dump=10' -> {"text": 50, "dump": 10}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="בדיקת עומס ל-webhook")
+    parser.add_argument("--url", required=True, help="כתובת ה-webhook")
+    parser.add_argument("--mode", choices=["scenarios", "flood"], default="scenarios")
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="(flood) בקשות / (scenarios) תרחישים"
+    )
+    parser.add_argument("--concurrency", type=int, default=20, help="(flood) בקשות במקביל")
+    parser.add_argument("--users", type=int, default=50, help="כמות משתמשים מדומים")
+    parser.add_argument("--rate", type=float, default=None, help="(scenarios) עדכונים לשנייה")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help="(scenarios) משקלי התרחישים, למשל text=50,dump=15,list=15,search=10,callback=10",
+    )
+    parser.add_argument("--api-port", type=int, default=8081, help="פורט ה-Bot API המדומה")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="השהיה לכל קריאת API")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.mode == "flood":
+        result = asyncio.run(run(args.url, args.requests, args.concurrency, args.users))
+
+        print(f"requests:   {result['requests']}")
+        print(f"elapsed:    {result['elapsed']:.2f}s")
+        print(f"throughput: {result['throughput']:.1f} req/s")
+        print(
+            f"latency:    p50={result['p50'] * 1000:.1f}ms "
+            f"p95={result['p95'] * 1000:.1f}ms p99={result['p99'] * 1000:.1f}ms"
+        )
+        print(f"statuses:   {result['statuses']}")
+        return
+
+    async def scenarios():
+        api = FakeTelegramAPI(latency=args.api_latency)
+        await api.start(port=args.api_port)
+        try:
+            return await run_scenarios(
+                args.url, args.requests, args.users, args.rate, args.mix,
+                api, reply_timeout=args.reply_timeout
+            )
+        finally:
+            await api.stop()
+
+    result = asyncio.run(scenarios())
+
+    print(f"elapsed:    {result['elapsed']:.2f}s")
+    print(f"completed:  {result['completed']}")
+    print(f"throughput: {result['throughput']:.1f} updates/s")
+    print()
+    print(f"{'command':<14}{'ok':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  errors")
+    for label, stats in result["commands"].items():
+        print(
+            f"{label:<14}{stats['ok']:>7}"
+            f"{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}"
+            f"{stats['p99'] * 1000:>10.1f}  {stats['errors'] or ''}"
+        )
+    print()
+    print(f"Bot API calls: {result['api_calls']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+העברת משתמשים בין shards בלי לעצור את הבוט
+
+הוספת shard משנה את הטבעת: חלק מהמשתמשים שייכים עכשיו ל-shard אחר,
+אבל הנתונים שלהם עדיין במקום הישן. לכן מוסיפים shard בשלושה שלבים:
+
+1. הצמדה (עם MONGODB_SHARDS הנוכחי) - כל משתמש שהטבעת החדשה תזיז
+   מוצמד ל-shard שבו הנתונים שלו נמצאים:
+       python -m tools.rebalance pin --next "a=mongodb://...;b=...;c=..."
+2. פריסה עם MONGODB_SHARDS החדש - המוצמדים נשארים במקומם,
+   ומשתמשים חדשים מתחלקים לפי הטבעת החדשה
+3. העברה של כל המוצמדים למקום שלהם בטבעת, ושחרור ההצמדה:
+       python -m tools.rebalance move --all
+
+העברת משתמש אחד:
+- העתקת המחשבות ומסמך המשתמש ל-shard היעד, ושמירת העותק שהועתק (snapshot)
+- הצמדה ליעד, והמתנה שכל ה-workers ירעננו את השיבוצים
+- השלמה - מיזוג תלת-כיווני מול ה-snapshot, לכל מסמך:
+  - נוסף במקור בינתיים -> נוסף ליעד
+  - השתנה במקור -> מוחל ביעד, רק אם ביעד הוא עדיין זהה ל-snapshot
+    (שינוי שנעשה ביעד אחרי ההצמדה גובר)
+  - נמחק במקור -> נמחק ביעד
+  - נמחק ביעד אחרי ההצמדה (למשל /clear) -> לא חוזר
+- מחיקה מהמקור ושל הסיכום המצטבר ביעד (נבנה מחדש בקריאה הבאה),
+  ושחרור ההצמדה אם היעד הוא המקום של המשתמש בטבעת
+
+מגבלה: worker שלא רענן את השיבוצים תוך --wait עדיין כותב למקור, וכתיבה
+כזו שמגיעה אחרי ההשלמה הולכת לאיבוד במחיקה. לכן --wait צריך להיות ארוך
+ממחזור הרענון (ברירת המחדל - פעמיים SHARD_ASSIGNMENT_REFRESH_SECONDS).
+
+שימוש:
+    python -m tools.rebalance status
+    python -m tools.rebalance pin --next "<MONGODB_SHARDS החדש>" [--dry-run]
+    python -m tools.rebalance move --user 123456 [--to shard1]
+    python -m tools.rebalance move --all [--dry-run]
+"""
+
+import argparse
+import asyncio
+from typing import Dict, Set, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from config import SHARD_ASSIGNMENT_REFRESH_SECONDS
+from database import get_db
+from sharding import HashRing, Shard, ShardRouter, parse_shards
+
+# מסמכים בפקודת bulk_write אחת
+BATCH_SIZE = 500
+
+
+async def _user_ids(shard: Shard) -> Set[int]:
+    """כל המשתמשים שיש להם נתונים ב-shard"""
+    user_ids = set(await shard.users.distinct("user_id"))
+    user_ids.update(await shard.thoughts.distinct("user_id"))
+    return user_ids
+
+
+async def _snapshot(source: Shard, user_id: int) -> Tuple[Dict, Dict]:
+    """
+    הנתונים של המשתמש במקור
+
+    Returns:
+        ({_id: מחשבה}, {user_id: מסמך המשתמש בלי _id})
+        (ה-_id של מסמך המשתמש לא נשמר בין shards - המפתח הוא user_id)
+    """
+    thoughts = {}
+    async for thought in source.thoughts.find({"user_id": user_id}):
+        thoughts[thought["_id"]] = thought
+
+    users = {}
+    user = await source.users.find_one({"user_id": user_id}, {"_id": 0})
+    if user:
+        users[user_id] = user
+    return thoughts, users
+
+
+async def _bulk(collection, ops: list) -> int:
+    """הרצה בסבבים של BATCH_SIZE; מחזיר כמה מסמכים נכתבו/נמחקו"""
+    changed = 0
+    for i in range(0, len(ops), BATCH_SIZE):
+        result = await collection.bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+        changed += result.upserted_count + result.modified_count + result.deleted_count
+    return changed
+
+
+def _copy_ops(docs: Dict, key: str) -> list:
+    """העתקה ראשונה של ה-snapshot ליעד (החלפה מלאה)"""
+    return [ReplaceOne({key: doc_id}, doc, upsert=True) for doc_id, doc in docs.items()]
+
+
+def _merge_ops(before: Dict, now: Dict, key: str) -> list:
+    """
+    פעולות ההשלמה ליעד (מיזוג תלת-כיווני)
+
+    Args:
+        before: ה-snapshot שהועתק ({מפתח: מסמך})
+        now: המקור כרגע
+        key: שדה המפתח (_id למחשבות, user_id למסמך המשתמש)
+    """
+    ops = []
+    for doc_id, doc in now.items():
+        old = before.get(doc_id)
+        if old is None:
+            # נוסף במקור אחרי ההעתקה
+            fields = {name: value for name, value in doc.items() if name not in ("_id", key)}
+            ops.append(UpdateOne({key: doc_id}, {"$setOnInsert": fields}, upsert=True))
+        elif doc != old:
+            # עודכן במקור - מוחל רק אם ביעד המסמך עדיין זהה ל-snapshot
+            # (הפילטר משווה את כל השדות, כך שזה compare-and-swap; מסמך
+            # שהשתנה או נמחק ביעד אחרי ההצמדה לא נדרס ולא חוזר)
+            ops.append(ReplaceOne(dict(old), doc))
+
+    for doc_id in before.keys() - now.keys():
+        # נמחק במקור אחרי ההעתקה
+        ops.append(DeleteOne({key: doc_id}))
+    return ops
+
+
+async def move_user(router: ShardRouter, user_id: int, target: Shard, wait: float) -> bool:
+    """
+    העברת משתמש אחד ל-target
+
+    Returns:
+        האם הנתונים הועברו (False אם המשתמש כבר שם)
+    """
+    source = router.shard_for(user_id)
+    if source.name == target.name:
+        return False
+
+    await router.assign(user_id, source.name)
+    thoughts, users = await _snapshot(source, user_id)
+    copied = await _bulk(target.thoughts, _copy_ops(thoughts, "_id"))
+    copied += await _bulk(target.users, _copy_ops(users, "user_id"))
+
+    # מכאן הקריאות והכתיבות של המשתמש הולכות ליעד
+    await router.assign(user_id, target.name)
+    await asyncio.sleep(wait)
+
+    # מה שנכתב למקור בין ההעתקה להצמדה
+    now_thoughts, now_users = await _snapshot(source, user_id)
+    caught_up = await _bulk(target.thoughts, _merge_ops(thoughts, now_thoughts, "_id"))
+    caught_up += await _bulk(target.users, _merge_ops(users, now_users, "user_id"))
+
+    await source.thoughts.delete_many({"user_id": user_id})
+    await source.users.delete_many({"user_id": user_id})
+    await source.summaries.delete_one({"_id": user_id})
+    # הסיכום המצטבר לא הועתק - נבנה מחדש מהמחשבות ביעד בקריאה הבאה
+    await target.summaries.delete_one({"_id": user_id})
+
+    if router.home_of(user_id) == target.name:
+        await router.unassign(user_id)
+
+    print(f"  {user_id}: {source.name} -> {target.name} ({copied} + {caught_up} docs)")
+    return True
+
+
+async def cmd_status(router: ShardRouter):
+    for shard in router.all():
+        thoughts = await shard.thoughts.estimated_document_count()
+        users = await shard.users.estimated_document_count()
+        print(f"{shard.name:>12}: {users} users, {thoughts} thoughts")
+
+    pins = await router.assignments_collection.find().to_list(None)
+    pending = [pin for pin in pins if router.home_of(pin["_id"]) != pin["shard"]]
+    print(f"\n{len(pins)} pinned users, {len(pending)} waiting to move")
+
+
+async def cmd_pin(router: ShardRouter, next_shards: str, dry_run: bool):
+    next_ring = HashRing([name for name, _ in parse_shards(next_shards)])
+    pinned = 0
+
+    for shard in router.all():
+        for user_id in sorted(await _user_ids(shard)):
+            if next_ring.node_for(user_id) == shard.name:
+                continue
+            pinned += 1
+            if not dry_run:
+                await router.assign(user_id, shard.name)
+
+    action = "would pin" if dry_run else "pinned"
+    print(f"{action} {pinned} users that the new ring moves")
+
+
+async def cmd_move(router: ShardRouter, args):
+    if args.user:
+        target = router.shards[args.to] if args.to else router.shards[router.home_of(args.user)]
+        plan = [(args.user, target)]
+    else:
+        pins = await router.assignments_collection.find().to_list(None)
+        plan = [
+            (pin["_id"], router.shards[router.home_of(pin["_id"])])
+            for pin in pins
+        ]
+
+    if args.dry_run:
+        for user_id, target in plan:
+            print(f"  {user_id}: {router.shard_for(user_id).name} -> {target.name}")
+        return
+
+    moved = 0
+    for user_id, target in plan:
+        if await move_user(router, user_id, target, args.wait):
+            moved += 1
+        elif router.home_of(user_id) == target.name:
+            # כבר במקום - רק שחרור ההצמדה
+            await router.unassign(user_id)
+    print(f"moved {moved} users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="העברת משתמשים בין shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="כמויות לכל shard והצמדות פתוחות")
+
+    pin = sub.add_parser("pin", help="הצמדת משתמשים לפני שינוי רשימת ה-shards")
+    pin.add_argument("--next", required=True, help="הערך החדש של MONGODB_SHARDS")
+    pin.add_argument("--dry-run", action="store_true")
+
+    move = sub.add_parser("move", help="העברת משתמש אחד או כל המוצמדים")
+    target = move.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int)
+    target.add_argument("--all", action="store_true")
+    move.add_argument("--to", help="shard יעד (ברירת מחדל: לפי הטבעת)")
+    move.add_argument(
+        "--wait",
+        type=float,
+        default=SHARD_ASSIGNMENT_REFRESH_SECONDS * 2 + 1,
+        help="המתנה אחרי ההצמדה ליעד, עד שכל ה-workers מרעננים",
+    )
+    move.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+
+    async def run():
+        if not await get_db().connect():
+            raise SystemExit("cannot connect to MongoDB")
+        router = get_db().router
+        try:
+            await router.refresh_assignments()
+            if args.command == "status":
+                await cmd_status(router)
+            elif args.command == "pin":
+                await cmd_pin(router, args.next, args.dry_run)
+            else:
+                await cmd_move(router, args)
+        finally:
+            await get_db().close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+הצגת traces מקובץ ה-JSON-lines כ-waterfall בטרמינל
+
+שימוש:
+    python -m tools.trace_viewer traces.jsonl --slowest 5
+    python -m tools.trace_viewer traces.jsonl --trace-id 3f2a9c...
+"""
+
+import argparse
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+BAR_WIDTH = 50
+
+
+def load_traces(path: str) -> Iterator[Dict]:
+    """קריאת traces מהקובץ (שורות פגומות מדולגות)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _ordered_spans(spans: List[Dict]) -> List[tuple]:
+    """
+    spans בסדר עץ (הורה לפני ילדיו, ילדים לפי זמן התחלה)
+
+    Returns:
+        רשימת (עומק, span)
+    """
+    children: Dict = {}
+    for span in spans:
+        children.setdefault(span["parent"], []).append(span)
+    for items in children.values():
+        items.sort(key=lambda span: span["offset_ms"])
+
+    known = {span["id"] for span in spans}
+    roots = [span for span in spans if span["parent"] not in known]
+    roots.sort(key=lambda span: span["offset_ms"])
+
+    ordered = []
+
+    def walk(span: Dict, depth: int):
+        ordered.append((depth, span))
+        for child in children.get(span["id"], []):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return ordered
+
+
+def render(trace: Dict) -> str:
+    """waterfall של trace אחד"""
+    total = trace["duration_ms"] or 1.0
+    started = datetime.fromtimestamp(trace["started_at"]).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [
+        f"trace {trace['trace_id']}  {trace['name']}  {trace['duration_ms']:.1f}ms  "
+        f"{started}  ({trace['reason']})"
+    ]
+
+    spans = _ordered_spans(trace["spans"])
+    name_width = max(len("  " * depth + span["name"]) for depth, span in spans)
+
+    for depth, span in spans:
+        begin = int(span["offset_ms"] / total * BAR_WIDTH)
+        length = max(1, int(round(span["duration_ms"] / total * BAR_WIDTH)))
+        begin = min(begin, BAR_WIDTH - 1)
+        length = min(length, BAR_WIDTH - begin)
+        bar = " " * begin + "█" * length + " " * (BAR_WIDTH - begin - length)
+
+        attrs = {k: v for k, v in span["attrs"].items() if k != "update_id"}
+        extra = " ".join(f"{k}={v}" for k, v in attrs.items())
+        label = ("  " * depth + span["name"]).ljust(name_width)
+        lines.append(
+            f"  {label}  |{bar}| {span['offset_ms']:>9.1f} +{span['duration_ms']:>9.1f}ms  {extra}"
+        )
+
+    if trace.get("dropped_spans"):
+        lines.append(f"  ... {trace['dropped_spans']} spans dropped")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="הצגת traces כ-waterfall")
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--trace-id", help="הצגת trace מסוים")
+    parser.add_argument("--slowest", type=int, default=10, help="כמה מה-traces האיטיים להציג")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="רק traces ארוכים מזה")
+    args = parser.parse_args()
+
+    traces = [
+        trace for trace in load_traces(args.path)
+        if trace["duration_ms"] >= args.min_ms
+        and (not args.trace_id or trace["trace_id"].startswith(args.trace_id))
+    ]
+    traces.sort(key=lambda trace: trace["duration_ms"], reverse=True)
+
+    for trace in traces[:args.slowest]:
+        print(render(trace))
+        print()
+
+    if not traces:
+        print("no matching traces")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+מעקב (tracing) אחרי עדכון בודד לאורך כל הדרך
+
+עדכון מקבל trace ב-webhook, ומשם כל שלב (תור, handler, שלבי NLP,
+מתודות Database וקריאות ל-Bot API) נרשם כ-span בתוכו.
+ה-span הנוכחי עובר דרך contextvars, כך שאין צורך להעביר אותו בפרמטרים.
+
+בסוף העדכון מחליטים אם לשמור: לפי שיעור הדגימה, או תמיד אם הוא איטי.
+השמירה היא שורת JSON אחת לכל trace, ונכתבת מ-thread נפרד.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config import (
+    TRACING_ENABLED,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_MS,
+    TRACE_FILE,
+    TRACE_FILE_MAX_BYTES
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# מקסימום spans ל-trace אחד (הגנה על הזיכרון בעדכונים ארוכים)
+MAX_SPANS_PER_TRACE = 500
+
+_exported = metrics.counter(
+    "traces_exported_total", "traces שנכתבו לקובץ, לפי סיבה"
+)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """
+    כל ה-spans של עדכון אחד
+    """
+
+    __slots__ = ("trace_id", "started_at", "spans", "dropped")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+    def add(self, span: "Span"):
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+
+class Span:
+    """
+    שלב אחד בתוך trace (זמנים לפי perf_counter)
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(
+        self,
+        trace: Trace,
+        name: str,
+        parent_id: Optional[str] = None,
+        start: Optional[float] = None,
+        attrs: Optional[Dict[str, Any]] = None
+    ):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attrs = attrs or {}
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+
+class JsonLinesExporter:
+    """
+    כתיבת traces לקובץ JSON-lines מ-thread ברקע, עם החלפת קובץ לפי גודל
+    """
+
+    def __init__(self, path: str = TRACE_FILE, max_bytes: int = TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, line: str):
+        """הוספת שורה לתור הכתיבה"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="trace-exporter", daemon=True
+                    )
+                    self._thread.start()
+        self._queue.put(line)
+
+    def _run(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"⚠️ לא ניתן לכתוב trace: {e}")
+
+    def close(self, timeout: float = 2.0):
+        """סיום הכתיבה של מה שכבר בתור"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+exporter = JsonLinesExporter()
+
+
+def current_span() -> Optional[Span]:
+    """ה-span הפעיל בהקשר הנוכחי (או None)"""
+    return _current_span.get()
+
+
+def begin_trace(name: str, **attrs) -> Optional[Span]:
+    """
+    פתיחת trace חדש והפיכת ה-span הראשי שלו לנוכחי.
+    ה-span נשאר פתוח עד finish_trace (גם אם העיבוד ממשיך ב-task אחר)
+
+    Returns:
+        ה-span הראשי, או None אם המעקב כבוי
+    """
+    if not TRACING_ENABLED:
+        return None
+    root = Span(Trace(), name, attrs=attrs)
+    _current_span.set(root)
+    return root
+
+
+def finish_trace(root: Optional[Span], **attrs):
+    """
+    סגירת ה-span הראשי והחלטה אם לשמור את ה-trace
+    """
+    if root is None:
+        return
+    root.end = time.perf_counter()
+    root.attrs.update(attrs)
+
+    duration_ms = root.duration * 1000
+    if duration_ms >= TRACE_SLOW_MS:
+        reason = "slow"
+    elif random.random() < TRACE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return
+
+    _exported.inc(reason=reason)
+    exporter.export(json.dumps(_serialize(root, reason), ensure_ascii=False, default=str))
+
+
+def _serialize(root: Span, reason: str) -> Dict[str, Any]:
+    """trace כמילון - זמנים במילישניות יחסית לתחילת ה-trace"""
+    trace = root.trace
+
+    def item(span: Span) -> Dict[str, Any]:
+        return {
+            "id": span.span_id,
+            "parent": span.parent_id,
+            "name": span.name,
+            "offset_ms": round((span.start - root.start) * 1000, 3),
+            "duration_ms": round(span.duration * 1000, 3),
+            "attrs": span.attrs,
+        }
+
+    return {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "started_at": trace.started_at,
+        "duration_ms": round(root.duration * 1000, 3),
+        "reason": reason,
+        "dropped_spans": trace.dropped,
+        "spans": [item(root)] + [item(span) for span in trace.spans],
+    }
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    span ילד של ה-span הנוכחי. מחוץ ל-trace - לא עושה כלום
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent_id=parent.span_id, attrs=attrs)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+        parent.trace.add(child)
+
+
+def record_span(name: str, start: float, end: float, **attrs):
+    """
+    רישום span שכבר הסתיים (זמני perf_counter), בלי context manager -
+    לשלבים קצרים ותכופים כמו שלבי ה-NLP
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(parent.trace, name, parent_id=parent.span_id, start=start, attrs=attrs)
+    child.end = end
+    parent.trace.add(child)
+
@@ -0,0 +1,221 @@
+"""
+תור עדכונים לעיבוד ברקע
+ה-webhook רק מכניס עדכון לתור ומחזיר תשובה מיידית לטלגרם,
+ו-workers אסינכרוניים מעבדים את העדכונים
+
+לכל משתמש יש "נתיב" (lane) משלו: עדכונים של משתמשים שונים מעובדים
+במקביל, ועדכונים של אותו משתמש נשמרים בסדר FIFO קפדני
+(חשוב למצב dump, שבו סדר ההודעות הוא חלק מהתוכן)
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from telegram import Update
+
+from config import (
+    UPDATE_QUEUE_MAX_SIZE,
+    UPDATE_WORKERS,
+    UPDATE_QUEUE_DRAIN_SECONDS
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_queue_wait = metrics.histogram(
+    "update_queue_wait_seconds", "זמן ההמתנה של עדכון בתור עד תחילת העיבוד"
+)
+_processing_time = metrics.histogram(
+    "update_processing_seconds", "זמן עיבוד עדכון על ידי worker"
+)
+_rejected = metrics.counter(
+    "update_queue_rejected_total", "עדכונים שנדחו כי התור מלא"
+)
+_failed = metrics.counter(
+    "update_processing_failed_total", "עדכונים שהעיבוד שלהם נכשל"
+)
+
+
+class QueueFull(Exception):
+    """
+    התור מלא - העדכון לא התקבל
+    """
+
+
+def _lane_key(update: Update) -> Hashable:
+    """
+    המפתח שלפיו נשמר הסדר - המשתמש, או הצ'אט אם אין משתמש.
+    עדכון בלי שניהם לא צריך סדר ומקבל נתיב משלו
+    """
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return ("update", update.update_id)
+
+
+class UpdateQueue:
+    """
+    תור חסום של עדכונים, מחולק לנתיבים לפי משתמש,
+    + מאגר workers שמעבדים נתיבים שונים במקביל
+    """
+
+    def __init__(
+        self,
+        max_size: int = UPDATE_QUEUE_MAX_SIZE,
+        workers: int = UPDATE_WORKERS
+    ):
+        self.max_size = max_size
+        self.workers_count = workers
+        # משתמש -> עדכונים ממתינים (זמן כניסה, עדכון, הקשר של מי שהכניס)
+        self._lanes: Dict[Hashable, Deque[Tuple[float, Update, contextvars.Context]]] = {}
+        # נתיבים שיש להם עבודה וממתינים ל-worker פנוי
+        self._ready: Optional[asyncio.Queue] = None
+        # נתיבים שנמצאים כרגע ב-ready או בעיבוד
+        self._scheduled: set = set()
+        self._pending = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._process: Optional[Callable[[Update], Awaitable]] = None
+
+        depth = metrics.gauge("update_queue_depth", "כמות עדכונים שממתינים בתור")
+        depth.set_function(self.depth)
+        age = metrics.gauge(
+            "update_queue_oldest_age_seconds", "גיל העדכון הוותיק ביותר בתור"
+        )
+        age.set_function(self.oldest_age)
+        lanes = metrics.gauge(
+            "update_queue_active_lanes", "כמות משתמשים עם עדכונים ממתינים"
+        )
+        lanes.set_function(lambda: len(self._lanes))
+
+    def depth(self) -> int:
+        """כמות העדכונים שממתינים"""
+        return self._pending
+
+    def oldest_age(self) -> float:
+        """כמה זמן (בשניות) ממתין העדכון הוותיק ביותר"""
+        now = time.monotonic()
+        return max(
+            (now - lane[0][0] for lane in self._lanes.values() if lane),
+            default=0.0
+        )
+
+    def lag_report(self, top: int = 10) -> List[Dict]:
+        """
+        הנתיבים עם ההמתנה הארוכה ביותר
+
+        Returns:
+            רשימת {"key", "depth", "lag"} ממוינת לפי lag
+        """
+        now = time.monotonic()
+        report = [
+            {"key": key, "depth": len(lane), "lag": now - lane[0][0]}
+            for key, lane in self._lanes.items()
+            if lane
+        ]
+        report.sort(key=lambda item: item["lag"], reverse=True)
+        return report[:top]
+
+    async def start(self, process: Callable[[Update], Awaitable]):
+        """
+        הפעלת ה-workers
+
+        Args:
+            process: פונקציית העיבוד של עדכון בודד
+        """
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._process = process
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"update-worker-{i}")
+            for i in range(self.workers_count)
+        ]
+        logger.info(
+            f"📬 תור עדכונים פעיל: {self.workers_count} workers, "
+            f"עומק מקסימלי {self.max_size}"
+        )
+
+    def submit(self, update: Update):
+        """
+        הכנסת עדכון לנתיב של המשתמש בלי להמתין
+
+        Raises:
+            QueueFull: אם התור מלא
+        """
+        if self._pending >= self.max_size:
+            _rejected.inc()
+            raise QueueFull()
+
+        key = _lane_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+        # ההקשר (contextvars) של ה-webhook עובר לעיבוד - למשל ה-trace של העדכון
+        lane.append((time.monotonic(), update, contextvars.copy_context()))
+
+        self._pending += 1
+        self._idle.clear()
+
+        # נתיב שכבר מתוזמן יטופל על ידי ה-worker שלו
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+
+    async def _worker(self, index: int):
+        """
+        לולאת worker - לוקח נתיב מוכן ומעבד ממנו עדכון אחד.
+        נתיב שנשארה בו עבודה חוזר לסוף התור (הוגנות בין משתמשים)
+        """
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            enqueued_at, update, context = lane.popleft()
+
+            started = time.monotonic()
+            _queue_wait.observe(started - enqueued_at)
+
+            try:
+                # task שנוצר בתוך context.run יורש את ההקשר הזה
+                await context.run(asyncio.ensure_future, self._process(update))
+            except Exception as e:
+                _failed.inc()
+                logger.error(f"❌ שגיאה בעיבוד עדכון {update.update_id}: {e}")
+            finally:
+                _processing_time.observe(time.monotonic() - started)
+                self._pending -= 1
+
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+                    self._scheduled.discard(key)
+
+                if self._pending == 0:
+                    self._idle.set()
+
+    async def stop(self, drain_timeout: float = UPDATE_QUEUE_DRAIN_SECONDS):
+        """
+        עצירת ה-workers, אחרי ניסיון לרוקן את התור
+        """
+        if not self._idle:
+            return
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.depth()} עדכונים לא עובדו לפני הכיבוי")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# יצירת אובייקט גלובלי
+update_queue = UpdateQueue()